@@ -0,0 +1,1865 @@
+bl_info = {
+    "name": "Armature Bone Name Mapper",
+    "author": "meguire",
+    "version": (0, 3),
+    "blender": (3, 0, 0),
+    "location": "View3D > Sidebar > Bone Mapper",
+    "description": "Rename bones of one armature to match another (with search & sort)",
+    "category": "Rigging",
+}
+
+import contextlib
+import csv
+import fnmatch
+import json
+import time
+import traceback
+from array import array
+
+if "bpy" in locals():
+    # アドオンの再読み込み時はコアも読み直す
+    import importlib
+    importlib.reload(core)
+else:
+    from . import core
+
+import bpy
+from bpy_extras.io_utils import ExportHelper, ImportHelper
+
+from .core import (
+    STAGE_CACHED,
+    MappingCache,
+    MAPPING_FORMATS,
+    MappingViewIndex,
+    DataPathRemapper,
+    MatchProfile,
+    PackedMappings,
+    RulePackLoader,
+    STEP_CHUNK,
+    Skeleton,
+    TargetNameIndex,
+    generate_mapping,
+    iter_match_spatial,
+    iter_match_topology,
+    plan_renames,
+    read_mapping_rows,
+    run_steps,
+    search_key,
+    settings_digest,
+    skeleton_signature,
+    write_mapping_rows,
+)
+
+
+def skeleton_from_bones(bones):
+    """Blender のボーンコレクションから配列ベースの Skeleton スナップショットを作る
+
+    名前と親は 1 パスで、レスト位置（head / tail / Z 軸）は foreach_get で一括取得する。
+    """
+    return run_steps(iter_skeleton_from_bones(bones, max(len(bones), 1)))
+
+
+def iter_skeleton_from_bones(bones, chunk=STEP_CHUNK):
+    """skeleton_from_bones の段階版。親を chunk 本読むごとに yield し、Skeleton を返す"""
+    names = bones.keys()
+    parents = []
+    for start in range(0, len(names), chunk):
+        parents.extend(p.name if p else None for p in (b.parent for b in bones[start:start + chunk]))
+        yield
+    if len(bones) != len(names):
+        # 読んでいる間にボーンが増減した。最初から読み直す
+        return (yield from iter_skeleton_from_bones(bones, chunk))
+
+    count = len(names)
+    heads = array('f', bytes(4 * 3 * count))
+    tails = array('f', bytes(4 * 3 * count))
+    z_axes = array('f', bytes(4 * 3 * count))
+    bones.foreach_get("head_local", heads)
+    bones.foreach_get("tail_local", tails)
+    bones.foreach_get("z_axis", z_axes)
+    yield
+    return Skeleton.from_pairs(zip(names, parents), heads, tails, z_axes)
+
+
+# アーマチュアデータごとの Skeleton スナップショット
+# 一覧表示・折りたたみ・生成・適用はすべてここから読み、bpy のコレクションを直接辿らない
+_skeletons = {}
+
+
+def get_skeleton(bones):
+    """bones（Armature.bones）に対応する Skeleton をキャッシュから返す
+
+    ボーン数が変わった時、このアドオンでリネームした時、依存グラフ更新でボーンの名前や
+    構成が変わった（編集モードを抜けた）時、Undo・ファイル読み込み時に作り直す。
+    """
+    return run_steps(iter_skeleton(bones, max(len(bones), 1)))
+
+
+def iter_skeleton(bones, chunk=STEP_CHUNK):
+    """get_skeleton の段階版。キャッシュに無い時だけ、読み込みの途中で yield する"""
+    key = bones.id_data.as_pointer()
+    cached = _skeletons.get(key)
+    if cached is not None and len(cached) == len(bones):
+        return cached
+    skeleton = _skeletons[key] = yield from iter_skeleton_from_bones(bones, chunk)
+    return skeleton
+
+
+def invalidate_skeleton(bones=None):
+    """Skeleton キャッシュを破棄する（bones 省略時は全アーマチュア分）"""
+    if bones is None:
+        _skeletons.clear()
+    else:
+        _skeletons.pop(bones.id_data.as_pointer(), None)
+
+
+# ターゲットアーマチュアごとの TargetNameIndex（生成で作ったものを候補提示でも使う）
+_target_indices = {}
+
+
+def get_target_index(bones):
+    """bones（ターゲットの Armature.bones）の TargetNameIndex。Skeleton が作り直されたら作り直す"""
+    skeleton = get_skeleton(bones)
+    key = bones.id_data.as_pointer()
+    cached = _target_indices.get(key)
+    if cached is not None and cached[0] is skeleton:
+        return cached[1]
+    index = TargetNameIndex(skeleton.names)
+    _target_indices[key] = (skeleton, index)
+    return index
+
+
+def suggest_targets(props, text, k):
+    """ターゲットアーマチュアのボーン名から text に近いものを [(名前, 理由), ...] で最大 k 件返す"""
+    target = props.target
+    if not text or not target or target.type != 'ARMATURE':
+        return []
+    return get_target_index(target.data.bones).suggest(text, k)
+
+
+def get_mapping_cache(props):
+    """ユーザー設定フォルダ配下のマッピングキャッシュ"""
+    directory = bpy.utils.user_resource('CONFIG', path="bone_mapper_cache", create=True)
+    return MappingCache(directory, max_bytes=props.cache_size_mb * 1024 * 1024)
+
+
+def mapping_cache_variant(props):
+    """キャッシュのキーに含める、マッチング結果を左右する設定（と正規化ルール）のダイジェスト"""
+    return settings_digest({
+        "topology": props.use_topology,
+        "spatial": round(props.spatial_max_distance, 6) if props.use_spatial else None,
+    })
+
+
+# ルールパック（ユーザー設定フォルダの bone_mapper_rules と、パネルで指定したフォルダ）
+_rule_loader = RulePackLoader()
+
+
+def refresh_rule_packs(props, force=False):
+    """ルールパックの追加・変更・削除を検出して再コンパイルする（ホットリロード）"""
+    directories = [bpy.utils.user_resource('CONFIG', path="bone_mapper_rules", create=True)]
+    if props.rules_directory:
+        directories.append(bpy.path.abspath(props.rules_directory))
+    if directories != _rule_loader.directories:
+        _rule_loader.directories = directories
+        force = True
+    if not _rule_loader.refresh(force):
+        return False
+    # 正規化キーが変わるので、候補提示用のターゲット索引も作り直す
+    # （マッピングキャッシュはキーの rules_fingerprint() が変わるので古い結果を読まない）
+    _target_indices.clear()
+    return True
+
+
+# ---------------------------------------------------------------------------
+# 表示用キャッシュ
+# PropertyGroup には Python オブジェクトを保持できないため、シーンのプロパティごとに
+# モジュール側で保持する。generate_mapping / toggle_fold / apply_mapping と
+# Undo・ファイル読み込み時に無効化・更新される。
+# ---------------------------------------------------------------------------
+
+_view_indices = {}
+
+
+def get_view_index(props):
+    """props に対応する MappingViewIndex を返す（必要な時だけ構築）"""
+    key = props.as_pointer()
+    skeleton = None
+    if props.source and hasattr(props.source, 'data') and hasattr(props.source.data, 'bones'):
+        skeleton = get_skeleton(props.source.data.bones)
+    # ソースの Skeleton が作り直されていれば（リネーム・ボーン追加など）こちらも作り直す
+    cached = _view_indices.get(key)
+    if cached is not None and cached[0] is skeleton and len(cached[1]) == mapping_count(props):
+        return cached[1]
+
+    if is_packed(props):
+        # 折りたたみは行ごとのビットなので、行のソース名をそのまま folds の名前として使う
+        packed = get_packed(props)
+        index = MappingViewIndex(
+            packed.sources,
+            skeleton,
+            packed.sources,
+            [packed.sources[row] for row in packed.collapsed_rows()],
+        )
+    else:
+        index = MappingViewIndex(
+            [item.source_name for item in props.mappings],
+            skeleton,
+            [f.bone_name for f in props.folds],
+            [f.bone_name for f in props.folds if not f.expanded],
+        )
+    _view_indices[key] = (skeleton, index)
+    return index
+
+
+def get_row_order(props):
+    """sort_mode に応じた flt_neworder（生成時に計算した並びを差し替えるだけ）"""
+    view = get_view_index(props)
+    mode = props.sort_mode
+    if mode == 'SOURCE':
+        return view.sort_order(mode, lambda: [name.lower() for name in mapping_sources(props)])
+    if mode == 'TARGET':
+        return view.sort_order(mode, lambda: [name.lower() for name in mapping_targets(props)])
+    # SOURCE_HIER / SOURCE_HIER_SIMPLE は生成時の階層順そのまま
+    return view.identity_order()
+
+
+def precompute_row_orders(props):
+    """全ソートモードの並びを先に計算しておく"""
+    view = get_view_index(props)
+    view.sort_order('SOURCE', lambda: [name.lower() for name in mapping_sources(props)])
+    view.sort_order('TARGET', lambda: [name.lower() for name in mapping_targets(props)])
+    view.identity_order()
+
+
+def uses_hierarchy_view(props):
+    """インデント・折りたたみを使う表示モードか"""
+    return bool(
+        props.sort_mode == 'SOURCE_HIER' and props.source
+        and hasattr(props.source, 'data') and hasattr(props.source.data, 'bones')
+    )
+
+
+def invalidate_view_cache(props=None):
+    """表示用キャッシュを破棄する（props 省略時は全シーン分）"""
+    if props is None:
+        _view_indices.clear()
+    else:
+        _view_indices.pop(props.as_pointer(), None)
+
+
+# ---------------------------------------------------------------------------
+# マッピング一覧の保存先
+# COLLECTION: 行ごとの BoneMappingItem / BoneFoldItem（props.mappings / props.folds）
+# PACKED: 全行を PackedMappings の 1 本の文字列（props.packed_mappings）に保存し、
+#         template_list には検索・並べ替え・折りたたみ後の 1 ページ分（props.page_rows）だけを渡す
+# 一覧の読み書きはここを経由する。
+# ---------------------------------------------------------------------------
+
+# デコード済みの PackedMappings（props ごと。Undo・ファイル読み込みで破棄）
+_packed = {}
+# 現在の検索・折りたたみで表示される行数（パネルのページ表示用）
+_page_totals = {}
+
+
+def is_packed(props):
+    return props.storage == 'PACKED'
+
+
+def get_packed(props):
+    """props.packed_mappings をデコードした PackedMappings"""
+    key = props.as_pointer()
+    packed = _packed.get(key)
+    if packed is None:
+        packed = _packed[key] = PackedMappings.from_blob(props.packed_mappings)
+    return packed
+
+
+def save_packed(props, packed):
+    """PackedMappings を文字列 1 本にして保存する"""
+    _packed[props.as_pointer()] = packed
+    props.packed_mappings = packed.to_blob()
+
+
+def mapping_count(props):
+    return len(get_packed(props)) if is_packed(props) else len(props.mappings)
+
+
+def mapping_sources(props):
+    if is_packed(props):
+        return get_packed(props).sources
+    return [item.source_name for item in props.mappings]
+
+
+def mapping_targets(props):
+    if is_packed(props):
+        return get_packed(props).targets
+    return [item.target_name for item in props.mappings]
+
+
+def mapping_rows(props):
+    """一覧の全行を (source, target) のリストで返す"""
+    if is_packed(props):
+        return list(get_packed(props).rows())
+    return [(item.source_name, item.target_name) for item in props.mappings]
+
+
+def clear_mappings(props):
+    props.mappings.clear()
+    props.folds.clear()
+    props.page_rows.clear()
+    props.packed_mappings = ""
+    props.page = 0
+    _packed.pop(props.as_pointer(), None)
+    invalidate_view_cache(props)
+
+
+# 一覧へまとめて書き込んでいる間は 0 より大きい（target_name の update コールバックを止める）
+_bulk_depth = 0
+
+
+@contextlib.contextmanager
+def bulk_filling():
+    """行をまとめて書き込む間、行ごとの update コールバックを止める
+
+    表示用キャッシュの破棄・更新は呼び出し側がまとめて行う。
+    """
+    global _bulk_depth
+    _bulk_depth += 1
+    try:
+        yield
+    finally:
+        _bulk_depth -= 1
+
+
+def set_mappings(props, rows, source_obj):
+    """一覧を rows（(source, target または None, ...)）で置き換え、折りたたみを全て展開に戻す"""
+    clear_mappings(props)
+    if is_packed(props):
+        rows = list(rows)
+        save_packed(props, PackedMappings([row[0] for row in rows], [row[1] or "" for row in rows]))
+    else:
+        fill_mappings(props, rows)
+        reset_folds(props, source_obj)
+
+
+def update_targets(props, changes):
+    """{行: ターゲット名} をまとめて反映し、変更した行数を返す"""
+    changed = 0
+    if not is_packed(props):
+        # 行ごとの update コールバックは止め、表示用キャッシュはここでまとめて直す
+        mappings = props.mappings
+        cached = _view_indices.get(props.as_pointer())
+        view = cached[1] if cached is not None else None
+        with bulk_filling():
+            for row, name in changes.items():
+                item = mappings[row]
+                if item.target_name != name:
+                    item.target_name = name
+                    if view is not None:
+                        view.update_row(row, item.source_name, name)
+                    changed += 1
+        if changed and view is not None:
+            view.invalidate_order('TARGET')
+        return changed
+
+    packed = get_packed(props)
+    view = get_view_index(props)
+    for row, name in changes.items():
+        if packed.targets[row] != name:
+            packed.targets[row] = name
+            view.update_row(row, packed.sources[row], name)
+            changed += 1
+    if changed:
+        view.invalidate_order('TARGET')
+        save_packed(props, packed)
+        rebuild_page(props)
+    return changed
+
+
+def refresh_list(props):
+    """一覧を書き換えた後に、各ソートモードの並びと（PACKED なら）表示ページを作り直す"""
+    precompute_row_orders(props)
+    rebuild_page(props)
+
+
+def rebuild_page(props):
+    """PACKED: 検索・並べ替え・折りたたみを反映した現在のページを page_rows に書き込む"""
+    if not is_packed(props):
+        return
+    packed = get_packed(props)
+    view = get_view_index(props)
+    flags = view.filter_flags(
+        props.filter_string.lower().strip(),
+        lambda: [search_key(source, target) for source, target in packed.rows()],
+        uses_hierarchy_view(props),
+        1,
+    )
+    # 元の行 → 表示位置 を 表示位置 → 元の行 に直して、表示される行だけを残す
+    positions = get_row_order(props)
+    ranked = [0] * len(positions)
+    for row, position in enumerate(positions):
+        ranked[position] = row
+    rows = [row for row in ranked if flags[row]]
+    _page_totals[props.as_pointer()] = len(rows)
+
+    page_size = props.page_size
+    last_page = max(0, (len(rows) - 1) // page_size)
+    if props.page > last_page:
+        props.page = last_page
+    start = props.page * page_size
+
+    page_rows = props.page_rows
+    page_rows.clear()
+    with bulk_filling():
+        for row in rows[start:start + page_size]:
+            item = page_rows.add()
+            item.row = row
+            item.source_name = packed.sources[row]
+            item.target_name = packed.targets[row]
+    if props.active_index >= len(page_rows):
+        props.active_index = max(0, len(page_rows) - 1)
+
+
+def get_active_item(props):
+    """リストで選択中の行（PACKED ならページ行）。無ければ None"""
+    items = props.page_rows if is_packed(props) else props.mappings
+    if 0 <= props.active_index < len(items):
+        return items[props.active_index]
+    return None
+
+
+def get_page_total(props):
+    """現在の検索・折りたたみで表示される行数（不明なら None）"""
+    return _page_totals.get(props.as_pointer())
+
+
+@bpy.app.handlers.persistent
+def _on_undo_or_load(*_args):
+    # Undo / Redo / ファイル読み込みで RNA 側の状態が差し替わるため全破棄
+    invalidate_skeleton()
+    invalidate_view_cache()
+    _packed.clear()
+    _page_totals.clear()
+
+
+@bpy.app.handlers.persistent
+def _on_depsgraph_update(scene, depsgraph):
+    # ボーンの追加・削除・リネーム・編集モードでの変更で Skeleton を破棄する。
+    # 選択・ポーズ・トランスフォームだけの更新ではボーン数も名前の並びも変わらないので残す
+    for update in depsgraph.updates:
+        if not isinstance(update.id, bpy.types.Armature):
+            continue
+        armature = update.id.original
+        key = armature.as_pointer()
+        cached = _skeletons.get(key)
+        if cached is None or armature.is_editmode:
+            # 編集中は bones が変わらない（編集モードを抜けた時にジオメトリ更新が来る）
+            continue
+        bones = armature.bones
+        if update.is_updated_geometry or len(bones) != len(cached) or bones.keys() != cached.names:
+            _skeletons.pop(key, None)
+
+
+# マッピング1行分
+def _on_target_name_update(self, context):
+    if _bulk_depth:
+        return
+    props = self.id_data.bone_mapper
+    row = self.row
+    if row >= 0:
+        # PACKED のページ行: 編集を PackedMappings に書き戻す（ページ作成時の代入は同じ値なので無視）
+        if not is_packed(props):
+            return
+        packed = get_packed(props)
+        if row >= len(packed) or packed.targets[row] == self.target_name:
+            return
+        packed.targets[row] = self.target_name
+        save_packed(props, packed)
+
+    # ターゲット名の編集で古くなるのは Target Name ソートの並びと、その行の検索キーだけ
+    cached = _view_indices.get(props.as_pointer())
+    if cached is not None:
+        view = cached[1]
+        view.invalidate_order('TARGET')
+        if row < 0:
+            row = view.row_of.get(self.source_name)
+        if row is not None and row < len(view):
+            view.update_row(row, self.source_name, self.target_name)
+
+
+# 検索欄のドロップダウンに出す候補数
+SEARCH_SUGGESTIONS = 12
+
+
+def _search_target_names(self, context, edit_text):
+    # 入力中の文字列に近いターゲット名 → ソース名に近いターゲット名（マッチャーの次点を含む）の順
+    props = context.scene.bone_mapper
+    results = []
+    seen = set()
+    for text in (edit_text, self.source_name):
+        for name, reason in suggest_targets(props, text, SEARCH_SUGGESTIONS):
+            if name not in seen and len(results) < SEARCH_SUGGESTIONS:
+                seen.add(name)
+                results.append((name, reason))
+    return results
+
+
+# 検索付きの StringProperty は Blender 3.3+
+_TARGET_NAME_SEARCH = (
+    {"search": _search_target_names, "search_options": {'SUGGESTION'}}
+    if bpy.app.version >= (3, 3, 0) else {}
+)
+
+
+class BoneMappingItem(bpy.types.PropertyGroup):
+    source_name: bpy.props.StringProperty(name="Source")
+    target_name: bpy.props.StringProperty(name="Target", update=_on_target_name_update, **_TARGET_NAME_SEARCH)
+    # PACKED 表示のページ行の場合は元の行番号（props.mappings の行では -1）
+    row: bpy.props.IntProperty(default=-1)
+
+
+# 折りたたみ状態保存用
+class BoneFoldItem(bpy.types.PropertyGroup):
+    bone_name: bpy.props.StringProperty()
+    expanded: bpy.props.BoolProperty(default=True)
+
+
+def _on_list_view_update(self, context):
+    # 検索語・並び替え・ページサイズの変更。PACKED ならページを作り直す
+    # （COLLECTION は filter_items で差し替えるだけ）
+    if is_packed(self):
+        rebuild_page(self)
+    tag_redraw_sidebar(context)
+
+
+def _on_storage_update(self, context):
+    """保存形式を切り替えたら、既存の一覧（手動修正・折りたたみ状態を含む）を移し替える"""
+    props = self
+    invalidate_view_cache(props)
+    props.active_index = 0
+    if is_packed(props):
+        collapsed = {f.bone_name for f in props.folds if not f.expanded}
+        rows = [(item.source_name, item.target_name) for item in props.mappings]
+        props.mappings.clear()
+        props.folds.clear()
+        props.page = 0
+        save_packed(props, PackedMappings(
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            [i for i, row in enumerate(rows) if row[0] in collapsed],
+        ))
+    else:
+        packed = get_packed(props)
+        props.page_rows.clear()
+        props.packed_mappings = ""
+        _packed.pop(props.as_pointer(), None)
+        fill_mappings(props, packed.rows())
+        if props.source:
+            collapsed = {packed.sources[row] for row in packed.collapsed_rows()}
+            reset_folds(props, props.source)
+            for f in props.folds:
+                if f.bone_name in collapsed:
+                    f.expanded = False
+    invalidate_view_cache(props)
+    refresh_list(props)
+
+
+class BoneMapperProperties(bpy.types.PropertyGroup):
+    source: bpy.props.PointerProperty(name="Source Armature", type=bpy.types.Object)
+    target: bpy.props.PointerProperty(name="Target Armature", type=bpy.types.Object)
+    mappings: bpy.props.CollectionProperty(type=BoneMappingItem)
+    active_index: bpy.props.IntProperty()
+    folds: bpy.props.CollectionProperty(type=BoneFoldItem)
+    filter_string: bpy.props.StringProperty(
+        name="Filter", default="", options={'TEXTEDIT_UPDATE'}, update=_on_list_view_update,
+    )
+
+    # 一覧の保存形式（大きなリグでは PACKED で Undo・保存のコストを抑える）
+    storage: bpy.props.EnumProperty(
+        name="Storage",
+        items=[
+            ('COLLECTION', "Per Row", "One property group per bone (simple; heavier undo and save on large rigs)"),
+            ('PACKED', "Packed", "All rows in one compressed string; the list shows one page at a time"),
+        ],
+        default='COLLECTION',
+        update=_on_storage_update,
+    )
+    packed_mappings: bpy.props.StringProperty(options={'HIDDEN'})
+    page_rows: bpy.props.CollectionProperty(type=BoneMappingItem)
+    page: bpy.props.IntProperty(min=0)
+    page_size: bpy.props.IntProperty(
+        name="Rows per Page", default=200, min=20, max=2000, update=_on_list_view_update,
+    )
+
+    # 選択行のターゲット候補の表示件数
+    suggestion_count: bpy.props.IntProperty(name="Suggestions", default=5, min=1, max=20)
+
+    # マッピングキャッシュ（同じリグの再インポート時に結果を即復元）
+    use_cache: bpy.props.BoolProperty(
+        name="Use Mapping Cache",
+        description="Restore mappings (including manual edits) stored for the same pair of armatures",
+        default=True,
+    )
+    cache_partial: bpy.props.BoolProperty(
+        name="Reuse Partial Matches",
+        description="On a cache miss, reuse rows cached for the same target and only match new bones",
+        default=True,
+    )
+    # 構造マッチング（名前で見つからないボーンを親子構造の一致で対応付ける）
+    use_topology: bpy.props.BoolProperty(
+        name="Match by Structure",
+        description="Match bones left unmatched by name to target bones with the same subtree shape",
+        default=False,
+    )
+    # 空間マッチング（名前で見つからないボーンをレスト位置で対応付ける）
+    use_spatial: bpy.props.BoolProperty(
+        name="Match by Position",
+        description="Match bones left unmatched by name to the nearest free target bone in rest pose",
+        default=False,
+    )
+    spatial_max_distance: bpy.props.FloatProperty(
+        name="Max Distance",
+        description="Largest head/tail distance accepted, relative to the armature height",
+        default=0.05,
+        min=0.0,
+        soft_max=0.5,
+    )
+    cache_size_mb: bpy.props.IntProperty(
+        name="Cache Size (MB)",
+        description="Oldest cache entries are removed beyond this size",
+        default=64,
+        min=1,
+    )
+    rules_directory: bpy.props.StringProperty(
+        name="Rule Packs",
+        description="Extra folder of *.json rule packs (synonyms, prefixes, suffixes, side markers, fingers), "
+                    "reloaded automatically when they change",
+        subtype='DIR_PATH',
+        default="",
+    )
+    # 適用時にアクションの F カーブ（pose.bones["..."]）とグループも新しいボーン名へ書き換える
+    remap_actions: bpy.props.EnumProperty(
+        name="Remap Actions",
+        items=[
+            ('NONE', "Bones Only", "Only rename bones (Blender still fixes the source's assigned actions per bone)"),
+            ('SOURCE', "Source Action", "Rewrite the source armature's active action in one pass instead of once per bone"),
+            ('MATCHING', "Matching Actions", "Rewrite every action whose name matches the filter (wildcards * and ?)"),
+            ('ALL', "All Actions", "Rewrite every action in the file that no other object uses"),
+        ],
+        default='NONE',
+    )
+    action_filter: bpy.props.StringProperty(name="Action Filter", default="*")
+    # ステージ別の計測（オプトイン）
+    use_profiling: bpy.props.BoolProperty(
+        name="Collect Statistics",
+        description="Record wall time and hit counts per matching stage, normalization cache hits, "
+                    "traversal and apply time",
+        default=False,
+    )
+    show_stats: bpy.props.BoolProperty(name="Statistics", default=False)
+    
+    def update_sort_mode(self, context):
+        # 行は常に階層順で保持しているので、並び替えは filter_items（PACKED ならページ）で
+        # 差し替えるだけ（手動修正や折りたたみ状態は失われない）
+        _on_list_view_update(self, context)
+    
+    sort_mode: bpy.props.EnumProperty(
+        name="Sort by",
+        items=[
+            ('SOURCE', "Source Name", ""),
+            ('TARGET', "Target Name", ""),
+            ('SOURCE_HIER', "Source Hierarchy", ""),
+            ('SOURCE_HIER_SIMPLE', "Hierarchy (Simple)", ""),
+        ],
+        default='SOURCE_HIER',
+        update=update_sort_mode,
+    )
+
+
+# 直近の計測結果（props ごと）。パネルの Statistics 欄と JSON 書き出しで使う
+_stats_reports = {}
+
+
+def _section(profile, name):
+    """profile が無ければ何もしない計測区間"""
+    return profile.section(name) if profile is not None else contextlib.nullcontext()
+
+
+def get_stats_report(props):
+    return _stats_reports.get(props.as_pointer())
+
+
+def store_stats_report(props, profile, source_obj, target_obj, rows):
+    """MatchProfile を書き出し用の dict にして保持する"""
+    report = profile.to_dict()
+    report.update(
+        source=source_obj.name,
+        target=target_obj.name if target_obj else "",
+        source_bones=len(source_obj.data.bones),
+        target_bones=len(target_obj.data.bones) if target_obj else 0,
+        rows=len(rows),
+        matched=sum(1 for row in rows if row[1]),
+        blender=bpy.app.version_string,
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+    )
+    _stats_reports[props.as_pointer()] = report
+    return report
+
+
+def compute_mapping_rows(props, source_obj, target_obj, target=None, tgt_index=None, profile=None):
+    """1 組分のマッピング行 [source, target または None, stage] を階層順で求める
+
+    target / tgt_index を渡すとターゲット側の Skeleton と索引を使い回す（一括処理用）。
+    profile (MatchProfile) を渡すと区間ごとの時間とヒット数を記録する。
+    戻り値は (rows, stats)。stats はステージ別の件数とキャッシュ用のシグネチャ。
+    """
+    return run_steps(iter_mapping_rows(props, source_obj, target_obj, target, tgt_index, profile))
+
+
+def _iter_stage(steps, phase, rows, total, profile=None, section=None):
+    """コアの段階ジェネレーターを進め、区切りごとに (phase, rows, total) を yield して戻り値を返す
+
+    profile の section には処理中の時間だけを加算する（yield で止まっている間は含めない）。
+    """
+    clock = time.perf_counter
+    while True:
+        start = clock()
+        try:
+            next(steps)
+        except StopIteration as done:
+            return done.value
+        finally:
+            if profile is not None:
+                profile.add(section, clock() - start)
+        yield phase, rows, total
+
+
+def iter_mapping_rows(props, source_obj, target_obj, target=None, tgt_index=None, profile=None,
+                      chunk=256):
+    """compute_mapping_rows の本体を、途中経過を返しながら少しずつ進めるジェネレーターを返す
+
+    スナップショット・索引の作成・各ステージとも chunk 件ごとに (phase, rows, total) を
+    yield する。rows はその時点までの結果そのもの（中断時の部分結果に使える）。
+    最後に (rows, stats) を返す。
+    設定・キャッシュのキー（ルールパックを含む）・ワールド行列はこの関数を呼んだ時点で読み込むので、
+    モーダル実行中にパネルの設定を変えても結果には影響しない。
+    """
+    cache = get_mapping_cache(props) if props.use_cache else None
+    spatial = None
+    if props.use_spatial:
+        spatial = {
+            "source_matrix": [list(r) for r in source_obj.matrix_world],
+            "target_matrix": [list(r) for r in target_obj.matrix_world],
+            "max_distance": props.spatial_max_distance,
+        }
+    return _iter_mapping_rows(
+        source_obj.data.bones, target_obj.data.bones, target, tgt_index, profile, chunk,
+        cache, props.cache_partial, mapping_cache_variant(props), props.use_topology, spatial,
+    )
+
+
+def _iter_mapping_rows(source_bones, target_bones, target, tgt_index, profile, chunk,
+                       cache, cache_partial, variant, use_topology, spatial):
+    rows = []
+    total = len(source_bones)
+    source = yield from _iter_stage(
+        iter_skeleton(source_bones, chunk), "snapshot", rows, total, profile, "snapshot",
+    )
+    if target is None:
+        target = yield from _iter_stage(
+            iter_skeleton(target_bones, chunk), "snapshot", rows, total, profile, "snapshot",
+        )
+    if tgt_index is None:
+        # 生成ごとに作り直して（ルールパックの変更を反映）、一覧の候補提示でも使う
+        tgt_index = yield from _iter_stage(
+            TargetNameIndex.iter_build(target.names, chunk), "index", rows, total, profile, "index",
+        )
+        _target_indices[target_bones.id_data.as_pointer()] = (target, tgt_index)
+    stats = {"cached": 0, "topology": 0, "spatial": 0, "exact_hit": False, "signatures": None}
+
+    # キャッシュ: 完全一致 → 同じターゲットの部分一致 の順に探す
+    cached_rows = None
+    if cache is not None:
+        with _section(profile, "cache_load"):
+            signatures = (skeleton_signature(source), skeleton_signature(target), variant)
+        yield "cache", rows, total
+        with _section(profile, "cache_load"):
+            stats["signatures"] = signatures
+            cached_rows = cache.load(*signatures)
+            stats["exact_hit"] = cached_rows is not None
+            if cached_rows is None and cache_partial:
+                cached_rows, _overlap = cache.load_partial(signatures[1], source.names, signatures[2])
+
+    # 行は常に階層順で作成し、他のソートモードは並べ替えの差し替えで表示する
+    # 完全一致 → 正規化一致 → 部分一致 → 空欄 の順に判定（core）
+    with _section(profile, "traversal"):
+        order = source.hierarchy_order()
+    for row in generate_mapping(order, tgt_index, cached_rows, profile):
+        rows.append(list(row))
+        if len(rows) % chunk == 0:
+            yield "names", rows, total
+    stats["cached"] = sum(1 for row in rows if row[2] == STAGE_CACHED)
+
+    # 名前で見つからなかった行を親子構造の一致で補完
+    if use_topology:
+        stats["topology"] = yield from _iter_stage(
+            iter_match_topology(rows, source, target, chunk), "topology", rows, total, profile, "topology",
+        )
+        if profile is not None:
+            profile.add("topology", hits=stats["topology"])
+
+    # 残りをレスト位置の近さで補完
+    if spatial is not None:
+        stats["spatial"] = yield from _iter_stage(
+            iter_match_spatial(rows, source, target, chunk=chunk, **spatial),
+            "spatial", rows, total, profile, "spatial",
+        )
+        if profile is not None:
+            profile.add("spatial", hits=stats["spatial"])
+    return rows, stats
+
+
+def fill_mappings(props, rows):
+    """(source, target または None, ...) の行を一覧の末尾にまとめて追加する
+
+    表示用キャッシュは呼び出し側で破棄する（行ごとの update コールバックは呼ばない）。
+    """
+    with bulk_filling():
+        for source_name, target_name, *_rest in rows:
+            item = props.mappings.add()
+            item.source_name = source_name
+            item.target_name = target_name or ""
+
+
+def reset_folds(props, source_obj):
+    """折りたたみ状態を初期化（全て展開）"""
+    props.folds.clear()
+    for bone_name in get_skeleton(source_obj.data.bones).names:
+        fold_item = props.folds.add()
+        fold_item.bone_name = bone_name
+        fold_item.expanded = True
+
+
+def store_mapping_rows(props, source_obj, target_obj, rows):
+    """手動修正を含む (source, target) の行を、現在のシグネチャでキャッシュに保存"""
+    if props.use_cache:
+        get_mapping_cache(props).store(
+            skeleton_signature(get_skeleton(source_obj.data.bones)),
+            skeleton_signature(get_skeleton(target_obj.data.bones)),
+            mapping_cache_variant(props),
+            rows,
+        )
+
+
+def apply_renames(source_obj, rows):
+    """(source, target) の行を衝突の起きない順序で一括リネームし、RenamePlan を返す"""
+    bones = source_obj.data.bones
+    # 連鎖・入れ替えでも .001 が付かない順序を先に計算してから一括で実行
+    plan = plan_renames(rows, get_skeleton(bones).names)
+    for old_name, new_name in plan.steps:
+        bones[old_name].name = new_name
+    # ボーン名が変わったので Skeleton を作り直す
+    invalidate_skeleton(bones)
+    return plan
+
+
+# ---------------------------------------------------------------------------
+# アクションの書き換え
+# ボーンを RNA でリネームすると、Blender はそのアーマチュアを使うオブジェクトのアクティブな
+# アクションと NLA ストリップのアクションを、1 ボーンごとに全カーブ走査して直す。
+# 対象のアクティブなアクションはリネームの間だけ外し、全対象を 1 アクション 1 パスで書き換える。
+# ---------------------------------------------------------------------------
+
+def iter_action_channels(action):
+    """アクションの (fcurves, groups) を返す。Blender 4.4+ のスロット付きアクションは全チャンネルバッグ分"""
+    layers = getattr(action, "layers", None)
+    if layers:
+        for layer in layers:
+            for strip in layer.strips:
+                for channelbag in getattr(strip, "channelbags", ()):
+                    yield channelbag.fcurves, channelbag.groups
+    else:
+        yield getattr(action, "fcurves", ()), getattr(action, "groups", ())
+
+
+class ActionRemap:
+    """Apply Mapping で書き換えるアクションの選択と、リネーム前後の付け外し"""
+
+    def __init__(self, source_obj, scope, pattern="*"):
+        armature = source_obj.data
+        fixed = set()    # リネーム時に Blender が直す（ソースの NLA ストリップ・Tweak 中のアクション）
+        foreign = set()  # ソース以外のオブジェクトが使っている
+        actives = []
+        for ob in bpy.data.objects:
+            adt = ob.animation_data
+            if adt is None:
+                continue
+            strips = {strip.action for track in adt.nla_tracks for strip in track.strips if strip.action}
+            if ob.data == armature:
+                fixed |= strips
+                if adt.action is not None:
+                    if adt.use_tweak_mode:
+                        fixed.add(adt.action)
+                    else:
+                        actives.append(adt)
+            else:
+                foreign |= strips
+                if adt.action is not None:
+                    foreign.add(adt.action)
+
+        if scope == 'SOURCE':
+            candidates = {adt.action for adt in actives}
+        elif scope == 'MATCHING':
+            candidates = {action for action in bpy.data.actions if fnmatch.fnmatchcase(action.name, pattern)}
+        else:
+            candidates = set(bpy.data.actions)
+
+        # 外したアクティブなアクション以外で Blender が直すものは二重に書き換えない
+        self._actives = [adt for adt in actives if adt.action in candidates - fixed - foreign]
+        self.actions = sorted(candidates - fixed - foreign, key=lambda action: action.name)
+        self.skipped = len((candidates & foreign) - fixed - {adt.action for adt in actives})
+        self._detached = []
+
+    def detach(self):
+        for adt in self._actives:
+            self._detached.append((adt, adt.action, getattr(adt, "action_slot", None)))
+            adt.action = None
+
+    def restore(self):
+        for adt, action, slot in self._detached:
+            adt.action = action
+            if slot is not None:
+                adt.action_slot = slot
+        self._detached.clear()
+
+    def run(self, renames):
+        """renames（{元の名前: 新しい名前}）で全対象を書き換え、(カーブ数, 秒) を返す"""
+        start = time.perf_counter()
+        remapper = DataPathRemapper(renames)
+        touched = 0
+        if remapper.table:
+            for action in self.actions:
+                for fcurves, groups in iter_action_channels(action):
+                    touched += remapper.remap_channels(fcurves, groups)
+        return touched, time.perf_counter() - start
+
+
+def format_stage_notes(stats):
+    notes = []
+    if stats["cached"]:
+        notes.append(f"{stats['cached']} restored from cache")
+    if stats["topology"]:
+        notes.append(f"{stats['topology']} matched by structure")
+    if stats["spatial"]:
+        notes.append(f"{stats['spatial']} matched by position")
+    return f" ({', '.join(notes)})" if notes else ""
+
+
+# 実行中のモーダル生成の進捗（props ごと）。パネルの進捗表示で使う
+_generation_jobs = {}
+
+
+def get_generation_job(props):
+    return _generation_jobs.get(props.as_pointer())
+
+
+def tag_redraw_sidebar(context):
+    for area in context.screen.areas:
+        if area.type == 'VIEW_3D':
+            area.tag_redraw()
+
+
+# マッピング生成
+class ARMATURE_OT_generate_mapping(bpy.types.Operator):
+    bl_idname = "armature.generate_mapping"
+    bl_label = "Generate Mapping (Stepwise)"
+    bl_description = (
+        "Match every source bone to a target bone. Large rigs are processed in the background "
+        "(Esc cancels and keeps the rows computed so far)"
+    )
+
+    # これ以上のボーン数ではボタンから実行した時にモーダルで少しずつ処理する
+    MODAL_MIN_BONES = 2000
+    # 1 回のタイマーで処理に使う時間（秒）
+    SLICE_SECONDS = 0.03
+
+    def start(self, context):
+        """共通の前処理。続行できなければ False"""
+        props = context.scene.bone_mapper
+        if not props.source or not props.target:
+            self.report({'WARNING'}, "Source and Target must be set")
+            return False
+        if get_generation_job(props) is not None:
+            self.report({'WARNING'}, "Mapping generation is already running")
+            return False
+
+        clear_mappings(props)
+
+        # 実行中にパネルの指定やアクティブなシーンが変わっても、開始時のシーンとアーマチュアに書き込む
+        self._props = props
+        self._source = props.source
+        self._target = props.target
+        self._profile = MatchProfile() if props.use_profiling else None
+
+        # 変更されたルールパックがあれば正規化パターンを作り直す
+        with _section(self._profile, "rules"):
+            refresh_rule_packs(props)
+        # 再コンパイルで正規化キャッシュが空になるので、カウンタの基準はその後で取る
+        if self._profile is not None:
+            self._profile.begin()
+        return True
+
+    def execute(self, context):
+        if not self.start(context):
+            return {'CANCELLED'}
+        rows, stats = compute_mapping_rows(self._props, self._source, self._target, profile=self._profile)
+        self.finish(context, rows, stats)
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        props = context.scene.bone_mapper
+        if not props.source or len(props.source.data.bones) < self.MODAL_MIN_BONES:
+            return self.execute(context)
+        if not self.start(context):
+            return {'CANCELLED'}
+
+        self._steps = iter_mapping_rows(self._props, self._source, self._target, profile=self._profile)
+        self._rows = []
+        self._job = _generation_jobs[self._props.as_pointer()] = {
+            "phase": "snapshot",
+            "done": 0,
+            "total": len(self._source.data.bones),
+        }
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.progress_begin(0, self._job["total"])
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            self.stop(context)
+            self.finish(context, self._rows, None)
+            return {'CANCELLED'}
+        if event.type != 'TIMER':
+            # ビューポート操作などはそのまま通す（タイマーはこのオペレーターが登録した 1 つだけ）
+            return {'PASS_THROUGH'}
+
+        # 例外でモーダルが終わると片付けが走らず、このシーンで再実行できなくなるので必ず stop する
+        try:
+            deadline = time.perf_counter() + self.SLICE_SECONDS
+            try:
+                while time.perf_counter() < deadline:
+                    phase, self._rows, total = next(self._steps)
+            except StopIteration as done:
+                self.stop(context)
+                self.finish(context, *done.value)
+                return {'FINISHED'}
+
+            self._job.update(phase=phase, done=len(self._rows), total=total)
+            context.window_manager.progress_update(len(self._rows))
+            context.workspace.status_text_set(
+                f"Bone Mapper: {phase} {len(self._rows)}/{total} bones (Esc to cancel)"
+            )
+            tag_redraw_sidebar(context)
+            return {'RUNNING_MODAL'}
+        except Exception as error:
+            self.stop(context)
+            traceback.print_exc()
+            self.report({'ERROR'}, f"Mapping generation failed: {error}")
+            return {'CANCELLED'}
+
+    def cancel(self, context):
+        # ファイル読み込みなどで外部から中断された場合は結果を捨てる
+        self.stop(context)
+
+    def stop(self, context):
+        """タイマーと進捗表示を片付ける（二度目以降は何もしない）"""
+        if self._timer is None:
+            return
+        _generation_jobs.pop(self._props.as_pointer(), None)
+        self._steps.close()
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        self._timer = None
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        tag_redraw_sidebar(context)
+
+    def finish(self, context, rows, stats):
+        """結果をまとめて一覧に書き込む。stats が None なら中断（部分結果）"""
+        props = self._props
+        profile = self._profile
+
+        with _section(profile, "fill"):
+            set_mappings(props, rows, self._source)
+
+        # 部分結果はキャッシュに保存しない
+        if stats is not None and props.use_cache and not (stats["exact_hit"] and stats["cached"] == len(rows)):
+            with _section(profile, "cache_store"):
+                get_mapping_cache(props).store(*stats["signatures"], ((row[0], row[1]) for row in rows))
+
+        # 行ごとの表示メタデータと各ソートモードの並びを生成時に一度だけ計算
+        with _section(profile, "view"):
+            refresh_list(props)
+
+        if profile is not None:
+            profile.end()
+            store_stats_report(props, profile, self._source, self._target, rows)
+
+        # ソースとターゲットのボーン数の違いを報告
+        matched_count = sum(1 for row in rows if row[1])
+        unmatched_count = len(rows) - matched_count
+
+        if stats is None:
+            total = len(self._source.data.bones)
+            self.report(
+                {'WARNING'},
+                f"Cancelled: kept {len(rows)}/{total} mappings ({matched_count} matched, {unmatched_count} unmatched)",
+            )
+        else:
+            self.report({'INFO'}, f"Generated {len(rows)} mappings: {matched_count} matched, {unmatched_count} unmatched{format_stage_notes(stats)}")
+
+
+# リネーム実行
+class ARMATURE_OT_apply_mapping(bpy.types.Operator):
+    bl_idname = "armature.apply_mapping"
+    bl_label = "Apply Mapping"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        props = context.scene.bone_mapper
+        if not props.source:
+            self.report({'WARNING'}, "Source Armature not set")
+            return {'CANCELLED'}
+
+        rows = mapping_rows(props)
+
+        # 手動修正を含む最終結果を、リネーム前のシグネチャでキャッシュに保存
+        if props.target and rows:
+            store_mapping_rows(props, props.source, props.target, rows)
+
+        remap = None
+        if props.remap_actions != 'NONE':
+            remap = ActionRemap(props.source, props.remap_actions, props.action_filter)
+            remap.detach()
+
+        start = time.perf_counter()
+        try:
+            plan = apply_renames(props.source, rows)
+        finally:
+            if remap is not None:
+                remap.restore()
+        elapsed = time.perf_counter() - start
+
+        # 実際にリネームした名前だけでアクションを書き換える
+        action_note = ""
+        if remap is not None:
+            touched, action_seconds = remap.run(plan.final_names())
+            action_note = f"; remapped {touched} curves in {len(remap.actions)} actions ({action_seconds * 1000:.1f} ms)"
+            if remap.skipped:
+                action_note += f", skipped {remap.skipped} actions used by other objects"
+
+        # ソース側のボーン名が変わったので階層キャッシュを作り直す
+        invalidate_view_cache(props)
+        rebuild_page(props)
+
+        # 生成時の計測結果に適用時間を追記する
+        if props.use_profiling:
+            report = get_stats_report(props)
+            if report is None:
+                report = store_stats_report(props, MatchProfile(), props.source, props.target, rows)
+            report["stages"]["apply"] = {"seconds": round(elapsed, 6), "hits": plan.renamed}
+            if remap is not None:
+                report["stages"]["actions"] = {"seconds": round(action_seconds, 6), "hits": touched}
+            report["total_seconds"] = round(sum(entry["seconds"] for entry in report["stages"].values()), 6)
+
+        if plan.collisions:
+            self.report(
+                {'WARNING'},
+                f"Renamed {plan.renamed} bones; skipped {len(plan.collisions)} collisions "
+                f"(e.g. {plan.collisions[0][0]} -> {plan.collisions[0][1]}); "
+                f"resolved {plan.cycles} cycles{action_note}",
+            )
+        else:
+            self.report({'INFO'}, f"Renamed {plan.renamed} bones; resolved {plan.cycles} cycles{action_note}")
+        return {'FINISHED'}
+
+
+# 選択中の全アーマチュアを一括マッピング
+class ARMATURE_OT_batch_map_selected(bpy.types.Operator):
+    bl_idname = "armature.batch_map_selected"
+    bl_label = "Map Selected Armatures"
+    bl_description = (
+        "Generate and apply mappings for every selected armature against the Target Armature, "
+        "sharing one target index"
+    )
+    bl_options = {'REGISTER', 'UNDO'}
+
+    apply: bpy.props.BoolProperty(
+        name="Apply",
+        description="Rename the bones; disable to only report how well each armature matches",
+        default=True,
+    )
+
+    def execute(self, context):
+        props = context.scene.bone_mapper
+        if not props.target:
+            self.report({'WARNING'}, "Target Armature not set")
+            return {'CANCELLED'}
+
+        sources = [
+            obj for obj in context.selected_objects
+            if obj.type == 'ARMATURE' and obj.data is not props.target.data
+        ]
+        if not sources:
+            self.report({'WARNING'}, "Select one or more armatures other than the Target")
+            return {'CANCELLED'}
+
+        refresh_rule_packs(props)
+
+        # ターゲットの Skeleton と正規化済み索引は全ソースで共有
+        target = get_skeleton(props.target.data.bones)
+        tgt_index = TargetNameIndex(target.names)
+
+        total_rows = matched = renamed = collisions = cycles = 0
+        for obj in sources:
+            rows, _stats = compute_mapping_rows(props, obj, props.target, target, tgt_index)
+            total_rows += len(rows)
+            matched += sum(1 for row in rows if row[1] is not None)
+            if not self.apply:
+                continue
+
+            pairs = [(row[0], row[1] or "") for row in rows]
+            store_mapping_rows(props, obj, props.target, pairs)
+            plan = apply_renames(obj, pairs)
+            renamed += plan.renamed
+            collisions += len(plan.collisions)
+            cycles += plan.cycles
+
+        if props.source in sources:
+            invalidate_view_cache(props)
+            rebuild_page(props)
+
+        summary = f"{len(sources)} armatures: {matched}/{total_rows} bones matched"
+        if self.apply:
+            summary += f"; renamed {renamed}, skipped {collisions} collisions, resolved {cycles} cycles"
+        self.report({'WARNING'} if collisions else {'INFO'}, summary)
+        return {'FINISHED'}
+
+
+# キャッシュ削除
+class ARMATURE_OT_clear_mapping_cache(bpy.types.Operator):
+    bl_idname = "armature.clear_mapping_cache"
+    bl_label = "Clear Mapping Cache"
+    bl_description = "Delete every mapping stored in the on-disk cache"
+
+    def execute(self, context):
+        get_mapping_cache(context.scene.bone_mapper).clear()
+        self.report({'INFO'}, "Mapping cache cleared")
+        return {'FINISHED'}
+
+
+# マッピングの書き出し / 読み込み（CSV / JSON / JSON Lines）
+class ARMATURE_OT_export_mappings(bpy.types.Operator, ExportHelper):
+    bl_idname = "armature.export_mappings"
+    bl_label = "Export Mappings"
+    bl_description = "Write the mapping list (including manual edits) to a CSV, JSON or JSON Lines file"
+
+    filename_ext = ".csv"
+    filter_glob: bpy.props.StringProperty(default="*.csv;*.json;*.jsonl", options={'HIDDEN'})
+    file_format: bpy.props.EnumProperty(
+        name="Format",
+        items=[
+            ('csv', "CSV", "source,target with a header row (spreadsheets)"),
+            ('json', "JSON", "Array of {\"source\", \"target\"} objects"),
+            ('jsonl', "JSON Lines", "One {\"source\", \"target\"} object per line (diff friendly)"),
+        ],
+        default='csv',
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return mapping_count(context.scene.bone_mapper) > 0
+
+    def check(self, context):
+        # 形式を切り替えたらファイル名の拡張子も合わせる
+        self.filename_ext = MAPPING_FORMATS[self.file_format]
+        return super().check(context)
+
+    def execute(self, context):
+        props = context.scene.bone_mapper
+        try:
+            count = write_mapping_rows(self.filepath, mapping_rows(props), self.file_format)
+        except OSError as e:
+            self.report({'ERROR'}, f"Could not write {self.filepath}: {e}")
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"Exported {count} mappings to {self.filepath}")
+        return {'FINISHED'}
+
+
+class ARMATURE_OT_import_mappings(bpy.types.Operator, ImportHelper):
+    bl_idname = "armature.import_mappings"
+    bl_label = "Import Mappings"
+    bl_description = "Set target names from a CSV, JSON or JSON Lines mapping file, matching rows by source name"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filter_glob: bpy.props.StringProperty(default="*.csv;*.json;*.jsonl;*.ndjson", options={'HIDDEN'})
+    mode: bpy.props.EnumProperty(
+        name="Mode",
+        items=[
+            ('MERGE', "Merge", "Only overwrite rows listed in the file"),
+            ('REPLACE', "Replace", "Rows not listed in the file are left unmatched"),
+        ],
+        default='MERGE',
+    )
+
+    def execute(self, context):
+        props = context.scene.bone_mapper
+        if not mapping_count(props):
+            if not props.source:
+                self.report({'WARNING'}, "Set the Source Armature or generate a mapping first")
+                return {'CANCELLED'}
+            # 一覧が空ならソースの階層順で空の行を作ってから読み込む
+            skeleton = get_skeleton(props.source.data.bones)
+            set_mappings(props, ((name, None) for name in skeleton.hierarchy_order()), props.source)
+            refresh_list(props)
+
+        # ソース名 → 行の逆引きで、ファイルを先頭から 1 回読むだけで変更を集める
+        row_of = get_view_index(props).row_of
+        changes = {}
+        unknown = 0
+        try:
+            for source_name, target_name in read_mapping_rows(self.filepath):
+                row = row_of.get(source_name)
+                if row is None:
+                    unknown += 1
+                    continue
+                changes[row] = target_name
+        except (OSError, ValueError, KeyError, csv.Error) as e:
+            self.report({'ERROR'}, f"Could not read {self.filepath}: {e}")
+            return {'CANCELLED'}
+        seen = len(changes)
+
+        cleared = 0
+        if self.mode == 'REPLACE':
+            for row, target_name in enumerate(mapping_targets(props)):
+                if row not in changes and target_name:
+                    changes[row] = ""
+                    cleared += 1
+
+        updated = update_targets(props, changes) - cleared
+        message = f"Imported {seen} rows: {updated} changed"
+        if cleared:
+            message += f", {cleared} cleared"
+        if unknown:
+            message += f", {unknown} sources not in the list"
+        self.report({'WARNING'} if unknown else {'INFO'}, message)
+        return {'FINISHED'}
+
+
+# ルールパックの再読み込み
+class ARMATURE_OT_reload_rule_packs(bpy.types.Operator):
+    bl_idname = "armature.reload_rule_packs"
+    bl_label = "Reload Rule Packs"
+    bl_description = "Reload every rule pack now (changed packs are also picked up on Generate)"
+
+    def execute(self, context):
+        refresh_rule_packs(context.scene.bone_mapper, force=True)
+        names = ", ".join(pack["name"] for pack in _rule_loader.packs) or "none"
+        if _rule_loader.errors:
+            _path, message = _rule_loader.errors[0]
+            self.report({'WARNING'}, f"Rule packs: {names}; {len(_rule_loader.errors)} failed ({message})")
+        else:
+            self.report({'INFO'}, f"Rule packs: {names}")
+        return {'FINISHED'}
+
+
+# 計測結果の書き出し
+class ARMATURE_OT_export_mapping_stats(bpy.types.Operator, ExportHelper):
+    bl_idname = "armature.export_mapping_stats"
+    bl_label = "Export Statistics"
+    bl_description = "Write the last per-stage timings and hit counts to a JSON file"
+
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(default="*.json", options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        return get_stats_report(context.scene.bone_mapper) is not None
+
+    def execute(self, context):
+        report = get_stats_report(context.scene.bone_mapper)
+        with open(self.filepath, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        self.report({'INFO'}, f"Statistics written to {self.filepath}")
+        return {'FINISHED'}
+
+
+# 折りたたみトグル
+class ARMATURE_OT_toggle_fold(bpy.types.Operator):
+    bl_idname = "armature.toggle_fold"
+    bl_label = "Toggle Fold"
+
+    bone_name: bpy.props.StringProperty()
+
+    def execute(self, context):
+        props = context.scene.bone_mapper
+        if is_packed(props):
+            return self.execute_packed(context, props)
+        view = self.get_view(props)
+
+        # まず、折りたたみボタンが押されたアイテムを選択する
+        row = view.row_of.get(self.bone_name)
+        if row is not None:
+            props.active_index = row
+
+        # 現在のアクティブなアイテムのインデックスを保存
+        current_active_index = props.active_index
+        current_active_bone = None
+        if 0 <= current_active_index < len(props.mappings):
+            current_active_bone = props.mappings[current_active_index].source_name
+
+        # folds に見つからない場合の処理
+        fold_index = view.fold_of.get(self.bone_name)
+        if fold_index is None:
+            self.report({'WARNING'}, f"Fold not found for bone: {self.bone_name}")
+            return {'CANCELLED'}
+
+        # 折りたたみ状態を変更し、表示キャッシュを差分更新
+        f = props.folds[fold_index]
+        old_state = f.expanded
+        f.expanded = not f.expanded
+        if row is not None:
+            view.set_expanded(row, f.expanded)
+
+        # UIを強制更新
+        context.area.tag_redraw()
+
+        # 折りたたみ後、現在表示されているアイテムの中で適切な位置を探す
+        if current_active_bone:
+            # 現在アクティブだったボーンが表示されているか確認
+            new_index = self.find_visible_bone_index(props, current_active_bone, context)
+            if new_index >= 0:
+                props.active_index = new_index
+            else:
+                # 表示されていない場合、折りたたんだボーンまたはその親を選択
+                fallback_index = self.find_fallback_bone_index(props, self.bone_name, context)
+                if fallback_index >= 0:
+                    props.active_index = fallback_index
+
+        self.report({'INFO'}, f"Toggled {self.bone_name}: {old_state} -> {f.expanded}")
+        return {'FINISHED'}
+
+    def execute_packed(self, context, props):
+        """PACKED: 行の折りたたみビットを反転してページを作り直し、押した行を選択する"""
+        view = get_view_index(props)
+        row = view.row_of.get(self.bone_name)
+        if row is None:
+            self.report({'WARNING'}, f"Fold not found for bone: {self.bone_name}")
+            return {'CANCELLED'}
+
+        packed = get_packed(props)
+        packed.collapsed[row] ^= 1
+        expanded = not packed.collapsed[row]
+        view.set_expanded(row, expanded)
+        save_packed(props, packed)
+        rebuild_page(props)
+
+        for i, item in enumerate(props.page_rows):
+            if item.row == row:
+                props.active_index = i
+                break
+        context.area.tag_redraw()
+
+        self.report({'INFO'}, f"Toggled {self.bone_name}: {not expanded} -> {expanded}")
+        return {'FINISHED'}
+
+    def get_view(self, props):
+        """逆引きテーブルを取得（folds と食い違っていれば作り直す）"""
+        view = get_view_index(props)
+        fold_index = view.fold_of.get(self.bone_name)
+        if fold_index is not None and (
+            fold_index >= len(props.folds) or props.folds[fold_index].bone_name != self.bone_name
+        ):
+            invalidate_view_cache(props)
+            view = get_view_index(props)
+        return view
+
+    def find_visible_bone_index(self, props, bone_name, context):
+        """指定されたボーンが表示されている場合、そのインデックスを返す"""
+        if not props.source or not hasattr(props.source, 'data'):
+            return -1
+
+        view = get_view_index(props)
+        row = view.row_of.get(bone_name)
+        if row is None or not view.in_source[row]:
+            return -1
+
+        # 折りたたまれた祖先があれば非表示
+        return row if view.is_visible(row) else -1
+
+    def find_fallback_bone_index(self, props, bone_name, context):
+        """フォールバック用：折りたたんだボーンの近くで適切なインデックスを返す"""
+        if not props.source or not hasattr(props.source, 'data'):
+            return 0
+
+        view = get_view_index(props)
+
+        # まず、折りたたんだボーン自体のインデックスを探す
+        folded_bone_index = view.row_of.get(bone_name)
+        if folded_bone_index is not None:
+            return folded_bone_index
+
+        # 折りたたんだボーンが見つからない場合、そのボーンの親を探す
+        skeleton = get_skeleton(props.source.data.bones)
+        bone = skeleton.index_of.get(bone_name)
+        if bone is not None and skeleton.parent_indices[bone] >= 0:
+            parent_index = view.row_of.get(skeleton.names[skeleton.parent_indices[bone]])
+            if parent_index is not None:
+                return parent_index
+
+        # それも見つからない場合は現在のアクティブアイテムの近くを維持
+        current_active = props.active_index
+        if 0 <= current_active < len(view):
+            # 現在の位置から前後5つ以内で表示されているボーンを探す
+            search_range = 5
+            for offset in range(search_range):
+                for direction in [-1, 1]:  # 前後両方向を検索
+                    test_index = current_active + (direction * offset)
+                    if 0 <= test_index < len(view) and view.in_source[test_index] and view.is_visible(test_index):
+                        return test_index
+
+        # 最後の手段：最初の表示可能なアイテム
+        visible = view.visible_flags()
+        for i in range(len(view)):
+            if view.in_source[i] and visible[i]:
+                return i
+
+        return 0 if len(props.mappings) > 0 else -1
+
+
+# PACKED 表示のページ送り
+class ARMATURE_OT_mapping_page(bpy.types.Operator):
+    bl_idname = "armature.mapping_page"
+    bl_label = "Change Page"
+    bl_description = "Show the previous or next page of mappings"
+
+    step: bpy.props.IntProperty(default=1)
+
+    def execute(self, context):
+        props = context.scene.bone_mapper
+        props.page = max(0, props.page + self.step)
+        props.active_index = 0
+        rebuild_page(props)
+        return {'FINISHED'}
+
+
+# 候補の採用
+class ARMATURE_OT_accept_suggestion(bpy.types.Operator):
+    bl_idname = "armature.accept_suggestion"
+    bl_label = "Accept Suggestion"
+    bl_description = "Set the row's target to this suggested bone (the top-ranked one if none is given)"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    source_name: bpy.props.StringProperty()
+    target_name: bpy.props.StringProperty()
+
+    def execute(self, context):
+        props = context.scene.bone_mapper
+        row = get_view_index(props).row_of.get(self.source_name)
+        if row is None:
+            self.report({'WARNING'}, f"Row not found for bone: {self.source_name}")
+            return {'CANCELLED'}
+
+        target_name = self.target_name
+        if not target_name:
+            suggestions = suggest_targets(props, self.source_name, 1)
+            if not suggestions:
+                self.report({'WARNING'}, f"No suggestion for {self.source_name}")
+                return {'CANCELLED'}
+            target_name = suggestions[0][0]
+
+        update_targets(props, {row: target_name})
+        self.report({'INFO'}, f"{self.source_name} -> {target_name}")
+        return {'FINISHED'}
+
+
+# 表リスト
+class BONE_UL_mapping_list(bpy.types.UIList):
+    def draw_item(
+        self, context, layout, data, item, icon, active_data, active_propname, index
+    ):
+        props = context.scene.bone_mapper
+        row = layout.row(align=True)
+        # PACKED のページ行は元の行番号で表示メタデータを引く
+        if item.row >= 0:
+            index = item.row
+        
+        # Source Hierarchy モードの時だけインデント表示と折りたたみボタン（Simpleモードは除く）
+        if uses_hierarchy_view(props):
+            view = get_view_index(props)
+            if index < len(view) and view.in_source[index]:
+                # インデント（深さ分だけ空白ラベル）
+                for _ in range(view.depth[index]):
+                    row.label(text="", icon='BLANK1')
+
+                # 子を持つボーンの場合は折りたたみボタンを表示
+                if view.has_children[index]:
+                    fold_icon = 'TRIA_DOWN' if view.is_expanded(index) else 'TRIA_RIGHT'
+                    op = row.operator("armature.toggle_fold", text="", icon=fold_icon)
+                    op.bone_name = item.source_name
+                else:
+                    # 子がないボーンは空白
+                    row.label(text="", icon='BLANK1')
+
+        row.label(text=item.source_name)
+        
+        # ターゲット名が空、またはターゲットアーマチュアに無い名前の場合は背景色を変更して目立たせる
+        target = props.target
+        if item.target_name and (
+            not target or target.type != 'ARMATURE'
+            or item.target_name in get_target_index(target.data.bones).name_set
+        ):
+            row.prop(item, "target_name", text="")
+        else:
+            # 未マッチの場合は警告色で表示
+            sub_row = row.row(align=True)
+            sub_row.alert = True  # 赤い背景で強調
+            sub_row.prop(item, "target_name", text="")
+            # 最上位の候補があればワンクリックで採用
+            suggestions = suggest_targets(props, item.source_name, 1)
+            if suggestions:
+                op = row.operator("armature.accept_suggestion", text="", icon='CHECKMARK')
+                op.source_name = item.source_name
+                op.target_name = suggestions[0][0]
+
+    # フィルタ処理（検索＆ソート）
+    def filter_items(self, context, data, propname):
+        props = context.scene.bone_mapper
+        # PACKED のページは rebuild_page で検索・並べ替え・折りたたみを反映済み
+        if propname == "page_rows":
+            return [], []
+        items = getattr(data, propname)
+        view = get_view_index(props)
+
+        # 検索フィルタと折りたたみ（祖先が折りたたまれているアイテムを非表示）
+        # 検索語・折りたたみ・行の内容が前回と同じなら前回の結果をそのまま使い、
+        # 検索語が伸びた時は前回の一致行だけを調べる
+        flt_flags = view.filter_flags(
+            props.filter_string.lower().strip(),
+            lambda: [search_key(item.source_name, item.target_name) for item in items],
+            uses_hierarchy_view(props),
+            self.bitflag_filter_item,
+        )
+
+        # ソート - 生成時に計算済みの並びを使う（SOURCE_HIER 系は生成順そのまま）
+        flt_neworder = get_row_order(props)
+
+        return flt_flags, flt_neworder
+
+
+# パネル
+class ARMATURE_PT_bone_mapper(bpy.types.Panel):
+    bl_label = "Bone Mapper"
+    bl_idname = "ARMATURE_PT_bone_mapper"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = 'Bone Mapper'
+
+    def draw(self, context):
+        layout = self.layout
+        props = context.scene.bone_mapper
+
+        layout.prop(props, "source")
+        layout.prop(props, "target")
+
+        row = layout.row()
+        row.operator("armature.generate_mapping", text="Generate Mapping")
+        row.operator("armature.apply_mapping", text="Apply Mapping")
+        row_actions = layout.row(align=True)
+        row_actions.prop(props, "remap_actions", text="Actions")
+        if props.remap_actions == 'MATCHING':
+            row_actions.prop(props, "action_filter", text="")
+        layout.operator("armature.batch_map_selected", icon='ARMATURE_DATA')
+
+        row_io = layout.row(align=True)
+        row_io.operator("armature.import_mappings", text="Import", icon='IMPORT')
+        row_io.operator("armature.export_mappings", text="Export", icon='EXPORT')
+
+        # モーダル生成の進捗
+        job = get_generation_job(props)
+        if job is not None:
+            factor = job["done"] / job["total"] if job["total"] else 0.0
+            text = f"{job['phase']}: {job['done']}/{job['total']} bones (Esc to cancel)"
+            if hasattr(layout, "progress"):  # Blender 4.0+
+                layout.progress(factor=factor, type='BAR', text=text)
+            else:
+                layout.label(text=f"{text} {factor:.0%}", icon='TIME')
+
+        layout.prop(props, "use_topology")
+
+        row_spatial = layout.row(align=True)
+        row_spatial.prop(props, "use_spatial")
+        sub = row_spatial.row(align=True)
+        sub.active = props.use_spatial
+        sub.prop(props, "spatial_max_distance", text="Max")
+
+        row_cache = layout.row(align=True)
+        row_cache.prop(props, "use_cache", text="Cache")
+        sub = row_cache.row(align=True)
+        sub.active = props.use_cache
+        sub.prop(props, "cache_partial", text="Partial")
+        sub.operator("armature.clear_mapping_cache", text="", icon='TRASH')
+
+        row_rules = layout.row(align=True)
+        row_rules.prop(props, "rules_directory", text="Rules")
+        row_rules.operator("armature.reload_rule_packs", text="", icon='FILE_REFRESH')
+
+        row_storage = layout.row(align=True)
+        row_storage.prop(props, "storage", text="Storage")
+        if is_packed(props):
+            row_storage.prop(props, "page_size", text="Page")
+
+        self.draw_stats(layout, props)
+
+        row2 = layout.row(align=True)
+        row2.prop(props, "filter_string", text="Search")
+        row2.prop(props, "sort_mode", text="")
+        layout.template_list(
+            "BONE_UL_mapping_list",
+            "",
+            props,
+            "page_rows" if is_packed(props) else "mappings",
+            props,
+            "active_index",
+            rows=12,
+        )
+        if is_packed(props):
+            self.draw_pager(layout, props)
+        self.draw_suggestions(layout, props)
+
+    def draw_pager(self, layout, props):
+        """PACKED 表示のページ送り"""
+        total = get_page_total(props)
+        row = layout.row(align=True)
+        row.operator("armature.mapping_page", text="", icon='TRIA_LEFT').step = -1
+        if total is None:
+            # Undo・読み込み直後は行数が未計算
+            row.label(text=f"Page {props.page + 1}")
+        else:
+            pages = max(1, -(-total // props.page_size))
+            row.label(text=f"Page {props.page + 1}/{pages} ({total} rows)")
+        row.operator("armature.mapping_page", text="", icon='TRIA_RIGHT').step = 1
+
+    def draw_suggestions(self, layout, props):
+        """選択行のターゲット候補（マッチャーが採用しなかった次点を含む）"""
+        item = get_active_item(props)
+        if item is None or not props.target:
+            return
+        count = props.suggestion_count
+        suggestions = [
+            suggestion for suggestion in suggest_targets(props, item.source_name, count + 1)
+            if suggestion[0] != item.target_name
+        ][:count]
+
+        box = layout.box()
+        header = box.row(align=True)
+        header.label(text=item.source_name, icon='VIEWZOOM')
+        header.prop(props, "suggestion_count", text="Top")
+        if not suggestions:
+            box.label(text="No similar target bones")
+            return
+        col = box.column(align=True)
+        for name, reason in suggestions:
+            row = col.row(align=True)
+            op = row.operator("armature.accept_suggestion", text=name, icon='CHECKMARK')
+            op.source_name = item.source_name
+            op.target_name = name
+            row.label(text=reason)
+
+    def draw_stats(self, layout, props):
+        """折りたたみ式の計測結果（ステージ別の時間とヒット数）"""
+        box = layout.box()
+        header = box.row(align=True)
+        header.prop(
+            props, "show_stats",
+            icon='TRIA_DOWN' if props.show_stats else 'TRIA_RIGHT',
+            emboss=False,
+        )
+        header.prop(props, "use_profiling", text="")
+        if not props.show_stats:
+            return
+
+        report = get_stats_report(props)
+        if report is None:
+            box.label(text="Enable statistics and generate a mapping", icon='INFO')
+            return
+
+        col = box.column(align=True)
+        for name, entry in report["stages"].items():
+            row = col.row()
+            row.label(text=name)
+            row.label(text=str(entry["hits"]) if entry["hits"] else "")
+            row.label(text=f"{entry['seconds'] * 1000:.1f} ms")
+        row = col.row()
+        row.label(text="total")
+        row.label(text=f"{report['matched']}/{report['rows']}")
+        row.label(text=f"{report['total_seconds'] * 1000:.1f} ms")
+
+        cache = report["normalize_cache"]
+        box.label(text=f"Normalize cache: {cache['hit_rate']:.1%} ({cache['hits']} hits, {cache['misses']} misses)")
+        box.operator("armature.export_mapping_stats", icon='EXPORT')
+
+
+classes = (
+    BoneMappingItem,
+    BoneFoldItem,
+    BoneMapperProperties,
+    ARMATURE_OT_generate_mapping,
+    ARMATURE_OT_apply_mapping,
+    ARMATURE_OT_batch_map_selected,
+    ARMATURE_OT_clear_mapping_cache,
+    ARMATURE_OT_export_mappings,
+    ARMATURE_OT_import_mappings,
+    ARMATURE_OT_reload_rule_packs,
+    ARMATURE_OT_export_mapping_stats,
+    ARMATURE_OT_toggle_fold,
+    ARMATURE_OT_mapping_page,
+    ARMATURE_OT_accept_suggestion,
+    BONE_UL_mapping_list,
+    ARMATURE_PT_bone_mapper,
+)
+
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+    bpy.types.Scene.bone_mapper = bpy.props.PointerProperty(type=BoneMapperProperties)
+    bpy.app.handlers.undo_post.append(_on_undo_or_load)
+    bpy.app.handlers.redo_post.append(_on_undo_or_load)
+    bpy.app.handlers.load_post.append(_on_undo_or_load)
+    bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+
+
+def unregister():
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post):
+        if _on_undo_or_load in handlers:
+            handlers.remove(_on_undo_or_load)
+    if _on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    invalidate_skeleton()
+    invalidate_view_cache()
+    _stats_reports.clear()
+    _generation_jobs.clear()
+    _packed.clear()
+    _page_totals.clear()
+    _target_indices.clear()
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
+    del bpy.types.Scene.bone_mapper
+
+
+if __name__ == "__main__":
+    register()
@@ -0,0 +1,2301 @@
+"""Bone name mapping core (no bpy dependency).
+
+Armature Bone Name Mapper の正規化・階層列挙・段階的マッチングを、
+ボーン名と親名だけのプレーンなデータで扱う純 Python モジュール。
+Blender アドオンはこのモジュールの薄いラッパーで、CI などでは
+コマンドラインから直接バッチ処理できる::
+
+    python armature_bone_name_mapper/core.py source.json target.json
+    python armature_bone_name_mapper/core.py --pairs pairs.csv --jobs 8 > mappings.jsonl
+    python armature_bone_name_mapper/core.py --rules rule_packs/ source.json target.json
+"""
+
+import argparse
+import base64
+import bisect
+import contextlib
+import csv
+import functools
+import hashlib
+import heapq
+import json
+import math
+import multiprocessing
+import os
+import re
+import sys
+import time
+import zlib
+from array import array
+
+# ---------------------------------------------------------------------------
+# 正規化エンジン
+# ルールはインポート時に一度だけコンパイルし、結果は上限付きキャッシュに保持する。
+# ルールを変更した場合は update_part_mapping() / compile_rules() 経由でキャッシュを破棄する。
+# ---------------------------------------------------------------------------
+
+NORMALIZE_CACHE_SIZE = 65536
+
+# 接頭辞・接尾辞
+_PREFIX_RE = re.compile(r"(character\d+_|mixamo:|armature_)")
+_SUFFIX_RE = re.compile(r"(_end|_const.*|_twist.*)$")
+
+# 指名と左右識別子を 1 パスで検出する結合パターン
+# 先読み（ゼロ幅）にすることで "lefthumb" のような重なりも取りこぼさない
+_FINGER_SIDE_RE = re.compile(
+    r"(?=(?P<finger>thumb|index|middle|ring|pinky)(?P<num>\d*)"
+    r"|(?P<left>left|[._-]l$)"
+    r"|(?P<right>right|[._-]r$))"
+)
+# 複数の指名を含む場合の優先順位
+_FINGER_PRIORITY = ("thumb", "index", "middle", "ring", "pinky")
+# 指名の別名 → 正規の指名（ルールパックで追加される）
+_FINGER_ALIASES = {finger: finger for finger in _FINGER_PRIORITY}
+
+# 左右識別子の除去（先頭の left/right と末尾の区切り付きサフィックスのみ）
+_SIDE_PREFIX_RE = re.compile(r"^(left|right)")
+_SIDE_SUFFIX_RE = re.compile(r"([._-][lr])$")
+
+# 区切り文字の統一と連続アンダースコアの圧縮を一度に行う
+_SEPARATOR_RE = re.compile(r"[ ._-]+")
+
+# ヒューリスティック用（数字/補助語を除去: roll, twist, helper 等）
+_AUX_SUFFIX_RE = re.compile(r"(roll|twist|helper|aux|assist|end)$")
+_TRAILING_DIGITS_RE = re.compile(r"\d+$")
+
+# 上下肢判定（含有ベース）。上から順に評価する
+_LIMB_RULES = (
+    (re.compile(r"(upper|up).*leg"), "upperleg"),
+    (re.compile(r"(lower).*leg"), "lowerleg"),
+    (re.compile(r"(upper|up).*arm"), "upperarm"),
+    (re.compile(r"(lower|fore).*arm"), "lowerarm"),
+)
+
+# 部位名の正規化マップ（完全一致）。ルールパックの同義語はここに合成される
+PART_MAPPING = {
+    # 脚部
+    "upleg": "upperleg",
+    "up_leg": "upperleg",
+    "upper_leg": "upperleg",
+    "upperleg": "upperleg",
+    "thigh": "upperleg",
+    "leg": "lowerleg",
+    "lower_leg": "lowerleg",
+    "lowerleg": "lowerleg",
+    "calf": "lowerleg",
+    "shin": "lowerleg",
+    # 腕部
+    "uparm": "upperarm",
+    "up_arm": "upperarm",
+    "upper_arm": "upperarm",
+    "upperarm": "upperarm",
+    "arm": "upperarm",
+    "forearm": "lowerarm",
+    "fore_arm": "lowerarm",
+    "lower_arm": "lowerarm",
+    "lowerarm": "lowerarm",
+    # その他
+    "pelvis": "hip",
+    "hips": "hip",
+    "hip": "hip",
+    "shoulder": "shoulder",
+    "wrist": "hand",
+    "hand": "hand",
+    "eye": "eye",
+    "headtop": "headtop",
+    "toe_base": "toes",
+    "toe": "toes",
+    "toes": "toes",
+}
+
+
+def _normalize_uncached(name: str) -> str:
+    n = name.lower()
+
+    # 接頭辞・接尾辞削除
+    n = _PREFIX_RE.sub("", n)
+    n = _SUFFIX_RE.sub("", n)
+
+    # 指名と左右識別子を同時に抽出
+    fingers = {}
+    has_left = has_right = False
+    for m in _FINGER_SIDE_RE.finditer(n):
+        finger = m.group("finger")
+        if finger:
+            # 同じ指名が複数あれば最初の出現の番号を使う
+            fingers.setdefault(_FINGER_ALIASES[finger], m.group("num"))
+        elif m.group("left"):
+            has_left = True
+        else:
+            has_right = True
+    side = "_l" if has_left else "_r" if has_right else ""
+
+    # 指の正規化（早期リターン）
+    if fingers:
+        for finger in _FINGER_PRIORITY:
+            if finger in fingers:
+                return f"finger_{finger}{fingers[finger]}{side}"
+
+    # 左右識別子を削除（内部の _l / _r を壊さない）
+    n = _SIDE_PREFIX_RE.sub("", n)
+    n = _SIDE_SUFFIX_RE.sub("", n)
+
+    # 区切り文字統一
+    n = _SEPARATOR_RE.sub("_", n).strip("_")
+
+    original_n = n  # ヒューリスティック前の保持
+
+    mapped = PART_MAPPING.get(n)
+    if mapped is not None:
+        n = mapped
+    else:
+        # ここからヒューリスティック（接尾語や補助語が付いたケース対応）
+        base = _AUX_SUFFIX_RE.sub("", n)
+        base = _TRAILING_DIGITS_RE.sub("", base).strip("_")
+
+        for pattern, part in _LIMB_RULES:
+            if pattern.search(base):
+                n = part
+                break
+        else:
+            if base.endswith("upleg"):
+                n = "upperleg"
+            elif base.endswith("leg") and original_n != "leg":
+                # 単独 leg 以外で leg 終了（例: shinleg など想定）
+                n = "lowerleg"
+            elif base.endswith("arm") and original_n != "arm":
+                n = "upperarm"
+
+    # toes_end の特例処理
+    if "toe" in n and "end" in original_n:
+        return f"toes_end{side}"
+
+    return n + side
+
+
+_normalize_cached = functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(_normalize_uncached)
+
+
+# ---------------------------------------------------------------------------
+# ルールパック
+# 外部 JSON の語彙（接頭辞・接尾辞・同義語・左右識別子・指名）を組み込みルールと合成し、
+# 種類ごとに 1 本のトライ正規表現へコンパイルする。パックが増えても各名前の判定は
+# 上の結合パターン 1 パスのままで、共通接頭辞はトライにまとめられる。
+#
+#     {
+#       "name": "vrm",
+#       "prefixes": ["j_bip_c_", "j_bip_"],
+#       "suffixes": ["_nub"],
+#       "synonyms": {"clavicle": "shoulder"},
+#       "sides": {"left": {"prefixes": ["l_"], "suffixes": ["_lft"]},
+#                 "right": {"prefixes": ["r_"], "suffixes": ["_rgt"]}},
+#       "fingers": {"pinky": ["little"]}
+#     }
+# ---------------------------------------------------------------------------
+
+# 組み込みの語彙（パックの語彙はこれに追加される）
+_BUILTIN_PREFIXES = ("mixamo:", "armature_")
+_BUILTIN_PREFIX_PATTERNS = (r"character\d+_",)
+_BUILTIN_SUFFIXES = ("_end",)
+_BUILTIN_SUFFIX_PATTERNS = (r"_const.*", r"_twist.*")
+_BUILTIN_PART_MAPPING = dict(PART_MAPPING)
+_RULE_PACK_KEYS = ("name", "prefixes", "suffixes", "synonyms", "sides", "fingers")
+
+# update_part_mapping() で追加された同義語（再コンパイル後も残す）
+_user_part_mapping = {}
+# compile_rules() に渡したルールパック（rules_fingerprint() 用に JSON 化したもの）
+_compiled_packs = "[]"
+# clear_normalize_cache() の回数（MatchProfile がカウンタのリセットを検出するため）
+_normalize_cache_resets = 0
+# rules_fingerprint() の結果（ルールを変更すると clear_normalize_cache() で破棄）
+_rules_fingerprint = None
+
+
+def _trie_regex(words):
+    """文字列の集合を、共通接頭辞をまとめた 1 つの正規表現（非キャプチャ）に変換する
+
+    ある語が別の語の接頭辞になっている場合は長い方に一致する。
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if "" in node else group
+
+    return build(trie)
+
+
+def _alternation(patterns, words):
+    """正規表現の断片とリテラル語のトライを 1 つの選択に並べる（空なら None）"""
+    parts = list(patterns)
+    if words:
+        parts.append(_trie_regex(words))
+    return "|".join(parts) if parts else None
+
+
+def _string_list(pack, value, key):
+    if not isinstance(value, list) or not all(isinstance(v, str) and v for v in value):
+        raise ValueError(f"{pack}: '{key}' must be a list of non-empty strings")
+    return [v.lower() for v in value]
+
+
+def load_rule_pack(path):
+    """JSON のルールパックを読み、小文字化・検証した dict を返す（不正なら ValueError）"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: a rule pack must be a JSON object")
+    unknown = set(data) - set(_RULE_PACK_KEYS)
+    if unknown:
+        raise ValueError(f"{path}: unknown keys {sorted(unknown)}")
+
+    pack = {"name": str(data.get("name") or os.path.splitext(os.path.basename(path))[0])}
+    pack["prefixes"] = _string_list(path, data.get("prefixes", []), "prefixes")
+    pack["suffixes"] = _string_list(path, data.get("suffixes", []), "suffixes")
+
+    synonyms = data.get("synonyms", {})
+    if not isinstance(synonyms, dict) or not all(
+        isinstance(k, str) and isinstance(v, str) and k and v for k, v in synonyms.items()
+    ):
+        raise ValueError(f"{path}: 'synonyms' must map strings to strings")
+    pack["synonyms"] = {k.lower(): v.lower() for k, v in synonyms.items()}
+
+    sides = data.get("sides", {})
+    if not isinstance(sides, dict) or not set(sides) <= {"left", "right"}:
+        raise ValueError(f"{path}: 'sides' must have only 'left' and 'right'")
+    pack["sides"] = {}
+    for side, markers in sides.items():
+        if not isinstance(markers, dict) or not set(markers) <= {"prefixes", "suffixes"}:
+            raise ValueError(f"{path}: 'sides.{side}' must have only 'prefixes' and 'suffixes'")
+        pack["sides"][side] = {
+            key: _string_list(path, markers.get(key, []), f"sides.{side}.{key}")
+            for key in ("prefixes", "suffixes")
+        }
+
+    fingers = data.get("fingers", {})
+    if not isinstance(fingers, dict) or not set(fingers) <= set(_FINGER_PRIORITY):
+        raise ValueError(f"{path}: 'fingers' keys must be one of {list(_FINGER_PRIORITY)}")
+    pack["fingers"] = {
+        finger: _string_list(path, aliases, f"fingers.{finger}") for finger, aliases in fingers.items()
+    }
+    return pack
+
+
+def compile_rules(packs=()):
+    """組み込みルールと packs（load_rule_pack() の結果）を合成して正規化パターンを作り直す
+
+    packs を空にすると組み込みルールだけに戻る。正規化キャッシュは破棄される。
+    """
+    global _PREFIX_RE, _SUFFIX_RE, _FINGER_SIDE_RE, _FINGER_ALIASES, _SIDE_PREFIX_RE, _SIDE_SUFFIX_RE
+    global _compiled_packs
+
+    packs = list(packs)
+
+    prefixes = set(_BUILTIN_PREFIXES)
+    suffixes = set(_BUILTIN_SUFFIXES)
+    side_prefixes = {"left": set(), "right": set()}
+    side_suffixes = {"left": set(), "right": set()}
+    aliases = {finger: finger for finger in _FINGER_PRIORITY}
+    synonyms = {}
+    for pack in packs:
+        prefixes.update(pack.get("prefixes", ()))
+        suffixes.update(pack.get("suffixes", ()))
+        synonyms.update(pack.get("synonyms", {}))
+        for side, markers in pack.get("sides", {}).items():
+            side_prefixes[side].update(markers.get("prefixes", ()))
+            side_suffixes[side].update(markers.get("suffixes", ()))
+        for finger, names in pack.get("fingers", {}).items():
+            for alias in names:
+                aliases.setdefault(alias, finger)
+
+    _PREFIX_RE = re.compile(f"({_alternation(_BUILTIN_PREFIX_PATTERNS, prefixes)})")
+    _SUFFIX_RE = re.compile(f"({_alternation(_BUILTIN_SUFFIX_PATTERNS, suffixes)})$")
+
+    # 左右: 組み込みの left/right（どこでも）と区切り付き 1 文字（末尾）に、
+    # パックの識別子（先頭 / 末尾のみ）を加える
+    side_res = {}
+    for side, word, letter in (("left", "left", "l"), ("right", "right", "r")):
+        parts = [word, f"[._-]{letter}$"]
+        if side_prefixes[side]:
+            parts.append(f"^{_trie_regex(side_prefixes[side])}")
+        if side_suffixes[side]:
+            parts.append(f"{_trie_regex(side_suffixes[side])}$")
+        side_res[side] = "|".join(parts)
+    _FINGER_SIDE_RE = re.compile(
+        rf"(?=(?P<finger>{_trie_regex(aliases)})(?P<num>\d*)"
+        rf"|(?P<left>{side_res['left']})"
+        rf"|(?P<right>{side_res['right']}))"
+    )
+    _FINGER_ALIASES = aliases
+    _SIDE_PREFIX_RE = re.compile(
+        f"^({_alternation((), {'left', 'right'} | side_prefixes['left'] | side_prefixes['right'])})"
+    )
+    _SIDE_SUFFIX_RE = re.compile(
+        f"({_alternation((r'[._-][lr]',), side_suffixes['left'] | side_suffixes['right'])})$"
+    )
+
+    PART_MAPPING.clear()
+    PART_MAPPING.update(_BUILTIN_PART_MAPPING)
+    PART_MAPPING.update(synonyms)
+    PART_MAPPING.update(_user_part_mapping)
+    _compiled_packs = json.dumps(packs, sort_keys=True, default=sorted)
+    clear_normalize_cache()
+
+
+class RulePackLoader:
+    """Load every *.json rule pack found in a set of directories, recompiling on change.
+
+    refresh() はファイルの一覧・更新時刻・サイズを比べるだけなので、生成のたびに
+    呼んでもよい（ホットリロード）。読めなかったパックは errors に (path, メッセージ) で残し、
+    残りのパックだけで再コンパイルする。
+    """
+
+    def __init__(self, directories=()):
+        self.directories = list(directories)
+        self.packs = []
+        self.errors = []
+        self._stamp = None
+
+    def _scan(self):
+        stamp = []
+        for directory in self.directories:
+            if not directory or not os.path.isdir(directory):
+                continue
+            for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+                if entry.name.endswith(".json") and entry.is_file():
+                    st = entry.stat()
+                    stamp.append((entry.path, st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def refresh(self, force=False):
+        """パックが変わっていれば読み直して再コンパイルする。読み直した場合は True"""
+        stamp = self._scan()
+        if not force and stamp == self._stamp:
+            return False
+        packs, errors = [], []
+        for path, _mtime, _size in stamp:
+            try:
+                packs.append(load_rule_pack(path))
+            except (OSError, ValueError) as e:
+                errors.append((path, str(e)))
+        compile_rules(packs)
+        self._stamp = stamp
+        self.packs = packs
+        self.errors = errors
+        return True
+
+
+def normalize_bone_name(name: str) -> str:
+    """Return the normalized matching key for a bone name (memoized)."""
+    return _normalize_cached(name)
+
+
+def normalize_many(names):
+    """Normalize an iterable of bone names in one call, preserving order."""
+    cached = _normalize_cached
+    return [cached(name) for name in names]
+
+
+def update_part_mapping(entries):
+    """PART_MAPPING に同義語を追加/上書きし、正規化キャッシュを破棄する"""
+    entries = dict(entries)
+    _user_part_mapping.update(entries)
+    PART_MAPPING.update(entries)
+    clear_normalize_cache()
+
+
+def rules_fingerprint():
+    """現在の正規化ルールのダイジェスト（ルールを変更すると変わる）"""
+    global _rules_fingerprint
+    if _rules_fingerprint is None:
+        # compile_rules() に渡したルールパック（接頭辞・接尾辞・左右・指の別名）と同義語
+        payload = json.dumps([_compiled_packs, sorted(PART_MAPPING.items())])
+        _rules_fingerprint = hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+    return _rules_fingerprint
+
+
+def clear_normalize_cache():
+    """正規化ルールを変更した後に呼ぶ"""
+    global _rules_fingerprint, _normalize_cache_resets
+    _normalize_cached.cache_clear()
+    _normalize_cache_resets += 1
+    _rules_fingerprint = None
+
+
+def run_steps(steps):
+    """段階ジェネレーター（iter_* / *.iter_build）を最後まで進め、その戻り値を返す"""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as done:
+            return done.value
+
+
+# 段階ジェネレーターが 1 回の yield までに処理する要素数の既定値
+STEP_CHUNK = 1024
+
+
+class TargetNameIndex:
+    """Normalized target-name index shared by the matching stages.
+
+    部分一致ステージ用に、正規化済みターゲット名の n-gram 転置インデックスを
+    生成ごとに一度だけ構築する。結果は従来の「norm を含む最短の名前」と同一。
+    """
+
+    GRAM = 3
+
+    def __init__(self, names):
+        run_steps(self._build(names, STEP_CHUNK))
+
+    @classmethod
+    def iter_build(cls, names, chunk=STEP_CHUNK):
+        """コンストラクタの段階版。chunk 件ごとに yield し、作った索引を返す"""
+        index = cls.__new__(cls)
+        yield from index._build(names, chunk)
+        return index
+
+    def _build(self, names, chunk):
+        self.names = list(names)
+        self.norms = []
+        for start in range(0, len(self.names), chunk):
+            self.norms.extend(normalize_many(self.names[start:start + chunk]))
+            yield
+        self.name_set = set(self.names)
+        # 正規化キーが重複した場合は後勝ち（従来の dict 内包表記と同じ）
+        self.by_norm = dict(zip(self.norms, self.names))
+
+        # 名前の短い順（同じ長さなら元の順）に順位を付け、ポスティングはこの順位で保持する
+        self._ranked = sorted(range(len(self.names)), key=lambda i: len(self.names[i]))
+        yield
+        postings = {}
+        gram = self.GRAM
+        for rank, i in enumerate(self._ranked):
+            norm = self.norms[i]
+            keys = set(norm)
+            keys.update(norm[k:k + gram] for k in range(len(norm) - gram + 1))
+            for key in keys:
+                postings.setdefault(key, []).append(rank)
+            if rank % chunk == chunk - 1:
+                yield
+        self._postings = postings
+        self._partial_cache = {}
+        # 候補提示用の索引は初回の suggest() で作る
+        self._suggest_index = None
+        self._suggest_cache = {}
+
+    def find_partial(self, norm):
+        """norm を正規化名に含むターゲットのうち最短のものを返す（無ければ None）"""
+        try:
+            return self._partial_cache[norm]
+        except KeyError:
+            pass
+
+        result = None
+        if not norm:
+            # 空文字列は全ターゲットに含まれる
+            if self._ranked:
+                result = self.names[self._ranked[0]]
+        else:
+            gram = self.GRAM
+            if len(norm) >= gram:
+                keys = {norm[k:k + gram] for k in range(len(norm) - gram + 1)}
+            else:
+                keys = set(norm)
+            # 最も短いポスティングだけを走査し、実際に含むかを検証する
+            lists = [self._postings.get(key) for key in keys]
+            if all(lists):
+                candidates = min(lists, key=len)
+                for rank in candidates:
+                    i = self._ranked[rank]
+                    if norm in self.norms[i]:
+                        result = self.names[i]
+                        break
+
+        self._partial_cache[norm] = result
+        return result
+
+    # suggest() の部分一致段で調べる候補数・トークン段で採点する候補数の上限
+    SUGGEST_SCAN = 2048
+    SUGGEST_POOL = 64
+    SUGGEST_CACHE_SIZE = 4096
+
+    def _build_suggest_index(self):
+        # 小文字名・正規化名をそれぞれ整列した配列（二分探索で前方一致の範囲を引く）、
+        # 正規化名 → 全候補、正規化トークン → 候補 の転置インデックス、
+        # 各候補の 正規化名 / 元の名前 のトークン集合
+        lowers = sorted((name.lower(), i) for i, name in enumerate(self.names))
+        norms = sorted((norm, i) for i, norm in enumerate(self.norms))
+        norm_rows = {}
+        tokens = []
+        raw_tokens = []
+        token_postings = {}
+        for i, norm in enumerate(self.norms):
+            norm_rows.setdefault(norm, []).append(i)
+            row_tokens = _name_tokens(norm)
+            tokens.append(row_tokens)
+            raw_tokens.append(_name_tokens(self.names[i]))
+            for token in row_tokens:
+                token_postings.setdefault(token, []).append(i)
+        position = {name: i for i, name in enumerate(self.names)}
+        self._suggest_index = (position, lowers, norms, norm_rows, tokens, raw_tokens, token_postings)
+
+    def suggest(self, text, k=8):
+        """text に近いターゲット名を最大 k 件、[(名前, 理由), ...] の順位付きで返す
+
+        完全一致 → 正規化一致（同じ正規化名の全候補）→ 名前の前方一致 → 正規化名の前方一致
+        → 正規化名を含む（短い順）→ 共有するトークン（語・数字）の数 の順。マッチャーが採用しなかった
+        次点（同じ正規化名・部分一致の他の候補）もここに並ぶ。結果は text ごとにメモ化する。
+        """
+        key = (text, k)
+        cached = self._suggest_cache.get(key)
+        if cached is not None:
+            return cached
+        if self._suggest_index is None:
+            self._build_suggest_index()
+        position, lowers, norms, norm_rows, tokens, raw_tokens, token_postings = self._suggest_index
+
+        result = []
+        seen = set()
+
+        def add(i, reason):
+            if i not in seen:
+                seen.add(i)
+                result.append((self.names[i], reason))
+            return len(result) >= k
+
+        def add_prefixed(keys, prefix, reason):
+            j = bisect.bisect_left(keys, (prefix,))
+            while j < len(keys) and keys[j][0].startswith(prefix):
+                if add(keys[j][1], reason):
+                    return True
+                j += 1
+            return False
+
+        norm = normalize_bone_name(text) if text else ""
+        full = k <= 0 or not text
+        if not full and text in position:
+            full = add(position[text], STAGE_EXACT)
+        if not full and norm in norm_rows:
+            # マッチャーが選ぶもの（後勝ち）を先頭に
+            full = add(position[self.by_norm[norm]], STAGE_NORMALIZED)
+            for i in norm_rows[norm]:
+                if full:
+                    break
+                full = add(i, STAGE_NORMALIZED)
+        if not full:
+            full = add_prefixed(lowers, text.lower(), SUGGEST_PREFIX)
+        if not full and norm:
+            full = add_prefixed(norms, norm, SUGGEST_PREFIX)
+        if not full and norm:
+            # find_partial と同じ n-gram ポスティングを短い名前の順に（先頭 SUGGEST_SCAN 件まで）走査
+            gram = self.GRAM
+            if len(norm) >= gram:
+                grams = {norm[j:j + gram] for j in range(len(norm) - gram + 1)}
+            else:
+                grams = set(norm)
+            lists = [self._postings.get(g) for g in grams]
+            if all(lists):
+                for rank in min(lists, key=len)[:self.SUGGEST_SCAN]:
+                    i = self._ranked[rank]
+                    if norm in self.norms[i] and add(i, STAGE_PARTIAL):
+                        full = True
+                        break
+        if not full and norm:
+            # 左右以外の珍しいトークンの候補から順に集め、正規化名と元の名前で共有するトークン数
+            # → 余分なトークンの少なさ の順に並べる
+            query = _name_tokens(norm)
+            raw_query = _name_tokens(text)
+            postings = sorted(
+                (token_postings[token] for token in query - _SIDE_TOKENS if token in token_postings), key=len,
+            )
+            pool = set()
+            for posting in postings:
+                pool.update(posting[:self.SUGGEST_POOL - len(pool)])
+                if len(pool) >= self.SUGGEST_POOL:
+                    break
+            pool -= seen
+
+            def rank(i):
+                shared = len(query & tokens[i]) + len(raw_query & raw_tokens[i])
+                return -shared, len(tokens[i]) + len(raw_tokens[i]) - shared, self.names[i]
+
+            for i in heapq.nsmallest(k - len(result), pool, key=rank):
+                if add(i, SUGGEST_TOKEN):
+                    break
+
+        if len(self._suggest_cache) >= self.SUGGEST_CACHE_SIZE:
+            self._suggest_cache.clear()
+        self._suggest_cache[key] = result
+        return result
+
+    def clear_suggestions(self):
+        """suggest() のメモを捨てる（索引は残す）"""
+        self._suggest_cache.clear()
+
+
+# ---------------------------------------------------------------------------
+# スケルトン（名前と親名のみのプレーンデータ）
+# ---------------------------------------------------------------------------
+
+class Skeleton:
+    """Array-backed snapshot of an armature's bones.
+
+    - names: ボーン名のリスト
+    - parent_indices: 親ボーンのインデックス（ルートは -1）
+    - child_offsets / child_indices: 子ボーンの CSR 表現（兄弟は名前順）。
+      i 番目のボーンの子は child_indices[child_offsets[i]:child_offsets[i + 1]]
+    - heads / tails / z_axes: レスト位置の xyz を並べた float 配列（無ければ空）
+    """
+
+    def __init__(self, names, parent_indices, heads=(), tails=(), z_axes=()):
+        self.names = list(names)
+        self.parent_indices = array("i", parent_indices)
+        self.heads = heads if isinstance(heads, array) else array("f", heads)
+        self.tails = tails if isinstance(tails, array) else array("f", tails)
+        self.z_axes = z_axes if isinstance(z_axes, array) else array("f", z_axes)
+
+        # 子の CSR とルート（どちらも名前順）
+        count = len(self.names)
+        children = [[] for _ in range(count)]
+        roots = []
+        for i, parent in enumerate(self.parent_indices):
+            if parent >= 0:
+                children[parent].append(i)
+            else:
+                roots.append(i)
+        by_name = self.names.__getitem__
+        offsets = array("i", [0])
+        flat = array("i")
+        for kids in children:
+            if len(kids) > 1:
+                kids.sort(key=by_name)
+            flat.extend(kids)
+            offsets.append(len(flat))
+        roots.sort(key=by_name)
+        self.child_offsets = offsets
+        self.child_indices = flat
+        self.root_indices = array("i", roots)
+
+        self._index_of = None
+        self._order = None
+        self._rolls = None
+        self._signature = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_pairs(cls, pairs, heads=(), tails=(), z_axes=()):
+        """(name, parent) の並びから作る。一覧に無い親名はルート扱い"""
+        names = []
+        parents = []
+        for name, parent in pairs:
+            names.append(name)
+            parents.append(parent or None)
+        index_of = {}
+        for i, name in enumerate(names):
+            index_of.setdefault(name, i)
+        parent_indices = [index_of.get(parent, -1) if parent else -1 for parent in parents]
+        return cls(names, parent_indices, heads, tails, z_axes)
+
+    @property
+    def index_of(self):
+        """ボーン名 -> インデックス"""
+        if self._index_of is None:
+            self._index_of = {name: i for i, name in enumerate(self.names)}
+        return self._index_of
+
+    @property
+    def parents(self):
+        """親ボーン名のリスト（ルートは None）"""
+        names = self.names
+        return [names[p] if p >= 0 else None for p in self.parent_indices]
+
+    def children_of(self, index):
+        return self.child_indices[self.child_offsets[index]:self.child_offsets[index + 1]]
+
+    def has_children(self, index):
+        return self.child_offsets[index + 1] > self.child_offsets[index]
+
+    def hierarchy_indices(self):
+        """階層順（preorder）のインデックス列。一度計算したら使い回す"""
+        if self._order is None:
+            offsets = self.child_offsets
+            flat = self.child_indices
+            visited = bytearray(len(self.names))
+            order = array("i")
+
+            def walk(start):
+                stack = [start]
+                while stack:
+                    i = stack.pop()
+                    if visited[i]:
+                        continue
+                    visited[i] = 1
+                    order.append(i)
+                    # 名前順に取り出せるよう逆順に積む
+                    stack.extend(reversed(flat[offsets[i]:offsets[i + 1]]))
+
+            for root in self.root_indices:
+                walk(root)
+            # 親子関係が循環している等で辿れなかったものを名前順で最後に追加
+            if len(order) < len(self.names):
+                for i in sorted((i for i in range(len(self.names)) if not visited[i]), key=self.names.__getitem__):
+                    walk(i)
+            self._order = order
+        return self._order
+
+    def hierarchy_order(self):
+        """階層順のボーン名リスト"""
+        names = self.names
+        return [names[i] for i in self.hierarchy_indices()]
+
+    @property
+    def rolls(self):
+        """各ボーンのロール（ラジアン）。head / tail / z_axes から Blender と同じ規約で求める"""
+        if self._rolls is None:
+            self._rolls = bone_rolls(self.heads, self.tails, self.z_axes)
+        return self._rolls
+
+
+def bone_rolls(heads, tails, z_axes):
+    """xyz を並べた head / tail / Z 軸の配列から、ボーンのロール値を求める
+
+    Blender の vec_roll_to_mat3 と同じく、Y 軸を最短回転でボーン方向へ向けた姿勢を
+    ロール 0 とし、そこからの Y 軸まわりの角度を返す。
+    """
+    rolls = array("f", bytes(4 * (len(z_axes) // 3)))
+    for i in range(len(rolls)):
+        k = i * 3
+        x = tails[k] - heads[k]
+        y = tails[k + 1] - heads[k + 1]
+        z = tails[k + 2] - heads[k + 2]
+        length = math.sqrt(x * x + y * y + z * z)
+        if length == 0.0:
+            continue
+        x, y, z = x / length, y / length, z / length
+        theta = 1.0 + y
+        if theta > 1e-6:
+            # ロール 0 の X 軸 / Z 軸
+            x0 = (1.0 - x * x / theta, -x, -x * z / theta)
+            z0 = (-x * z / theta, -z, 1.0 - z * z / theta)
+        else:
+            # ボーンがほぼ -Y を向いている場合
+            x0 = (-1.0, 0.0, 0.0)
+            z0 = (0.0, 0.0, 1.0)
+        zx, zy, zz = z_axes[k], z_axes[k + 1], z_axes[k + 2]
+        rolls[i] = math.atan2(
+            zx * x0[0] + zy * x0[1] + zz * x0[2],
+            zx * z0[0] + zy * z0[1] + zz * z0[2],
+        )
+    return rolls
+
+
+def load_skeleton(path):
+    """JSON / CSV のボーンリストを読み込む
+
+    JSON: ``[{"name": ..., "parent": ..., "head": [x, y, z], "tail": [x, y, z]}, ...]``
+    または ``{"bones": [...]}``
+    CSV: ``name,parent`` ヘッダ付き（ルートの parent は空欄）。
+    任意で ``head_x,head_y,head_z,tail_x,tail_y,tail_z`` 列
+    head / tail は空間マッチング用で、全ボーンに揃っている場合だけ使う。
+    """
+    pairs = []
+    heads = []
+    tails = []
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                pairs.append((row["name"], row.get("parent")))
+                if row.get("head_x") and row.get("tail_x"):
+                    heads.extend(float(row[f"head_{axis}"]) for axis in "xyz")
+                    tails.extend(float(row[f"tail_{axis}"]) for axis in "xyz")
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data["bones"]
+        for bone in data:
+            pairs.append((bone["name"], bone.get("parent")))
+            if bone.get("head") and bone.get("tail"):
+                heads.extend(float(v) for v in bone["head"])
+                tails.extend(float(v) for v in bone["tail"])
+
+    if len(heads) != 3 * len(pairs) or len(tails) != 3 * len(pairs):
+        heads = tails = ()
+    return Skeleton.from_pairs(pairs, heads, tails)
+
+
+# ---------------------------------------------------------------------------
+# 段階的マッチング
+# ---------------------------------------------------------------------------
+
+STAGE_EXACT = "exact"
+STAGE_NORMALIZED = "normalized"
+STAGE_PARTIAL = "partial"
+STAGE_NONE = "none"
+STAGE_CACHED = "cached"
+STAGE_SPATIAL = "spatial"
+STAGE_TOPOLOGY = "topology"
+# 正規化名の左右トークン（suggest() のトークン段では候補集めに使わない）
+_SIDE_TOKENS = frozenset(("l", "r"))
+# 区切り・大文字の始まり・英字と数字の境目で名前を語に分ける（"LeftHandIndex1" → left / hand / index / 1）
+_TOKEN_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+# TargetNameIndex.suggest() の理由（他は STAGE_EXACT / STAGE_NORMALIZED / STAGE_PARTIAL）
+SUGGEST_PREFIX = "prefix"
+SUGGEST_TOKEN = "token"
+
+
+def _name_tokens(name):
+    """名前の語の集合（小文字。数字は先頭の 0 を除く: "01" → "1"）"""
+    return frozenset(
+        str(int(token)) if token.isdigit() else token.lower() for token in _TOKEN_RE.findall(name)
+    )
+
+
+class MatchProfile:
+    """Opt-in wall-time and hit-count instrumentation for one mapping run.
+
+    times / hits は区間名（STAGE_* や "traversal" / "apply" など）ごとの累計秒数と件数。
+    begin() 〜 end() の間の正規化キャッシュのヒット数・ミス数も記録する。
+    """
+
+    def __init__(self):
+        self.times = {}
+        self.hits = {}
+        self.normalize_cache = {"hits": 0, "misses": 0}
+        self._cache_start = None
+
+    def add(self, name, seconds=0.0, hits=0):
+        self.times[name] = self.times.get(name, 0.0) + seconds
+        self.hits[name] = self.hits.get(name, 0) + hits
+
+    @contextlib.contextmanager
+    def section(self, name):
+        """with ブロックの経過時間を name に加算する"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def begin(self):
+        self._cache_start = (_normalize_cache_resets, _normalize_cached.cache_info())
+
+    def end(self):
+        if self._cache_start is None:
+            return
+        info = _normalize_cached.cache_info()
+        resets, start = self._cache_start
+        if resets != _normalize_cache_resets or info.hits < start.hits or info.misses < start.misses:
+            # 途中で clear_normalize_cache()（ルールの再コンパイルなど）があるとカウンタは 0 に戻る。
+            # その場合はリセット後の値だけを数える
+            start = start._replace(hits=0, misses=0)
+        self.normalize_cache["hits"] += info.hits - start.hits
+        self.normalize_cache["misses"] += info.misses - start.misses
+        self._cache_start = None
+
+    def normalize_hit_rate(self):
+        total = self.normalize_cache["hits"] + self.normalize_cache["misses"]
+        return self.normalize_cache["hits"] / total if total else 0.0
+
+    def to_dict(self):
+        """JSON に書き出せる形にまとめる"""
+        return {
+            "stages": {
+                name: {"seconds": round(seconds, 6), "hits": self.hits.get(name, 0)}
+                for name, seconds in self.times.items()
+            },
+            "total_seconds": round(sum(self.times.values()), 6),
+            "normalize_cache": dict(self.normalize_cache, hit_rate=round(self.normalize_hit_rate(), 4)),
+        }
+
+
+def match_bone_name(name, target_index):
+    """1 ボーン分のマッチング。(ターゲット名 または None, ステージ名) を返す"""
+    # 1. 完全一致
+    if name in target_index.name_set:
+        return name, STAGE_EXACT
+
+    # 2. 正規化一致
+    norm = normalize_bone_name(name)
+    target = target_index.by_norm.get(norm)
+    if target is not None:
+        return target, STAGE_NORMALIZED
+
+    # 3. 部分一致補助（正規化名を含む最短候補）
+    target = target_index.find_partial(norm)
+    if target is not None:
+        return target, STAGE_PARTIAL
+
+    # 4. 見つからなければ空欄
+    return None, STAGE_NONE
+
+
+def _match_bone_name_profiled(name, target_index, profile):
+    """match_bone_name と同じ判定を、ステージごとの時間とヒット数を記録しながら行う
+
+    各ステージの時間には、そのステージで見つからずに次へ進んだ行の判定時間も含む。
+    """
+    clock = time.perf_counter
+    start = clock()
+    if name in target_index.name_set:
+        profile.add(STAGE_EXACT, clock() - start, 1)
+        return name, STAGE_EXACT
+    mark = clock()
+    profile.add(STAGE_EXACT, mark - start)
+
+    start = mark
+    norm = normalize_bone_name(name)
+    target = target_index.by_norm.get(norm)
+    mark = clock()
+    if target is not None:
+        profile.add(STAGE_NORMALIZED, mark - start, 1)
+        return target, STAGE_NORMALIZED
+    profile.add(STAGE_NORMALIZED, mark - start)
+
+    start = mark
+    target = target_index.find_partial(norm)
+    mark = clock()
+    if target is not None:
+        profile.add(STAGE_PARTIAL, mark - start, 1)
+        return target, STAGE_PARTIAL
+    profile.add(STAGE_PARTIAL, mark - start)
+
+    profile.add(STAGE_NONE, 0.0, 1)
+    return None, STAGE_NONE
+
+
+def generate_mapping(source_names, target_index, cached=None, profile=None):
+    """ソース名の並び順に (source, target または None, stage) を順次返す
+
+    cached ({source: target}) に含まれる行はマッチングせずにそのまま使う。
+    ただしターゲット側に存在しなくなった名前は再マッチングする。
+    profile (MatchProfile) を渡すとステージごとの時間とヒット数を記録する。
+    """
+    if not isinstance(target_index, TargetNameIndex):
+        target_index = TargetNameIndex(target_index)
+    cached = cached or {}
+    if profile is None:
+        for name in source_names:
+            target = cached.get(name)
+            if target is not None and (not target or target in target_index.name_set):
+                yield name, target or None, STAGE_CACHED
+                continue
+            target, stage = match_bone_name(name, target_index)
+            yield name, target, stage
+        return
+
+    clock = time.perf_counter
+    for name in source_names:
+        start = clock()
+        target = cached.get(name)
+        if target is not None and (not target or target in target_index.name_set):
+            profile.add(STAGE_CACHED, clock() - start, 1)
+            yield name, target or None, STAGE_CACHED
+            continue
+        if cached:
+            profile.add(STAGE_CACHED, clock() - start)
+        target, stage = _match_bone_name_profiled(name, target_index, profile)
+        yield name, target, stage
+
+
+# ---------------------------------------------------------------------------
+# 構造マッチング（部分木ハッシュによる親子構造の指紋）
+# ---------------------------------------------------------------------------
+
+def subtree_ids(skeleton, table):
+    """AHU 方式の正規化部分木 ID を各ボーンについて求める
+
+    子の ID を整列したタプルを table で整数に写すので、同じ table を使った
+    2 つのスケルトン間で ID を比較できる。子から親へ 1 回走査するだけで済む。
+    """
+    return run_steps(_iter_subtree_ids(skeleton, table, STEP_CHUNK))
+
+
+def _iter_subtree_ids(skeleton, table, chunk):
+    ids = [0] * len(skeleton)
+    offsets = skeleton.child_offsets
+    flat = skeleton.child_indices
+    order = skeleton.hierarchy_indices()
+    yield
+    # preorder の逆順なら子が必ず親より先に来る
+    for k, i in enumerate(reversed(order)):
+        key = tuple(sorted(ids[c] for c in flat[offsets[i]:offsets[i + 1]]))
+        ids[i] = table.setdefault(key, len(table))
+        if k % chunk == chunk - 1:
+            yield
+    return ids
+
+
+def _iter_depths(skeleton, chunk):
+    depth = [0] * len(skeleton)
+    parent_indices = skeleton.parent_indices
+    for k, i in enumerate(skeleton.hierarchy_indices()):
+        parent = parent_indices[i]
+        if parent >= 0:
+            depth[i] = depth[parent] + 1
+        if k % chunk == chunk - 1:
+            yield
+    return depth
+
+
+def _side(name):
+    """正規化キーの左右（"_l" / "_r" / ""）"""
+    key = normalize_bone_name(name)
+    return key[-2:] if key.endswith(("_l", "_r")) else ""
+
+
+def match_topology(rows, source, target):
+    """未マッチ行を親子構造の一致で対応付ける（rows をその場で更新）。戻り値は割り当てた行数
+
+    処理の中身は iter_match_topology を参照。
+    """
+    return run_steps(iter_match_topology(rows, source, target))
+
+
+def iter_match_topology(rows, source, target, chunk=STEP_CHUNK):
+    """match_topology の段階版。およそ chunk ボーンごとに yield し、割り当てた行数を返す
+
+    1. 部分木 ID と深さの組（指紋）が両側で一意なボーン同士を対応付ける
+       （葉は指紋が衝突しやすいので対象外）。同じ指紋が複数あれば左右で分けて再判定
+    2. 対応済みの親を持つ未マッチボーンを、相手側の親の空いている子のうち
+       部分木 ID が同じものへ割り当てる。同じ部分木 ID の兄弟が両側で 1 つずつ
+       （または左右で分けて 1 つずつ）の時だけ割り当て、区別できない兄弟は
+       名前・空間ステージに任せる
+    2 は preorder で行うので、割り当てた行が次の子の手掛かりになる。
+    親ごとの子の振り分けは 1 回だけなので、全体でボーン数にほぼ比例する。
+    """
+    table = {}
+    sid = yield from _iter_subtree_ids(source, table, chunk)
+    tid = yield from _iter_subtree_ids(target, table, chunk)
+    s_depth = yield from _iter_depths(source, chunk)
+    t_depth = yield from _iter_depths(target, chunk)
+
+    src_index = source.index_of
+    tgt_index = target.index_of
+    row_of = {}
+    matched = {}  # source index -> target index
+    used = set()
+    yield
+    for k, row in enumerate(rows):
+        if k % chunk == chunk - 1:
+            yield
+        s = src_index.get(row[0])
+        if s is None:
+            continue
+        row_of[s] = row
+        if row[1] is not None:
+            t = tgt_index.get(row[1])
+            if t is not None:
+                matched[s] = t
+                used.add(t)
+
+    count = 0
+
+    def assign(s, t):
+        row = row_of[s]
+        row[1] = target.names[t]
+        row[2] = STAGE_TOPOLOGY
+        matched[s] = t
+        used.add(t)
+
+    # 1. 一意な指紋同士
+    s_groups = {}
+    for s in row_of:
+        if s not in matched and source.has_children(s):
+            s_groups.setdefault((sid[s], s_depth[s]), []).append(s)
+    yield
+    t_groups = {}
+    for t in range(len(target)):
+        if t not in used and target.has_children(t):
+            t_groups.setdefault((tid[t], t_depth[t]), []).append(t)
+    yield
+    for k, (key, sources) in enumerate(s_groups.items()):
+        if k % chunk == chunk - 1:
+            yield
+        targets = t_groups.get(key)
+        if not targets:
+            continue
+        if len(sources) == 1 and len(targets) == 1:
+            assign(sources[0], targets[0])
+            count += 1
+            continue
+        # 左右対称な部分木は名前の左右で切り分ける
+        by_side = {}
+        for t in targets:
+            by_side.setdefault(_side(target.names[t]), []).append(t)
+        sources_by_side = {}
+        for s in sources:
+            sources_by_side.setdefault(_side(source.names[s]), []).append(s)
+        for side, side_sources in sources_by_side.items():
+            side_targets = by_side.get(side)
+            if side and side_targets and len(side_sources) == 1 and len(side_targets) == 1:
+                assign(side_sources[0], side_targets[0])
+                count += 1
+
+    # 2. 対応済みの親から子へ伝播
+    # 親ごとに、空いている子を部分木 ID のバケツへ一度だけ振り分ける。
+    # 左右での切り分けは、同じ部分木 ID の兄弟が複数ある時だけバケツごとに作る。
+    # yield の間隔は、振り分けた子の数も含めた処理量で数える
+    work = [0]
+
+    class Siblings:
+        def __init__(self, skeleton, parent, ids, free):
+            self.names = skeleton.names
+            self.by_id = {}
+            self.by_side = {}
+            children = skeleton.children_of(parent)
+            work[0] += len(children)
+            for c in children:
+                if free(c):
+                    self.by_id.setdefault(ids[c], set()).add(c)
+
+        def same(self, key):
+            return self.by_id.get(key, ())
+
+        def same_side(self, key, side):
+            sides = self.by_side.get(key)
+            if sides is None:
+                sides = self.by_side[key] = {}
+                work[0] += len(self.same(key))
+                for c in self.same(key):
+                    sides.setdefault(_side(self.names[c]), set()).add(c)
+            return sides.get(side, ())
+
+        def take(self, key, i):
+            self.by_id[key].discard(i)
+            sides = self.by_side.get(key)
+            if sides is not None:
+                sides[_side(self.names[i])].discard(i)
+
+    s_siblings = {}
+    t_siblings = {}
+    parent_indices = source.parent_indices
+    for s in source.hierarchy_indices():
+        work[0] += 1
+        if work[0] >= chunk:
+            work[0] = 0
+            yield
+        if s in matched or s not in row_of:
+            continue
+        parent = parent_indices[s]
+        if parent < 0 or parent not in matched:
+            continue
+        t_parent = matched[parent]
+        ss = s_siblings.get(parent)
+        if ss is None:
+            ss = s_siblings[parent] = Siblings(source, parent, sid, lambda c: c not in matched and c in row_of)
+        ts = t_siblings.get(t_parent)
+        if ts is None:
+            ts = t_siblings[t_parent] = Siblings(target, t_parent, tid, lambda c: c not in used)
+
+        key = sid[s]
+        t_same = ts.same(key)
+        if not t_same:
+            continue
+        if len(ss.same(key)) == 1 and len(t_same) == 1:
+            t = next(iter(t_same))
+        else:
+            side = _side(source.names[s])
+            t_side = ts.same_side(key, side)
+            if not side or len(ss.same_side(key, side)) != 1 or len(t_side) != 1:
+                # 構造だけでは区別できない兄弟は名前順で推測せず、名前・空間ステージに任せる
+                continue
+            t = next(iter(t_side))
+        ss.take(key, s)
+        ts.take(key, t)
+        assign(s, t)
+        count += 1
+
+    return count
+
+
+# ---------------------------------------------------------------------------
+# 空間マッチング（名前が役に立たないボーンをレスト位置で対応付ける）
+# ---------------------------------------------------------------------------
+
+class PointKDTree:
+    """Pure-Python 3D KD-tree with the same API as mathutils.kdtree.KDTree.
+
+    mathutils が無い環境（CLI / CI）用。insert() → balance() → find_n()。
+    """
+
+    def __init__(self, size=0):
+        self._items = []
+        self._axes = []
+
+    def insert(self, co, index):
+        self._items.append(((co[0], co[1], co[2]), index))
+
+    def balance(self):
+        # 中央値で分割した暗黙の木を配列上に作る（[lo, hi) の中央がノード）
+        items = self._items
+        axes = [0] * len(items)
+        stack = [(0, len(items), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= 0:
+                continue
+            axis = depth % 3
+            items[lo:hi] = sorted(items[lo:hi], key=lambda item: item[0][axis])
+            mid = (lo + hi) // 2
+            axes[mid] = axis
+            stack.append((lo, mid, depth + 1))
+            stack.append((mid + 1, hi, depth + 1))
+        self._axes = axes
+
+    def find_n(self, co, n):
+        """co に近い順に最大 n 個の (co, index, 距離) を返す"""
+        items = self._items
+        axes = self._axes
+        best = []  # (-距離^2, 通し番号) の最大ヒープ
+        stack = [(0, len(items), 0.0)]
+        while stack:
+            lo, hi, plane2 = stack.pop()
+            # 分割面までの距離は取り出した時点の n 番目と比べる（積んだ後に best は縮む）
+            if hi - lo <= 0 or (len(best) == n and plane2 >= -best[0][0]):
+                continue
+            mid = (lo + hi) // 2
+            point = items[mid][0]
+            dx = point[0] - co[0]
+            dy = point[1] - co[1]
+            dz = point[2] - co[2]
+            d2 = dx * dx + dy * dy + dz * dz
+            if len(best) < n:
+                heapq.heappush(best, (-d2, mid))
+            elif d2 < -best[0][0]:
+                heapq.heapreplace(best, (-d2, mid))
+
+            axis = axes[mid]
+            diff = co[axis] - point[axis]
+            if diff < 0:
+                stack.append((mid + 1, hi, diff * diff))
+                stack.append((lo, mid, plane2))
+            else:
+                stack.append((lo, mid, diff * diff))
+                stack.append((mid + 1, hi, plane2))
+
+        best.sort(key=lambda entry: -entry[0])
+        return [(items[i][0], items[i][1], math.sqrt(-neg_d2)) for neg_d2, i in best]
+
+
+try:
+    from mathutils.kdtree import KDTree
+except ImportError:
+    KDTree = PointKDTree
+
+
+def _iter_transform_points(flat, matrix, chunk):
+    """xyz を並べた配列に 4x4 行列（行優先の入れ子シーケンス）を掛けた点のリストを返す"""
+    if matrix is None:
+        a, b, c, d, e, f, g, h, i, j, k_, l_ = 1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0
+    else:
+        (a, b, c, d), (e, f, g, h), (i, j, k_, l_) = matrix[0][:4], matrix[1][:4], matrix[2][:4]
+    points = []
+    step = 3 * chunk
+    for start in range(0, len(flat), step):
+        for k in range(start, min(start + step, len(flat)), 3):
+            x, y, z = flat[k], flat[k + 1], flat[k + 2]
+            points.append((a * x + b * y + c * z + d, e * x + f * y + g * z + h, i * x + j * y + k_ * z + l_))
+        yield
+    return points
+
+
+def normalized_rest_points(skeleton, matrix=None):
+    """レスト位置をスケールと向きについて正規化した (heads, tails) を返す
+
+    matrix（オブジェクトのワールド行列）を掛けた後、最も長い軸が Y なら Y-up とみなして
+    Z-up に回し、足元 (最小 Z) を 0・水平方向の重心を原点・高さを 1 に揃える。
+    """
+    return run_steps(_iter_rest_points(skeleton, matrix, STEP_CHUNK))
+
+
+def _iter_rest_points(skeleton, matrix, chunk):
+    heads = yield from _iter_transform_points(skeleton.heads, matrix, chunk)
+    tails = yield from _iter_transform_points(skeleton.tails, matrix, chunk)
+    points = heads + tails
+    if not points:
+        return heads, tails
+
+    lo = [min(p[axis] for p in points) for axis in range(3)]
+    hi = [max(p[axis] for p in points) for axis in range(3)]
+    extent = [hi[axis] - lo[axis] for axis in range(3)]
+    yield
+    if extent[1] > extent[2] and extent[1] >= extent[0]:
+        # Y-up のリグ（FBX/GLTF の回転が焼き込まれていない等）
+        heads = [(x, -z, y) for x, y, z in heads]
+        tails = [(x, -z, y) for x, y, z in tails]
+        lo[1], hi[1], lo[2], hi[2] = -hi[2], -lo[2], lo[1], hi[1]
+        extent[1], extent[2] = extent[2], extent[1]
+        yield
+
+    height = extent[2] or max(extent) or 1.0
+    cx = sum(p[0] for p in heads) / len(heads)
+    cy = sum(p[1] for p in heads) / len(heads)
+    floor = lo[2]
+
+    def normalize(p):
+        return ((p[0] - cx) / height, (p[1] - cy) / height, (p[2] - floor) / height)
+
+    normalized = []
+    for points in (heads, tails):
+        out = []
+        for start in range(0, len(points), chunk):
+            out.extend(normalize(p) for p in points[start:start + chunk])
+            yield
+        normalized.append(out)
+    return tuple(normalized)
+
+
+def match_spatial(rows, source, target, source_matrix=None, target_matrix=None,
+                  max_distance=0.05, neighbors=8):
+    """未マッチ行をレスト位置の近さでまとめて対応付ける（rows をその場で更新）
+
+    rows は [source, target または None, stage] の可変リストの並び。
+    ターゲットの head と tail を 1 本の KD-tree に入れ、各未マッチボーンの head / tail
+    それぞれの近傍から、まだ使われていないターゲットを候補として集める。
+    候補を (head 距離 + tail 距離) の昇順に並べて貪欲に割り当てるため、
+    全体で O((N + M) log M)。距離は高さ 1 に正規化した単位で、max_distance を超える
+    候補は使わない。戻り値は割り当てた行数。
+    """
+    return run_steps(iter_match_spatial(rows, source, target, source_matrix, target_matrix,
+                                        max_distance, neighbors))
+
+
+def iter_match_spatial(rows, source, target, source_matrix=None, target_matrix=None,
+                       max_distance=0.05, neighbors=8, chunk=STEP_CHUNK):
+    """match_spatial の段階版。およそ chunk ボーンごとに yield し、割り当てた行数を返す
+
+    近傍探索は 1 行で近傍 neighbors 個を 2 回引くので、chunk // neighbors 行ごとに yield する。
+    候補は chunk 行ずつ整列した列を heapq.merge で併合しながら割り当てる。
+    """
+    if not (len(source.heads) and len(target.heads)):
+        return 0
+
+    unmatched = [row for row in rows if row[1] is None]
+    if not unmatched:
+        return 0
+    used = {row[1] for row in rows if row[1] is not None}
+
+    src_heads, src_tails = yield from _iter_rest_points(source, source_matrix, chunk)
+    tgt_heads, tgt_tails = yield from _iter_rest_points(target, target_matrix, chunk)
+
+    free = [i for i, name in enumerate(target.names) if name not in used]
+    if not free:
+        return 0
+    tree = KDTree(2 * len(free))
+    for k, i in enumerate(free):
+        tree.insert(tgt_heads[i], i)
+        tree.insert(tgt_tails[i], i)
+        if k % chunk == chunk - 1:
+            yield
+    tree.balance()
+    yield
+
+    def distance(p, q):
+        return math.sqrt((p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2)
+
+    index_of = source.index_of
+    query_step = max(1, chunk // neighbors)
+    runs = []
+    candidates = []
+    for row_number, row in enumerate(unmatched):
+        s = index_of.get(row[0])
+        if s is not None:
+            head, tail = src_heads[s], src_tails[s]
+            seen = set()
+            for co in (head, tail):
+                for _co, t, _dist in tree.find_n(co, neighbors):
+                    if t in seen:
+                        continue
+                    seen.add(t)
+                    cost = distance(head, tgt_heads[t]) + distance(tail, tgt_tails[t])
+                    if cost <= 2 * max_distance:
+                        candidates.append((cost, row_number, t))
+        if row_number % chunk == chunk - 1:
+            candidates.sort()
+            runs.append(candidates)
+            candidates = []
+        if row_number % query_step == query_step - 1:
+            yield
+    candidates.sort()
+    runs.append(candidates)
+
+    assigned_rows = set()
+    assigned_targets = set()
+    for k, (_cost, row_number, t) in enumerate(heapq.merge(*runs)):
+        if k % (neighbors * chunk) == neighbors * chunk - 1:
+            yield
+        if row_number in assigned_rows or t in assigned_targets:
+            continue
+        assigned_rows.add(row_number)
+        assigned_targets.add(t)
+        unmatched[row_number][1] = target.names[t]
+        unmatched[row_number][2] = STAGE_SPATIAL
+    return len(assigned_rows)
+
+
+# ---------------------------------------------------------------------------
+# 一括リネーム計画
+# ---------------------------------------------------------------------------
+
+TEMP_NAME_PREFIX = "__bone_mapper_tmp"
+
+
+class RenamePlan:
+    """Collision-free rename order computed by plan_renames().
+
+    steps は (現在の名前, 新しい名前) を実行順に並べたもの。循環がある場合のみ
+    一時名を経由する。collisions は既存ボーンや他の行とターゲット名が衝突した
+    ため実行しない (source, target) の一覧。
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.renamed = 0
+        self.collisions = []
+        self.missing = []
+        self.cycles = 0
+
+    def final_names(self):
+        """steps を全て実行した後の {元の名前: 新しい名前}（一時名は含まない）"""
+        origin = {}
+        for old, new in self.steps:
+            origin[new] = origin.pop(old, old)
+        return {source: name for name, source in origin.items() if source != name}
+
+
+def plan_renames(renames, existing_names):
+    """(source, target) の並びから、名前の衝突が起きないリネーム順序を求める
+
+    - A→B かつ B→C のような連鎖は B→C を先に実行する
+    - A→B かつ B→A のような循環は一時名を 1 つだけ使って解消する
+    - リネームしないボーンや別の行とターゲット名が重なる行は衝突として除外する
+    全体で O(n)。
+    """
+    plan = RenamePlan()
+    existing = set(existing_names)
+
+    # ソースの重複・存在しないボーン・無変更を除外し、ターゲットの重複は先勝ち
+    target_of = {}
+    source_of = {}
+    seen = set()
+    for source, target in renames:
+        if not target or source in seen:
+            continue
+        seen.add(source)
+        if source not in existing:
+            plan.missing.append((source, target))
+            continue
+        if source == target:
+            continue
+        if target in source_of:
+            plan.collisions.append((source, target))
+            continue
+        target_of[source] = target
+        source_of[target] = source
+
+    # ターゲット名を「動かないボーン」が使っている行は衝突。除外すると
+    # そのソースも動かなくなるので、連鎖的に伝播させる
+    pending = [s for s, t in target_of.items() if t in existing and t not in target_of]
+    while pending:
+        source = pending.pop()
+        target = target_of.pop(source)
+        del source_of[target]
+        plan.collisions.append((source, target))
+        # このソース名をターゲットにしていた行も衝突する
+        blocked = source_of.get(source)
+        if blocked is not None:
+            pending.append(blocked)
+
+    # 依存関係: source→target は、target を今使っているボーン（= target_of のキー）が
+    # 先に動いてからでないと実行できない。各行の依存先は高々 1 つなので
+    # グラフはパスと循環の集まりになる
+    done = set()
+
+    def emit_chain(source):
+        # source を空けた後、source 名を待っている行を順に実行する
+        while source is not None and source not in done:
+            done.add(source)
+            plan.steps.append((source, target_of[source]))
+            plan.renamed += 1
+            source = source_of.get(source)
+
+    # 1. ターゲット名が空いている行から連鎖を辿る
+    for source, target in target_of.items():
+        if target not in target_of:
+            emit_chain(source)
+
+    # 2. 残りは循環。1 本につき一時名を 1 つ使う
+    used = existing | set(source_of)
+    counter = 0
+    for source in target_of:
+        if source in done:
+            continue
+        plan.cycles += 1
+        temp = f"{TEMP_NAME_PREFIX}{counter}"
+        while temp in used:
+            counter += 1
+            temp = f"{TEMP_NAME_PREFIX}{counter}"
+        used.add(temp)
+        counter += 1
+
+        # source を一時名へ退避して名前を空け、循環を 1 周したら一時名から戻す
+        plan.steps.append((source, temp))
+        done.add(source)
+        waiting = source_of[source]
+        while waiting != source:
+            done.add(waiting)
+            plan.steps.append((waiting, target_of[waiting]))
+            plan.renamed += 1
+            waiting = source_of[waiting]
+        plan.steps.append((temp, target_of[source]))
+        plan.renamed += 1
+
+    return plan
+
+
+# ---------------------------------------------------------------------------
+# アクションのデータパス書き換え（pose.bones["..."] の参照をリネーム後の名前へ）
+# ---------------------------------------------------------------------------
+
+_POSE_BONE_PATH_RE = re.compile(r'pose\.bones\["((?:[^"\\]|\\.)*)"\]')
+# bpy.utils.escape_identifier と同じエスケープ
+_ESCAPES = {"\\": "\\\\", '"': '\\"', "\t": "\\t", "\n": "\\n", "\r": "\\r", "\a": "\\a", "\b": "\\b", "\f": "\\f"}
+_UNESCAPES = {escaped[1]: char for char, escaped in _ESCAPES.items()}
+_ESCAPE_RE = re.compile("[" + re.escape("".join(_ESCAPES)) + "]")
+_UNESCAPE_RE = re.compile(r"\\(.)")
+
+
+def escape_identifier(name):
+    """データパスの [\"...\"] 内に書ける形へエスケープする"""
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES[m.group(0)], name)
+
+
+def unescape_identifier(text):
+    return _UNESCAPE_RE.sub(lambda m: _UNESCAPES.get(m.group(1), m.group(1)), text)
+
+
+class DataPathRemapper:
+    """Rewrites pose.bones["..."] references in F-curve data paths through one rename table.
+
+    データパスごとの結果をメモ化するので、同じボーンのカーブが多数のアクションに
+    現れても置換は 1 回分で済む。F カーブとグループは duck typing（data_path / name 属性）。
+    """
+
+    def __init__(self, renames):
+        if isinstance(renames, dict):
+            renames = renames.items()
+        self.table = {old: new for old, new in renames if new and old != new}
+        self._paths = {}
+
+    def remap_path(self, path):
+        """書き換え後のデータパス（変更が無ければ None）"""
+        try:
+            return self._paths[path]
+        except KeyError:
+            pass
+        result = None
+        if 'pose.bones["' in path:
+            new_path = _POSE_BONE_PATH_RE.sub(self._replace, path)
+            if new_path != path:
+                result = new_path
+        self._paths[path] = result
+        return result
+
+    def _replace(self, match):
+        new = self.table.get(unescape_identifier(match.group(1)))
+        if new is None:
+            return match.group(0)
+        return f'pose.bones["{escape_identifier(new)}"]'
+
+    def remap_channels(self, fcurves, groups=()):
+        """1 つのアクション（またはスロット）の F カーブとグループを 1 パスで書き換え、
+        書き換えたカーブ数を返す"""
+        touched = 0
+        remap_path = self.remap_path
+        for fcurve in fcurves:
+            new_path = remap_path(fcurve.data_path)
+            if new_path is not None:
+                fcurve.data_path = new_path
+                touched += 1
+
+        table = self.table
+        renames = [(group, table[group.name]) for group in groups if group.name in table]
+        if renames:
+            # 入れ替えや連鎖で .001 が付かないよう、衝突する場合は一時名を経由する
+            names = {group.name for group in groups}
+            if any(new in names for _group, new in renames):
+                for i, (group, _new) in enumerate(renames):
+                    group.name = f"{TEMP_NAME_PREFIX}{i}"
+            for group, new in renames:
+                group.name = new
+        return touched
+
+
+# ---------------------------------------------------------------------------
+# マッピングキャッシュ（アーマチュアのシグネチャ単位でディスクに保存）
+# ---------------------------------------------------------------------------
+
+def skeleton_signature(skeleton):
+    """ボーン名と親子関係から、並び順に依存しないシグネチャ（16進文字列）を作る"""
+    if skeleton._signature is not None:
+        return skeleton._signature
+    h = hashlib.blake2b(digest_size=16)
+    for name, parent in sorted(zip(skeleton.names, skeleton.parents)):
+        h.update(name.encode("utf-8"))
+        h.update(b"\0")
+        h.update((parent or "").encode("utf-8"))
+        h.update(b"\n")
+    skeleton._signature = h.hexdigest()
+    return skeleton._signature
+
+
+def settings_digest(settings):
+    """マッチング結果を左右する設定と正規化ルールのダイジェスト（MappingCache のキーの一部）
+
+    settings は JSON にできる dict（有効なステージやしきい値など）。
+    """
+    payload = json.dumps({"settings": settings, "rules": rules_fingerprint()}, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class MappingCache:
+    """On-disk mapping store keyed by (source signature, target signature, settings digest).
+
+    1 エントリ 1 ファイル（zlib 圧縮 JSON）。合計サイズが max_bytes を超えたら
+    最終利用が古いものから削除する。設定やルールが変わるとダイジェストが変わるので、
+    古い結果は読まれずに LRU で消えていく。
+    """
+
+    SUFFIX = ".bmc"
+    FORMAT_VERSION = 1
+    # 部分一致で調べる同一ターゲットのエントリ数の上限
+    PARTIAL_CANDIDATES = 8
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, source_sig, target_sig, variant=""):
+        return os.path.join(self.directory, f"{source_sig}_{target_sig}_{variant}{self.SUFFIX}")
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except (OSError, ValueError, zlib.error):
+            return None
+        if data.get("v") != self.FORMAT_VERSION:
+            return None
+        # 最終利用時刻として mtime を更新（LRU 削除用）
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return dict(zip(data["source"], data["target"]))
+
+    def load(self, source_sig, target_sig, variant=""):
+        """完全一致のエントリを {source: target} で返す（無ければ None）"""
+        return self._read(self._path(source_sig, target_sig, variant))
+
+    def load_partial(self, target_sig, source_names, variant=""):
+        """同じターゲット・同じ設定のエントリのうち、ソース名の重なりが最大のものを返す
+
+        戻り値は ({source: target}, 重なり数)。見つからなければ (None, 0)。
+        """
+        suffix = f"_{target_sig}_{variant}{self.SUFFIX}"
+        try:
+            paths = [os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith(suffix)]
+        except OSError:
+            return None, 0
+        paths.sort(key=_mtime, reverse=True)
+
+        names = set(source_names)
+        best, best_overlap = None, 0
+        for path in paths[:self.PARTIAL_CANDIDATES]:
+            rows = self._read(path)
+            if rows is None:
+                continue
+            overlap = sum(1 for source in rows if source in names)
+            if overlap > best_overlap:
+                best, best_overlap = rows, overlap
+        return best, best_overlap
+
+    def store(self, source_sig, target_sig, variant, rows):
+        """(source, target) の並びを保存し、必要なら古いエントリを削除する"""
+        sources = []
+        targets = []
+        for source, target in rows:
+            sources.append(source)
+            targets.append(target or "")
+        payload = json.dumps(
+            {"v": self.FORMAT_VERSION, "source": sources, "target": targets},
+            ensure_ascii=False, separators=(",", ":"),
+        ).encode("utf-8")
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(source_sig, target_sig, variant)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(payload, 6))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """合計サイズが上限を超えている間、最終利用が古いエントリから削除する"""
+        try:
+            entries = [
+                os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith(self.SUFFIX)
+            ]
+        except OSError:
+            return
+        sized = []
+        total = 0
+        for path in entries:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            sized.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        sized.sort()
+        for _mtime_value, size, path in sized:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(self.SUFFIX):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+# ---------------------------------------------------------------------------
+# マッピングの入出力（CSV / JSON / JSON Lines を 1 行ずつ読み書きする）
+# ---------------------------------------------------------------------------
+
+MAPPING_FORMATS = {"csv": ".csv", "json": ".json", "jsonl": ".jsonl"}
+
+
+def mapping_format(path):
+    """拡張子からファイル形式（MAPPING_FORMATS のキー）を決める。不明なら CSV"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".json":
+        return "json"
+    return "csv"
+
+
+def write_mapping_rows(path, rows, fmt=None):
+    """(source, target) の並びを 1 行ずつ書き出し、行数を返す
+
+    CSV は ``source,target`` ヘッダ付き、JSON は ``[{"source": ..., "target": ...}, ...]``、
+    JSON Lines は 1 行 1 オブジェクト。target が None の行は空欄で書く。
+    """
+    fmt = fmt or mapping_format(path)
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(("source", "target"))
+            for source, target, *_rest in rows:
+                writer.writerow((source, target or ""))
+                count += 1
+        else:
+            separator = "\n" if fmt == "jsonl" else ",\n"
+            if fmt == "json":
+                f.write("[\n")
+            for source, target, *_rest in rows:
+                if count:
+                    f.write(separator)
+                f.write(json.dumps({"source": source, "target": target or ""}, ensure_ascii=False))
+                count += 1
+            f.write("\n]\n" if fmt == "json" else "\n")
+    return count
+
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    """JSON 配列の要素を 1 つずつ返す（文書全体を一度にデコードしない）"""
+    decode = json.JSONDecoder().raw_decode
+    buf, pos, eof, started = "", 0, False, False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                value, end = decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # 数値などがチャンクの境目で切れていないよう、後ろに続きがある時だけ確定する
+                if end < len(buf) or eof:
+                    yield value
+                    pos = end
+                    continue
+        elif eof:
+            raise ValueError("unexpected end of JSON array")
+        chunk = f.read(chunk_size)
+        buf = buf[pos:] + chunk
+        pos = 0
+        eof = not chunk
+
+
+def _mapping_pair(value, path):
+    if isinstance(value, dict):
+        return str(value["source"]), str(value.get("target") or "")
+    if isinstance(value, (list, tuple)) and len(value) >= 2:
+        return str(value[0]), str(value[1] or "")
+    raise ValueError(f"{path}: expected {{'source': ..., 'target': ...}} but got {value!r}")
+
+
+def read_mapping_rows(path, fmt=None):
+    """マッピングファイルの (source, target) を 1 行ずつ返すジェネレーター
+
+    CSV は source / target 列（ヘッダが無ければ先頭 2 列）。空の source 行と
+    # で始まる行は無視する。JSON は配列、JSON Lines は 1 行 1 要素で、要素は
+    ``{"source": ..., "target": ...}`` または ``[source, target]``。
+    """
+    fmt = fmt or mapping_format(path)
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            reader = csv.reader(f)
+            source_col, target_col = 0, 1
+            for row in reader:
+                if not row or not row[0] or row[0].lstrip().startswith("#"):
+                    continue
+                header = [cell.strip().lower() for cell in row]
+                if "source" in header and "target" in header:
+                    source_col, target_col = header.index("source"), header.index("target")
+                    break
+                yield row[0], row[1] if len(row) > 1 else ""
+                break
+            for row in reader:
+                if len(row) <= source_col or not row[source_col]:
+                    continue
+                if source_col == 0 and row[0].lstrip().startswith("#"):
+                    continue
+                yield row[source_col], row[target_col] if len(row) > target_col else ""
+        elif fmt == "jsonl":
+            for line in f:
+                if line.strip():
+                    yield _mapping_pair(json.loads(line), path)
+        else:
+            for value in _iter_json_array(f):
+                yield _mapping_pair(value, path)
+
+
+# ---------------------------------------------------------------------------
+# 一覧表示用のメタデータ（アドオンの UIList が使う）
+# ---------------------------------------------------------------------------
+
+class PackedMappings:
+    """Compact storage for the mapping list: parallel name lists plus a collapsed-row bitmap.
+
+    to_blob() / from_blob() で全体を 1 本の ASCII 文字列（zlib 圧縮した JSON の base64）に
+    変換する。アドオンはこれを StringProperty 1 つとして保存するので、行数が増えても
+    RNA 構造体は増えず、Undo・保存・読み込みは文字列 1 本分のコストで済む。
+    """
+
+    def __init__(self, sources=(), targets=None, collapsed=()):
+        self.sources = list(sources)
+        self.targets = list(targets) if targets is not None else [""] * len(self.sources)
+        if len(self.targets) != len(self.sources):
+            raise ValueError("sources and targets must have the same length")
+        self.collapsed = bytearray(len(self.sources))
+        for row in collapsed:
+            self.collapsed[row] = 1
+
+    def __len__(self):
+        return len(self.sources)
+
+    def rows(self):
+        return zip(self.sources, self.targets)
+
+    def collapsed_rows(self):
+        return [row for row, bit in enumerate(self.collapsed) if bit]
+
+    def to_blob(self):
+        if not self.sources:
+            return ""
+        payload = json.dumps(
+            {"v": 1, "source": self.sources, "target": self.targets, "collapsed": self.collapsed_rows()},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return base64.b64encode(zlib.compress(payload.encode("utf-8"), 6)).decode("ascii")
+
+    @classmethod
+    def from_blob(cls, blob):
+        """to_blob() の結果から復元する（空文字列・壊れたデータは空の一覧）"""
+        if not blob:
+            return cls()
+        try:
+            data = json.loads(zlib.decompress(base64.b64decode(blob)).decode("utf-8"))
+            if data.get("v") != 1:
+                return cls()
+            return cls(data["source"], data["target"], data.get("collapsed", ()))
+        except (ValueError, KeyError, IndexError, TypeError, zlib.error):
+            return cls()
+
+
+def search_key(source_name, target_name):
+    """一覧の検索対象（source と target を改行でつないだ小文字の文字列）"""
+    return f"{source_name}\n{target_name}".lower()
+
+
+class MappingViewIndex:
+    """Per-row display metadata for the mapping list.
+
+    行ごとの親行インデックス・深さ・子の有無・折りたたみ状態を保持し、
+    表示フラグは 1 回の preorder パスでまとめて求める。
+    検索結果と filter_items のフラグは検索語と version（行の名前が変わるたびに増える）で
+    メモ化する。
+    """
+
+    # 検索結果を残しておく検索語の数
+    SEARCH_CACHE_SIZE = 32
+
+    def __init__(self, row_names, skeleton=None, fold_names=(), collapsed_names=()):
+        # skeleton: ソースアーマチュアの Skeleton（無ければ階層情報なし）
+        # fold_names: props.folds の並び（ボーン名 -> folds 内インデックスの逆引き用）
+        row_of = {name: i for i, name in enumerate(row_names)}
+        self.row_of = row_of
+        bone_of = skeleton.index_of if skeleton is not None else {}
+        bones = [bone_of.get(name, -1) for name in row_names]
+        # ソースに存在しない行（リネーム後など）はインデント無しで描画する
+        self.in_source = [bone >= 0 for bone in bones]
+        if skeleton is not None:
+            names = skeleton.names
+            parent_indices = skeleton.parent_indices
+            # 親ボーンが行に無い場合は -1
+            self.parent_rows = [
+                row_of.get(names[parent_indices[bone]], -1) if bone >= 0 and parent_indices[bone] >= 0 else -1
+                for bone in bones
+            ]
+            self.has_children = [bone >= 0 and skeleton.has_children(bone) for bone in bones]
+        else:
+            self.parent_rows = [-1] * len(bones)
+            self.has_children = [False] * len(bones)
+
+        # 親 → 子の順に並べた処理順（明示スタックの preorder）と深さ
+        children = [[] for _ in row_names]
+        roots = []
+        for i, parent in enumerate(self.parent_rows):
+            if parent < 0:
+                roots.append(i)
+            else:
+                children[parent].append(i)
+        depth = [0] * len(row_names)
+        order = []
+        stack = roots[::-1]
+        while stack:
+            i = stack.pop()
+            order.append(i)
+            for child in reversed(children[i]):
+                depth[child] = depth[i] + 1
+                stack.append(child)
+        self.depth = depth
+        self._order = order
+
+        self.fold_of = {name: i for i, name in enumerate(fold_names)}
+        self.collapsed = {row_of[name] for name in collapsed_names if name in row_of}
+        self._visible = None
+        # ソートモードごとの並べ替え結果（UIList の flt_neworder 形式）
+        self._orders = {}
+
+        # 検索用: 行ごとの "source\ntarget"（小文字）、検索語 → 一致行、直近のフラグ
+        self.version = 0
+        self._search_keys = None
+        self._matches = {}
+        self._flags = None
+
+    def __len__(self):
+        return len(self.parent_rows)
+
+    def sort_order(self, key, make_sort_keys):
+        """行を並べ替えた時の各行の新しい位置を返す（key ごとに一度だけ計算）
+
+        make_sort_keys は行ごとのソートキーのリストを返す関数。
+        戻り値は UIList.filter_items の flt_neworder と同じ「元の行 → 表示位置」。
+        """
+        order = self._orders.get(key)
+        if order is None:
+            sort_keys = make_sort_keys()
+            ranked = sorted(range(len(sort_keys)), key=sort_keys.__getitem__)
+            order = [0] * len(ranked)
+            for position, row in enumerate(ranked):
+                order[row] = position
+            self._orders[key] = order
+        return order
+
+    def identity_order(self):
+        order = self._orders.get(None)
+        if order is None:
+            order = self._orders[None] = list(range(len(self.parent_rows)))
+        return order
+
+    def invalidate_order(self, key):
+        self._orders.pop(key, None)
+
+    def reset_caches(self):
+        """表示フラグ・検索キー・検索結果・並べ替えのメモをすべて破棄する（行の構成はそのまま）"""
+        self._visible = None
+        self._orders.clear()
+        self._search_keys = None
+        self._matches.clear()
+        self._flags = None
+        self.version += 1
+
+    def update_row(self, row, source_name, target_name):
+        """1 行の名前が変わった時に呼ぶ（検索キーを差し替え、検索結果を破棄）"""
+        if self._search_keys is not None:
+            self._search_keys[row] = search_key(source_name, target_name)
+        self.version += 1
+        self._matches.clear()
+        self._flags = None
+
+    def search_rows(self, needle, make_search_keys):
+        """needle（小文字）を source / target のどちらかに含む行の一覧
+
+        make_search_keys は行ごとの search_key() のリストを返す関数（初回だけ呼ぶ）。
+        needle を部分文字列に持つ過去の検索語があれば、その一致行だけを走査する
+        （入力で検索語が伸びるたびに候補が絞られ、消した時は前の結果がそのまま使える）。
+        """
+        rows = self._matches.get(needle)
+        if rows is not None:
+            return rows
+        if self._search_keys is None:
+            self._search_keys = make_search_keys()
+        keys = self._search_keys
+
+        base = None
+        for previous, matched in self._matches.items():
+            if previous in needle and (base is None or len(matched) < len(base)):
+                base = matched
+        rows = [i for i in (range(len(keys)) if base is None else base) if needle in keys[i]]
+
+        if len(self._matches) >= self.SEARCH_CACHE_SIZE:
+            del self._matches[next(iter(self._matches))]
+        self._matches[needle] = rows
+        return rows
+
+    def filter_flags(self, needle, make_search_keys, use_folds, flag):
+        """UIList.filter_items の flt_flags（検索一致かつ、use_folds なら表示中の行に flag）
+
+        (needle, use_folds, version) が前回と同じなら前回のリストをそのまま返す。
+        """
+        key = (needle, use_folds, self.version)
+        if self._flags is not None and self._flags[0] == key:
+            return self._flags[1]
+
+        if needle:
+            flags = [0] * len(self)
+            for i in self.search_rows(needle, make_search_keys):
+                flags[i] = flag
+        else:
+            flags = [flag] * len(self)
+        if use_folds:
+            for i, visible in enumerate(self.visible_flags()):
+                if not visible:
+                    flags[i] = 0
+        self._flags = (key, flags)
+        return flags
+
+    def is_expanded(self, row):
+        return row not in self.collapsed
+
+    def set_expanded(self, row, expanded):
+        if expanded:
+            self.collapsed.discard(row)
+        else:
+            self.collapsed.add(row)
+        self._visible = None
+        self._flags = None
+
+    def is_visible(self, row):
+        """1 行分の表示判定（フラグ未計算なら親行を辿るだけで求める）"""
+        if self._visible is not None:
+            return self._visible[row]
+        parent = self.parent_rows[row]
+        while parent >= 0:
+            if parent in self.collapsed:
+                return False
+            parent = self.parent_rows[parent]
+        return True
+
+    def visible_flags(self):
+        """各行の表示フラグ（折りたたまれた祖先を持つ行は False）"""
+        if self._visible is None:
+            parent_rows = self.parent_rows
+            collapsed = self.collapsed
+            visible = [True] * len(parent_rows)
+            for i in self._order:
+                parent = parent_rows[i]
+                if parent >= 0 and (parent in collapsed or not visible[parent]):
+                    visible[i] = False
+            self._visible = visible
+        return self._visible
+
+
+# ---------------------------------------------------------------------------
+# コマンドライン（multiprocessing でソース/ターゲットの組を並列処理）
+# ---------------------------------------------------------------------------
+
+# ワーカープロセス内で同じターゲットを使い回すためのキャッシュ
+_worker_targets = {}
+
+
+def _load_rules(directories):
+    """CLI / ワーカープロセス用にルールパックを読み込む。読めなかったパックを返す"""
+    loader = RulePackLoader(directories)
+    loader.refresh(force=True)
+    return loader.errors
+
+
+def _map_pair(job):
+    source_path, target_path, order, topology, spatial = job
+    record = {"source": source_path, "target": target_path}
+    try:
+        cached = _worker_targets.get(target_path)
+        if cached is None:
+            target = load_skeleton(target_path)
+            cached = _worker_targets[target_path] = (target, TargetNameIndex(target.names))
+        target, target_index = cached
+        source = load_skeleton(source_path)
+        names = source.hierarchy_order() if order == "hierarchy" else source.names
+        rows = [list(row) for row in generate_mapping(names, target_index)]
+        if topology:
+            match_topology(rows, source, target)
+        if spatial:
+            match_spatial(rows, source, target)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        return record
+
+    matched = sum(1 for _, target, _ in rows if target is not None)
+    record["matched"] = matched
+    record["unmatched"] = len(rows) - matched
+    record["mapping"] = [
+        {"source": name, "target": target or "", "stage": stage} for name, target, stage in rows
+    ]
+    return record
+
+
+def _read_pairs(path):
+    """1 行 1 組（source,target）の CSV を読む。# で始まる行は無視"""
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or row[0].lstrip().startswith("#"):
+                continue
+            if len(row) < 2:
+                raise ValueError(f"{path}: expected 'source,target' but got {row!r}")
+            yield row[0].strip(), row[1].strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Map bone names between skeletons exported as JSON/CSV bone lists.",
+    )
+    parser.add_argument("source", nargs="?", help="source bone list (.json / .csv)")
+    parser.add_argument("target", nargs="?", help="target bone list (.json / .csv)")
+    parser.add_argument("--pairs", help="CSV file with one 'source,target' pair per line")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--order", choices=("hierarchy", "source"), default="hierarchy",
+                        help="row order of each mapping (default: hierarchy)")
+    parser.add_argument("--topology", action="store_true",
+                        help="match leftover bones by parent/child structure")
+    parser.add_argument("--spatial", action="store_true",
+                        help="match leftover bones by rest position (needs head/tail in the bone lists)")
+    parser.add_argument("--rules", action="append", default=[], metavar="DIR",
+                        help="folder of *.json rule packs to add to the built-in rules (repeatable)")
+    parser.add_argument("-o", "--output", help="write JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.rules:
+        for _path, message in _load_rules(args.rules):
+            print(f"rule pack skipped: {message}", file=sys.stderr)
+
+    if args.pairs:
+        try:
+            pairs = list(_read_pairs(args.pairs))
+        except (OSError, ValueError, csv.Error) as e:
+            parser.error(f"could not read --pairs file: {e}")
+    elif args.source and args.target:
+        pairs = [(args.source, args.target)]
+    else:
+        parser.error("give SOURCE TARGET or --pairs FILE")
+    jobs = [(source, target, args.order, args.topology, args.spatial) for source, target in pairs]
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failures = 0
+    try:
+        if args.jobs > 1 and len(jobs) > 1:
+            # spawn 方式のプラットフォームでも各ワーカーに同じルールを読み込ませる
+            initializer = _load_rules if args.rules else None
+            with multiprocessing.Pool(min(args.jobs, len(jobs)), initializer, (args.rules,)) as pool:
+                results = pool.imap(_map_pair, jobs, chunksize=max(1, len(jobs) // (args.jobs * 4)))
+                failures = _write_records(results, out)
+        else:
+            failures = _write_records(map(_map_pair, jobs), out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failures else 0
+
+
+def _write_records(records, out):
+    """結果を 1 組 1 行の JSON として逐次書き出す。失敗数を返す"""
+    failures = 0
+    for record in records:
+        if "error" in record:
+            failures += 1
+            print(f"{record['source']} -> {record['target']}: {record['error']}", file=sys.stderr)
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write("\n")
+        out.flush()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
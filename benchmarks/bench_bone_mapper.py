@@ -0,0 +1,389 @@
+"""Benchmarks for armature_bone_name_mapper/core.py on synthetic rigs.
+
+Mixamo / Rigify / UE / VRM 風の命名で 1k〜50k ボーンの合成リグを作り、
+正規化・各マッチングステージ・階層列挙・一覧表示用の処理・リネーム計画を
+個別に計測する。結果は JSON で出力し、しきい値ファイルと比較して回帰を検出できる::
+
+    python benchmarks/bench_bone_mapper.py --sizes 1000 5000 -o bench.json
+    python benchmarks/bench_bone_mapper.py --check benchmarks/thresholds.json
+    python benchmarks/bench_bone_mapper.py --calibrate benchmarks/thresholds.json
+
+マシンの速さに左右されないよう、各計測はコアに依存しない基準処理（reference_workload）
+との比で比較する。しきい値ファイルには基準環境で測った比と余裕倍率（headroom）を保存する。
+
+Blender 上の filter_items / draw_item / apply_mapping はそれぞれ
+MappingViewIndex（表示フラグ・並べ替え・行メタデータ）と plan_renames が
+処理の本体なので、それらを bpy なしで計測する。
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+# パッケージの __init__ は bpy を読み込むので、コアだけを単体のモジュールとして読み込む
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "armature_bone_name_mapper"))
+
+import core  # noqa: E402
+
+
+# ---------------------------------------------------------------------------
+# 合成リグ
+# ---------------------------------------------------------------------------
+
+# 各スタイルの人型ボーン名（side は "L" / "R"、n は番号）
+STYLES = {
+    "mixamo": {
+        "hips": "mixamo:Hips",
+        "spine": lambda n: "mixamo:Spine" if n == 0 else f"mixamo:Spine{n}",
+        "neck": "mixamo:Neck",
+        "head": "mixamo:Head",
+        "shoulder": lambda s: f"mixamo:{'Left' if s == 'L' else 'Right'}Shoulder",
+        "upper_arm": lambda s: f"mixamo:{'Left' if s == 'L' else 'Right'}Arm",
+        "lower_arm": lambda s: f"mixamo:{'Left' if s == 'L' else 'Right'}ForeArm",
+        "hand": lambda s: f"mixamo:{'Left' if s == 'L' else 'Right'}Hand",
+        "finger": lambda s, f, n: f"mixamo:{'Left' if s == 'L' else 'Right'}Hand{f.capitalize()}{n}",
+        "upper_leg": lambda s: f"mixamo:{'Left' if s == 'L' else 'Right'}UpLeg",
+        "lower_leg": lambda s: f"mixamo:{'Left' if s == 'L' else 'Right'}Leg",
+        "foot": lambda s: f"mixamo:{'Left' if s == 'L' else 'Right'}Foot",
+        "extra": lambda c, k: f"mixamo:Hair{c}_{k}",
+    },
+    "rigify": {
+        "hips": "DEF-pelvis",
+        "spine": lambda n: "DEF-spine" if n == 0 else f"DEF-spine.{n:03d}",
+        "neck": "DEF-neck",
+        "head": "DEF-head",
+        "shoulder": lambda s: f"DEF-shoulder.{s}",
+        "upper_arm": lambda s: f"DEF-upper_arm.{s}",
+        "lower_arm": lambda s: f"DEF-forearm.{s}",
+        "hand": lambda s: f"DEF-hand.{s}",
+        "finger": lambda s, f, n: f"DEF-{f}.{n:02d}.{s}",
+        "upper_leg": lambda s: f"DEF-thigh.{s}",
+        "lower_leg": lambda s: f"DEF-shin.{s}",
+        "foot": lambda s: f"DEF-foot.{s}",
+        "extra": lambda c, k: f"DEF-hair.{c:03d}.{k:03d}",
+    },
+    "ue": {
+        "hips": "pelvis",
+        "spine": lambda n: f"spine_{n + 1:02d}",
+        "neck": "neck_01",
+        "head": "head",
+        "shoulder": lambda s: f"clavicle_{s.lower()}",
+        "upper_arm": lambda s: f"upperarm_{s.lower()}",
+        "lower_arm": lambda s: f"lowerarm_{s.lower()}",
+        "hand": lambda s: f"hand_{s.lower()}",
+        "finger": lambda s, f, n: f"{f}_{n:02d}_{s.lower()}",
+        "upper_leg": lambda s: f"thigh_{s.lower()}",
+        "lower_leg": lambda s: f"calf_{s.lower()}",
+        "foot": lambda s: f"foot_{s.lower()}",
+        "extra": lambda c, k: f"hair_{c:03d}_{k:03d}",
+    },
+    "vrm": {
+        "hips": "J_Bip_C_Hips",
+        "spine": lambda n: "J_Bip_C_Spine" if n == 0 else f"J_Bip_C_Spine{n}",
+        "neck": "J_Bip_C_Neck",
+        "head": "J_Bip_C_Head",
+        "shoulder": lambda s: f"J_Bip_{s}_Shoulder",
+        "upper_arm": lambda s: f"J_Bip_{s}_UpperArm",
+        "lower_arm": lambda s: f"J_Bip_{s}_LowerArm",
+        "hand": lambda s: f"J_Bip_{s}_Hand",
+        "finger": lambda s, f, n: f"J_Bip_{s}_{'Little' if f == 'pinky' else f.capitalize()}{n}",
+        "upper_leg": lambda s: f"J_Bip_{s}_UpperLeg",
+        "lower_leg": lambda s: f"J_Bip_{s}_LowerLeg",
+        "foot": lambda s: f"J_Bip_{s}_Foot",
+        "extra": lambda c, k: f"J_Sec_Hair{c}_{k:02d}",
+    },
+}
+
+FINGERS = ("thumb", "index", "middle", "ring", "pinky")
+
+
+def make_rig(style, bone_count, chain_depth=16, seed=0):
+    """人型の基本骨格 + 髪/布チェーンで bone_count 本の Skeleton を作る
+
+    レスト位置はスタイルに依存せず同じ配置になるので、空間マッチングの計測にも使える。
+    """
+    names = STYLES[style]
+    rng = random.Random(seed)
+    bones = []  # (name, parent, head, tail)
+
+    def add(name, parent, head, tail):
+        bones.append((name, parent, head, tail))
+        return name
+
+    hips = add(names["hips"], None, (0, 0, 1.0), (0, 0, 1.1))
+    parent = hips
+    z = 1.1
+    for n in range(3):
+        parent = add(names["spine"](n), parent, (0, 0, z), (0, 0, z + 0.12))
+        z += 0.12
+    chest = parent
+    neck = add(names["neck"], chest, (0, 0, z), (0, 0, z + 0.08))
+    head = add(names["head"], neck, (0, 0, z + 0.08), (0, 0, z + 0.3))
+
+    for side, sx in (("L", 1.0), ("R", -1.0)):
+        shoulder = add(names["shoulder"](side), chest, (0.05 * sx, 0, z), (0.15 * sx, 0, z))
+        upper = add(names["upper_arm"](side), shoulder, (0.15 * sx, 0, z), (0.42 * sx, 0, z))
+        lower = add(names["lower_arm"](side), upper, (0.42 * sx, 0, z), (0.68 * sx, 0, z))
+        hand = add(names["hand"](side), lower, (0.68 * sx, 0, z), (0.76 * sx, 0, z))
+        for f, finger in enumerate(FINGERS):
+            p = hand
+            y = (f - 2) * 0.02
+            for n in range(1, 4):
+                x = 0.76 + 0.03 * (n - 1)
+                p = add(names["finger"](side, finger, n), p, (x * sx, y, z), ((x + 0.03) * sx, y, z))
+        thigh = add(names["upper_leg"](side), hips, (0.1 * sx, 0, 1.0), (0.1 * sx, 0, 0.55))
+        shin = add(names["lower_leg"](side), thigh, (0.1 * sx, 0, 0.55), (0.1 * sx, 0, 0.1))
+        add(names["foot"](side), shin, (0.1 * sx, 0, 0.1), (0.1 * sx, -0.12, 0.0))
+
+    # 残りは頭から垂れる髪チェーン（chain_depth 本つなぎ）
+    chain = 0
+    while len(bones) < bone_count:
+        p = head
+        hx, hy = rng.uniform(-0.1, 0.1), rng.uniform(-0.1, 0.1)
+        hz = z + 0.25
+        for k in range(min(chain_depth, bone_count - len(bones))):
+            p = add(names["extra"](chain, k), p, (hx, hy, hz), (hx, hy, hz - 0.02))
+            hz -= 0.02
+        chain += 1
+
+    bones = bones[:bone_count]
+    heads = [c for b in bones for c in b[2]]
+    tails = [c for b in bones for c in b[3]]
+    return core.Skeleton.from_pairs(((b[0], b[1]) for b in bones), heads, tails)
+
+
+# ---------------------------------------------------------------------------
+# 計測
+# ---------------------------------------------------------------------------
+
+def timeit(func, repeat):
+    """func を repeat 回実行し、最短時間（秒）を返す"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def reference_workload(size=50000):
+    """基準処理: 文字列の生成・小文字化・辞書作成・並べ替え（コアの処理に近い純 Python の負荷）"""
+    rng = random.Random(0)
+    words = [f"Bone_{rng.randrange(10 ** 6):06d}" for _ in range(size)]
+
+    def work():
+        table = {word.lower(): i for i, word in enumerate(words)}
+        sorted(table)
+        return sum(len(word) for word in words if "_1" in word)
+
+    return work
+
+
+def run_size(bone_count, source_style, target_style, chain_depth, repeat):
+    source = make_rig(source_style, bone_count, chain_depth, seed=1)
+    target = make_rig(target_style, bone_count, chain_depth, seed=2)
+    results = {}
+
+    # 正規化（キャッシュなし / キャッシュ済み）
+    def normalize_cold():
+        core.clear_normalize_cache()
+        core.normalize_many(source.names)
+
+    results["normalize_cold"] = timeit(normalize_cold, repeat)
+    core.normalize_many(source.names)
+    results["normalize_warm"] = timeit(lambda: core.normalize_many(source.names), repeat)
+
+    # 階層列挙（スナップショットの作成込み / 作成済み）
+    results["hierarchy_order"] = timeit(
+        lambda: core.Skeleton(source.names, source.parent_indices).hierarchy_order(), repeat
+    )
+
+    # 名前ステージ（索引作成 + 完全一致 / 正規化一致 / 部分一致）
+    results["target_index"] = timeit(lambda: core.TargetNameIndex(target.names), repeat)
+    order = source.hierarchy_order()
+
+    def name_stages():
+        index = core.TargetNameIndex(target.names)
+        return [list(row) for row in core.generate_mapping(order, index)]
+
+    results["name_stages"] = timeit(name_stages, repeat)
+    base_rows = name_stages()
+
+    def copy_rows():
+        return [list(row) for row in base_rows]
+
+    results["topology_stage"] = timeit(lambda: core.match_topology(copy_rows(), source, target), repeat)
+    results["spatial_stage"] = timeit(lambda: core.match_spatial(copy_rows(), source, target), repeat)
+
+    # 一覧表示: filter_items（表示フラグ + 並べ替え）と draw_item（行メタデータ参照）
+    row_names = [row[0] for row in base_rows]
+    folds = source.names
+    collapsed = [source.names[i] for i in range(0, len(source), 7) if source.has_children(i)]
+
+    def build_view():
+        return core.MappingViewIndex(row_names, source, folds, collapsed)
+
+    results["view_index_build"] = timeit(build_view, repeat)
+    view = build_view()
+    target_keys = [(row[1] or "").lower() for row in base_rows]
+
+    search_keys = [core.search_key(row[0], row[1] or "") for row in base_rows]
+
+    def filter_items():
+        view.reset_caches()
+        view.filter_flags("", lambda: search_keys, True, 1)
+        view.sort_order("TARGET", lambda: target_keys)
+
+    results["filter_items"] = timeit(filter_items, repeat)
+    results["filter_items_cached"] = timeit(lambda: view.filter_flags("", lambda: search_keys, True, 1), repeat)
+
+    # 検索欄への入力（1 文字ずつ伸ばしてから消す）
+    typed = ["h", "ha", "hai", "hair", "hair1", "hair12", "hair1", "hair", "ha", "h", "ri"]
+
+    def search_typing():
+        view.reset_caches()
+        for needle in typed:
+            view.filter_flags(needle, lambda: search_keys, True, 1)
+
+    results["search_typing"] = timeit(search_typing, repeat)
+
+    # ターゲット名の候補提示（索引の作成 / ソース 1000 行分の top-8。1 件あたりは 1/1000）
+    suggest_index = core.TargetNameIndex(target.names)
+    suggest_index.suggest("hand", 8)  # 索引は事前に作っておき、suggest_rows には含めない
+    results["suggest_index"] = timeit(lambda: core.TargetNameIndex(target.names).suggest("hand", 8), repeat)
+    queries = order[::max(1, len(order) // 1000)][:1000]
+
+    def suggest_rows():
+        suggest_index.clear_suggestions()
+        for name in queries:
+            suggest_index.suggest(name, 8)
+
+    results["suggest_rows"] = timeit(suggest_rows, repeat)
+
+    def draw_items():
+        for i in range(len(view)):
+            view.depth[i], view.has_children[i], view.is_expanded(i), view.in_source[i]
+
+    results["draw_items"] = timeit(draw_items, repeat)
+
+    # apply_mapping: リネーム計画（スワップを混ぜる）
+    renames = [(row[0], row[1] or "") for row in base_rows]
+    renames += [(source.names[i], source.names[i + 1]) for i in range(0, min(len(source) - 1, 200), 2)]
+    results["plan_renames"] = timeit(lambda: core.plan_renames(renames, source.names), repeat)
+
+    matched = sum(1 for row in base_rows if row[1] is not None)
+    return results, {"rows": len(base_rows), "name_matched": matched}
+
+
+def check_thresholds(records, path):
+    """しきい値ファイルと比較し、超過した項目を (key, 比, 上限) で返す
+
+    上限は基準環境での比（baseline）× headroom。基準処理の floor 倍に満たない計測は
+    タイマーの揺れの方が大きいので比較しない。
+    """
+    with open(path, encoding="utf-8") as f:
+        thresholds = json.load(f)
+    headroom = thresholds["headroom"]
+    floor = thresholds.get("floor", 0.0)
+    baseline = thresholds["baseline"]
+    failures = []
+    for record in records:
+        key = f"{record['benchmark']}@{record['bones']}"
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        limit = max(expected, floor) * headroom
+        if record["relative"] > limit:
+            failures.append((key, record["relative"], limit))
+    return failures
+
+
+def calibrate_thresholds(records, path, headroom, floor):
+    """今回の計測を基準環境としてしきい値ファイルを書く"""
+    thresholds = {
+        "headroom": headroom,
+        "floor": floor,
+        "baseline": {f"{record['benchmark']}@{record['bones']}": record["relative"] for record in records},
+    }
+    # リポジトリの他のファイルと同じ CRLF で書く
+    with open(path, "w", encoding="utf-8", newline="\r\n") as f:
+        f.write(json.dumps(thresholds, indent=2) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000],
+                        help="bone counts to benchmark")
+    parser.add_argument("--source-style", choices=sorted(STYLES), default="mixamo")
+    parser.add_argument("--target-style", choices=sorted(STYLES), default="ue")
+    parser.add_argument("--chain-depth", type=int, default=16,
+                        help="length of the padding hair chains (hierarchy depth)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark (best is kept)")
+    parser.add_argument("-o", "--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--check", metavar="THRESHOLDS",
+                        help="exit with status 1 if any benchmark exceeds its threshold")
+    parser.add_argument("--calibrate", metavar="THRESHOLDS",
+                        help="write this run's ratios as the baseline of a thresholds file")
+    parser.add_argument("--headroom", type=float, default=1.5,
+                        help="allowed slowdown over the baseline ratio (with --calibrate)")
+    parser.add_argument("--floor", type=float, default=0.05,
+                        help="ratios below this are compared as this value (with --calibrate)")
+    args = parser.parse_args(argv)
+
+    # 基準処理は計測の前後で測り、速い方を使う（CPU のクロック変動を均す）
+    reference = reference_workload()
+    reference_seconds = timeit(reference, args.repeat)
+    results_by_size = []
+    for size in args.sizes:
+        results_by_size.append(
+            (size, *run_size(size, args.source_style, args.target_style, args.chain_depth, args.repeat))
+        )
+    reference_seconds = min(reference_seconds, timeit(reference, args.repeat))
+    print(f"{'reference':>18} {reference_seconds * 1000:22.2f} ms", file=sys.stderr)
+
+    records = []
+    summaries = []
+    for size, results, summary in results_by_size:
+        summaries.append(dict(summary, bones=size))
+        for benchmark, seconds in results.items():
+            relative = seconds / reference_seconds
+            records.append({
+                "benchmark": benchmark, "bones": size,
+                "seconds": round(seconds, 6), "relative": round(relative, 4),
+            })
+            print(f"{benchmark:>18} {size:>6} bones: {seconds * 1000:9.2f} ms  x{relative:8.3f}", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "source_style": args.source_style,
+        "target_style": args.target_style,
+        "chain_depth": args.chain_depth,
+        "repeat": args.repeat,
+        "reference_seconds": round(reference_seconds, 6),
+        "summaries": summaries,
+        "results": records,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.calibrate:
+        calibrate_thresholds(records, args.calibrate, args.headroom, args.floor)
+    if args.check:
+        failures = check_thresholds(records, args.check)
+        for key, relative, limit in failures:
+            print(f"REGRESSION {key}: x{relative:.3f} > x{limit:.3f} of reference", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""pytest の共通設定
+
+パッケージの __init__.py は bpy を読み込むので、bpy 非依存のコアだけを
+単体のモジュール ``core`` として読み込めるようにする（benchmarks と同じ方法）。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "armature_bone_name_mapper"))
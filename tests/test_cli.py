@@ -0,0 +1,55 @@
+"""コマンドライン（main）: 引数・ペアファイルのエラーと 1 組分のマッピング"""
+
+import json
+
+import pytest
+
+from core import main
+
+
+def write_bones(path, pairs):
+    path.write_text(json.dumps([{"name": name, "parent": parent} for name, parent in pairs]), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def rigs(tmp_path):
+    source = write_bones(tmp_path / "source.json", [("Hips", None), ("Spine", "Hips"), ("Tail", "Hips")])
+    target = write_bones(tmp_path / "target.json", [("hips", None), ("spine", "hips")])
+    return source, target
+
+
+def test_one_pair(rigs, tmp_path):
+    output = tmp_path / "out.jsonl"
+    assert main([*rigs, "-o", str(output)]) == 0
+    record = json.loads(output.read_text(encoding="utf-8"))
+    assert record["source"] == rigs[0]
+    assert [(row["source"], row["target"]) for row in record["mapping"]] == [
+        ("Hips", "hips"), ("Spine", "spine"), ("Tail", ""),
+    ]
+    assert (record["matched"], record["unmatched"]) == (2, 1)
+
+
+def test_failed_pair_is_reported_with_exit_code_1(rigs, tmp_path, capsys):
+    missing = str(tmp_path / "missing.json")
+    assert main([rigs[0], missing, "-o", str(tmp_path / "out.jsonl")]) == 1
+    assert missing in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("content", [None, "only_one_column\n", b"\xff\xfe\x00broken"])
+def test_unreadable_pairs_file_is_a_usage_error(tmp_path, capsys, content):
+    pairs = tmp_path / "pairs.csv"
+    if isinstance(content, bytes):
+        pairs.write_bytes(content)
+    elif content is not None:
+        pairs.write_text(content, encoding="utf-8")
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--pairs", str(pairs)])
+    assert exit_info.value.code == 2
+    assert "could not read --pairs file" in capsys.readouterr().err
+
+
+def test_missing_arguments(capsys):
+    with pytest.raises(SystemExit):
+        main([])
+    assert "SOURCE TARGET" in capsys.readouterr().err
@@ -0,0 +1,94 @@
+"""DataPathRemapper: pose.bones["..."] の書き換え・エスケープ・グループの入れ替え"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from core import DataPathRemapper, escape_identifier, unescape_identifier
+
+
+class Groups(list):
+    """名前が重なると .001 を付ける Blender のコレクションの代わり"""
+
+    def add(self, name):
+        group = Group(self, name)
+        self.append(group)
+        return group
+
+
+class Group:
+    def __init__(self, owner, name):
+        self._owner = owner
+        self._name = name
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        taken = {group._name for group in self._owner if group is not self}
+        candidate, number = value, 0
+        while candidate in taken:
+            number += 1
+            candidate = f"{value}.{number:03d}"
+        self._name = candidate
+
+
+def fcurve(path):
+    return SimpleNamespace(data_path=path)
+
+
+@pytest.mark.parametrize("name", ['plain', 'quote"d', "back\\slash", "tab\tnew\nline", 'ends with \\', "髪_01"])
+def test_escape_round_trip(name):
+    escaped = escape_identifier(name)
+    assert '"' not in escaped.replace('\\"', "")
+    assert unescape_identifier(escaped) == name
+
+
+def test_remap_path():
+    remapper = DataPathRemapper({"Arm": "upperarm_l", 'Odd "name"': "odd\\name", "Same": "Same", "Cleared": ""})
+    assert remapper.remap_path('pose.bones["Arm"].rotation_quaternion') == 'pose.bones["upperarm_l"].rotation_quaternion'
+    assert remapper.remap_path('pose.bones["Odd \\"name\\""].location') == 'pose.bones["odd\\\\name"].location'
+    # 変わらない・対象外のパスは None
+    assert remapper.remap_path('pose.bones["Same"].location') is None
+    assert remapper.remap_path('pose.bones["Cleared"].location') is None
+    assert remapper.remap_path('pose.bones["Armature"].location') is None
+    assert remapper.remap_path('location') is None
+    assert remapper.remap_path('key_blocks["Arm"].value') is None
+
+
+def test_swap_and_a_quoted_lookalike_inside_a_name():
+    remapper = DataPathRemapper([("A", "B"), ("B", "A")])
+    path = 'pose.bones["A"].constraints["Copy pose.bones[\\"B\\"]"].influence'
+    assert remapper.remap_path('pose.bones["A"].location') == 'pose.bones["B"].location'
+    assert remapper.remap_path('pose.bones["B"].location') == 'pose.bones["A"].location'
+    assert remapper.remap_path(path) == 'pose.bones["B"].constraints["Copy pose.bones[\\"B\\"]"].influence'
+
+
+def test_remap_channels_rewrites_curves_once_per_path():
+    remapper = DataPathRemapper({"Arm": "upperarm_l", "Hand": "hand_l"})
+    curves = [fcurve('pose.bones["Arm"].location') for _ in range(3)] + [fcurve('pose.bones["Leg"].scale')]
+    assert remapper.remap_channels(curves) == 3
+    assert [curve.data_path for curve in curves] == ['pose.bones["upperarm_l"].location'] * 3 + [
+        'pose.bones["Leg"].scale'
+    ]
+    assert remapper.remap_channels(curves) == 0
+
+
+@pytest.mark.parametrize("renames, before, after", [
+    # 入れ替え
+    ({"A": "B", "B": "A"}, ["A", "B", "C"], ["B", "A", "C"]),
+    # 連鎖（A→B の時点で B がまだある）
+    ({"A": "B", "B": "C"}, ["A", "B"], ["B", "C"]),
+    # 3 つの循環
+    ({"A": "B", "B": "C", "C": "A"}, ["A", "B", "C"], ["B", "C", "A"]),
+    # 衝突なし
+    ({"A": "X"}, ["A", "B"], ["X", "B"]),
+])
+def test_group_swaps_do_not_get_numbered(renames, before, after):
+    groups = Groups()
+    for name in before:
+        groups.add(name)
+    DataPathRemapper(renames).remap_channels([], groups)
+    assert [group.name for group in groups] == after
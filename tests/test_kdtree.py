@@ -0,0 +1,55 @@
+"""PointKDTree: 総当たりと同じ近傍を返すか"""
+
+import math
+import random
+
+import pytest
+
+from core import PointKDTree
+
+
+def brute_force(points, co, n):
+    ranked = sorted((math.dist(point, co), index) for index, point in points)
+    return ranked[:n]
+
+
+def build(points):
+    tree = PointKDTree(len(points))
+    for index, point in points:
+        tree.insert(point, index)
+    tree.balance()
+    return tree
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 7, 300])
+@pytest.mark.parametrize("n", [1, 3, 8])
+def test_find_n_matches_brute_force(count, n):
+    rng = random.Random(count * 31 + n)
+    points = [(i, (rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(0, 2))) for i in range(count)]
+    tree = build(points)
+    for _ in range(50):
+        co = (rng.uniform(-1.5, 1.5), rng.uniform(-1.5, 1.5), rng.uniform(-0.5, 2.5))
+        found = tree.find_n(co, n)
+        expected = brute_force(points, co, n)
+        assert len(found) == len(expected)
+        assert [dist for _co, _index, dist in found] == pytest.approx([dist for dist, _index in expected])
+        # 返る座標と番号は挿入したものの組
+        lookup = dict(points)
+        for point, index, dist in found:
+            assert lookup[index] == point
+            assert math.dist(point, co) == pytest.approx(dist)
+
+
+def test_duplicate_points_are_all_returned():
+    # head と tail が同じ点にある（長さ 0 のボーン）場合も両方の番号が返る
+    points = [(0, (0.0, 0.0, 0.0)), (1, (0.0, 0.0, 0.0)), (2, (1.0, 0.0, 0.0))]
+    found = build(points).find_n((0.1, 0.0, 0.0), 2)
+    assert sorted(index for _co, index, _dist in found) == [0, 1]
+
+
+def test_results_are_sorted_by_distance():
+    rng = random.Random(7)
+    points = [(i, (rng.random(), rng.random(), rng.random())) for i in range(100)]
+    found = build(points).find_n((0.5, 0.5, 0.5), 20)
+    distances = [dist for _co, _index, dist in found]
+    assert distances == sorted(distances)
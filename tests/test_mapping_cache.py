@@ -0,0 +1,93 @@
+"""MappingCache: 設定ダイジェスト付きのキー、部分一致の再利用、LRU 削除"""
+
+import os
+
+from core import MappingCache, settings_digest
+
+
+def stored_files(cache):
+    return sorted(name for name in os.listdir(cache.directory) if name.endswith(MappingCache.SUFFIX))
+
+
+def age(cache, source_sig, target_sig, variant, seconds_ago):
+    path = cache._path(source_sig, target_sig, variant)
+    stamp = os.stat(path).st_mtime - seconds_ago
+    os.utime(path, (stamp, stamp))
+
+
+def test_store_and_load(tmp_path):
+    cache = MappingCache(str(tmp_path))
+    cache.store("src", "tgt", "v", [("A", "a"), ("B", None), ("骨", "bone")])
+    assert cache.load("src", "tgt", "v") == {"A": "a", "B": "", "骨": "bone"}
+    assert cache.load("src", "other", "v") is None
+
+
+def test_variant_separates_entries(tmp_path):
+    cache = MappingCache(str(tmp_path))
+    plain = settings_digest({"topology": False})
+    topology = settings_digest({"topology": True})
+    assert plain != topology
+    cache.store("src", "tgt", plain, [("A", "a")])
+    cache.store("src", "tgt", topology, [("A", "b")])
+    assert cache.load("src", "tgt", plain) == {"A": "a"}
+    assert cache.load("src", "tgt", topology) == {"A": "b"}
+    assert cache.load("src", "tgt", "") is None
+
+
+def test_settings_digest_is_order_independent():
+    assert settings_digest({"a": 1, "b": 2}) == settings_digest({"b": 2, "a": 1})
+
+
+def test_load_partial_picks_the_largest_overlap_with_the_same_variant(tmp_path):
+    cache = MappingCache(str(tmp_path))
+    cache.store("s1", "tgt", "v", [("A", "a"), ("X", "x")])
+    cache.store("s2", "tgt", "v", [("A", "a"), ("B", "b"), ("C", "c")])
+    cache.store("s3", "tgt", "other", [("A", "a"), ("B", "b"), ("C", "c"), ("D", "d")])
+    cache.store("s4", "elsewhere", "v", [("A", "a"), ("B", "b"), ("C", "c"), ("D", "d")])
+    rows, overlap = cache.load_partial("tgt", ["A", "B", "C", "D"], "v")
+    assert overlap == 3
+    assert rows == {"A": "a", "B": "b", "C": "c"}
+    assert cache.load_partial("missing", ["A"], "v") == (None, 0)
+
+
+def test_corrupt_or_foreign_entries_are_misses(tmp_path):
+    cache = MappingCache(str(tmp_path))
+    cache.store("src", "tgt", "v", [("A", "a")])
+    with open(cache._path("src", "tgt", "v"), "wb") as f:
+        f.write(b"not zlib")
+    assert cache.load("src", "tgt", "v") is None
+    assert cache.load_partial("tgt", ["A"], "v") == (None, 0)
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    rows = [(f"bone_{i}", f"target_{i}") for i in range(200)]
+    cache = MappingCache(str(tmp_path), max_bytes=10 ** 9)
+    for name in ("old", "used", "new"):
+        cache.store(name, "tgt", "v", rows)
+    entry_size = os.path.getsize(cache._path("new", "tgt", "v"))
+    age(cache, "old", "tgt", "v", 300)
+    age(cache, "used", "tgt", "v", 200)
+    age(cache, "new", "tgt", "v", 100)
+    # 読み込むと最終利用時刻が更新される
+    assert cache.load("used", "tgt", "v") is not None
+
+    cache.max_bytes = 2 * entry_size + entry_size // 2
+    cache.evict()
+    assert stored_files(cache) == sorted(
+        os.path.basename(cache._path(name, "tgt", "v")) for name in ("used", "new")
+    )
+
+    # 保存時にも上限を超えた分を削除する
+    cache.store("newest", "tgt", "v", rows)
+    assert cache.load("new", "tgt", "v") is None
+    assert cache.load("newest", "tgt", "v") is not None
+    assert len(stored_files(cache)) == 2
+
+
+def test_clear(tmp_path):
+    cache = MappingCache(str(tmp_path))
+    cache.store("src", "tgt", "v", [("A", "a")])
+    (tmp_path / "keep.txt").write_text("unrelated")
+    cache.clear()
+    assert stored_files(cache) == []
+    assert (tmp_path / "keep.txt").exists()
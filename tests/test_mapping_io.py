@@ -0,0 +1,101 @@
+"""write_mapping_rows / read_mapping_rows: CSV・JSON・JSON Lines の往復と逐次読み込み"""
+
+import io
+import json
+
+import pytest
+
+from core import MAPPING_FORMATS, _iter_json_array, mapping_format, read_mapping_rows, write_mapping_rows
+
+ROWS = [
+    ("mixamorig:Hips", "pelvis"),
+    ("mixamorig:Spine", None),
+    ("髪_01", "hair_01"),
+    ('quote"d, name', "comma,target"),
+    ("trailing space ", ""),
+]
+
+
+@pytest.mark.parametrize("fmt", sorted(MAPPING_FORMATS))
+def test_round_trip(tmp_path, fmt):
+    path = tmp_path / f"mapping{MAPPING_FORMATS[fmt]}"
+    assert write_mapping_rows(str(path), ROWS) == len(ROWS)
+    assert list(read_mapping_rows(str(path))) == [(source, target or "") for source, target in ROWS]
+
+
+@pytest.mark.parametrize("fmt", sorted(MAPPING_FORMATS))
+def test_round_trip_larger_than_one_read_chunk(tmp_path, fmt):
+    rows = [(f"source_bone_{i:05d}", f"target_bone_{i:05d}") for i in range(5000)]
+    path = tmp_path / f"big{MAPPING_FORMATS[fmt]}"
+    write_mapping_rows(str(path), rows)
+    assert path.stat().st_size > 1 << 16
+    assert list(read_mapping_rows(str(path))) == rows
+
+
+def test_extra_columns_are_ignored_on_write(tmp_path):
+    path = tmp_path / "rows.csv"
+    write_mapping_rows(str(path), [("A", "B", "exact"), ("C", None, "none")])
+    assert list(read_mapping_rows(str(path))) == [("A", "B"), ("C", "")]
+
+
+def test_headerless_csv(tmp_path):
+    path = tmp_path / "plain.csv"
+    path.write_text("A,B\n# comment\nC,\n\nD\n", encoding="utf-8")
+    assert list(read_mapping_rows(str(path))) == [("A", "B"), ("C", ""), ("D", "")]
+
+
+def test_csv_header_in_any_column_order(tmp_path):
+    path = tmp_path / "reordered.csv"
+    path.write_text("\ufeffnote,Target,Source\nx,B,A\ny,,C\n", encoding="utf-8")
+    assert list(read_mapping_rows(str(path))) == [("A", "B"), ("C", "")]
+
+
+def test_json_accepts_pairs_and_null_targets(tmp_path):
+    path = tmp_path / "pairs.json"
+    path.write_text(json.dumps([["A", "B"], {"source": "C", "target": None}, {"source": "D"}]), encoding="utf-8")
+    assert list(read_mapping_rows(str(path))) == [("A", "B"), ("C", ""), ("D", "")]
+
+
+def test_jsonl_skips_blank_lines(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    path.write_text('{"source": "A", "target": "B"}\n\n["C", "D"]\n', encoding="utf-8")
+    assert mapping_format(str(path)) == "jsonl"
+    assert list(read_mapping_rows(str(path))) == [("A", "B"), ("C", "D")]
+
+
+def test_format_from_extension():
+    assert mapping_format("a.JSON") == "json"
+    assert mapping_format("a.jsonl") == "jsonl"
+    assert mapping_format("a.csv") == "csv"
+    assert mapping_format("a.txt") == "csv"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_json_array_elements_split_across_chunks(chunk_size):
+    values = [{"source": "A", "target": "B"}, 12345, [1.5, "x"], "s\\\"q", {"n": [{}]}]
+    text = " [ " + " , ".join(json.dumps(v) for v in values) + " ] "
+    assert list(_iter_json_array(io.StringIO(text), chunk_size)) == values
+
+
+def test_json_array_reads_lazily():
+    text = "[" + ",".join(json.dumps({"source": str(i), "target": ""}) for i in range(1000)) + ",oops]"
+    elements = _iter_json_array(io.StringIO(text), 256)
+    # 壊れた要素より前は、文書全体を検証する前に取り出せる
+    assert next(elements) == {"source": "0", "target": ""}
+    with pytest.raises(ValueError):
+        list(elements)
+
+
+@pytest.mark.parametrize("text", ["", "{}", "[1, 2", '[{"source": "A"'])
+def test_invalid_json_raises_value_error(tmp_path, text):
+    path = tmp_path / "broken.json"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(read_mapping_rows(str(path)))
+
+
+def test_unexpected_json_element(tmp_path):
+    path = tmp_path / "numbers.json"
+    path.write_text("[1, 2]", encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(read_mapping_rows(str(path)))
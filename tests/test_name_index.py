@@ -0,0 +1,48 @@
+"""TargetNameIndex: n-gram 転置インデックスによる部分一致"""
+
+import pytest
+
+from core import TargetNameIndex, normalize_bone_name, run_steps
+
+TARGETS = [
+    "pelvis", "spine_01", "spine_02", "spine_03", "neck_01", "head",
+    "clavicle_l", "upperarm_l", "upperarm_twist_01_l", "lowerarm_l", "lowerarm_twist_01_l", "hand_l",
+    "clavicle_r", "upperarm_r", "upperarm_twist_01_r", "lowerarm_r", "lowerarm_twist_01_r", "hand_r",
+    "thigh_l", "calf_l", "foot_l", "ball_l", "thigh_r", "calf_r", "foot_r", "ball_r",
+    *(f"hair_{chain:03d}_{link:03d}" for chain in range(20) for link in range(8)),
+    "a", "ik_hand_root", "ik_hand_gun", "ik_foot_root",
+]
+
+
+def brute_force(norm, targets):
+    """最適化前の部分一致（全ターゲットを正規化して走査し、最短のものを採る）"""
+    matches = [t for t in targets if norm in normalize_bone_name(t)]
+    matches.sort(key=len)
+    return matches[0] if matches else None
+
+
+def test_find_partial_returns_the_shortest_container():
+    index = TargetNameIndex(["upperarm_twist_01_l", "upperarm_l", "lowerarm_l"])
+    assert index.find_partial(normalize_bone_name("upperarm")) == "upperarm_l"
+    assert index.find_partial("zzz") is None
+
+
+@pytest.mark.parametrize("norm", [
+    "", "a", "l", "_l", "hair", "hair_01", "hair_019_007", "upperarm", "arm_l", "twist", "ik",
+    "hand", "hand_r", "ik_hand", "spine_0", "ball", "zz", "pelvis_x",
+])
+def test_find_partial_matches_a_full_scan(norm):
+    assert TargetNameIndex(TARGETS).find_partial(norm) == brute_force(norm, TARGETS)
+
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 1024])
+def test_stepwise_build_gives_the_same_index(chunk):
+    steps = TargetNameIndex.iter_build(TARGETS, chunk)
+    built = run_steps(steps)
+    direct = TargetNameIndex(TARGETS)
+    assert built.norms == direct.norms
+    assert built.by_norm == direct.by_norm
+    assert [built.find_partial(norm) for norm in ("hair_01", "arm_l", "")] == [
+        direct.find_partial(norm) for norm in ("hair_01", "arm_l", "")
+    ]
@@ -0,0 +1,101 @@
+"""normalize_bone_name: 1 パスの結合パターンが元の逐次 re.search / re.sub と同じ結果を返すか"""
+
+import itertools
+import re
+
+import pytest
+
+from core import clear_normalize_cache, compile_rules, normalize_bone_name, normalize_many
+
+
+def legacy_normalize(name):
+    """最適化前の normalize_bone_name（指・左右を正規表現ごとに判定していた実装）"""
+    n = name.lower()
+    n = re.sub(r"(character\d+_|mixamo:|armature_)", "", n)
+    n = re.sub(r"(_end|_const.*|_twist.*)$", "", n)
+
+    side = ""
+    if re.search(r"(left|_l$|\.l$|-l$)", n):
+        side = "_l"
+    elif re.search(r"(right|_r$|\.r$|-r$)", n):
+        side = "_r"
+
+    for finger in ("thumb", "index", "middle", "ring", "pinky"):
+        if re.search(finger + r"\d*", n):
+            num = re.search(finger + r"(\d*)", n).group(1) if re.search(finger + r"(\d+)", n) else ""
+            return f"finger_{finger}{num}{side}"
+
+    n = re.sub(r"^(left|right)", "", n)
+    n = re.sub(r"([._-][lr])$", "", n)
+    n = re.sub(r"[ .\-]", "_", n)
+    n = re.sub(r"_+", "_", n).strip("_")
+
+    part_mapping = {
+        "upleg": "upperleg", "up_leg": "upperleg", "upper_leg": "upperleg", "upperleg": "upperleg",
+        "thigh": "upperleg", "leg": "lowerleg", "lower_leg": "lowerleg", "lowerleg": "lowerleg",
+        "calf": "lowerleg", "shin": "lowerleg", "uparm": "upperarm", "up_arm": "upperarm",
+        "upper_arm": "upperarm", "upperarm": "upperarm", "arm": "upperarm", "forearm": "lowerarm",
+        "fore_arm": "lowerarm", "lower_arm": "lowerarm", "lowerarm": "lowerarm", "pelvis": "hip",
+        "hips": "hip", "hip": "hip", "shoulder": "shoulder", "wrist": "hand", "hand": "hand",
+        "eye": "eye", "headtop": "headtop", "toe_base": "toes", "toe": "toes", "toes": "toes",
+    }
+    original_n = n
+    if n in part_mapping:
+        n = part_mapping[n]
+    else:
+        base = re.sub(r"(roll|twist|helper|aux|assist|end)$", "", n)
+        base = re.sub(r"\d+$", "", base).strip("_")
+        if re.search(r"(upper|up).*leg", base):
+            n = "upperleg"
+        elif re.search(r"(lower).*leg", base):
+            n = "lowerleg"
+        elif re.search(r"(upper|up).*arm", base):
+            n = "upperarm"
+        elif re.search(r"(lower|fore).*arm", base):
+            n = "lowerarm"
+        elif base.endswith("upleg"):
+            n = "upperleg"
+        elif base.endswith("leg") and original_n != "leg":
+            n = "lowerleg"
+        elif base.endswith("arm") and original_n != "arm":
+            n = "upperarm"
+    if "toe" in n and "end" in original_n:
+        return f"toes_end{side}"
+    return n + side
+
+
+PREFIXES = ("", "mixamo:", "Character12_", "Armature_", "DEF-")
+BASES = (
+    "Hips", "pelvis", "Spine", "Spine02", "Neck", "HeadTop_End", "Eye", "Shoulder", "clavicle",
+    "UpLeg", "Up_Leg", "UpperLeg", "Leg", "Thigh", "Calf", "Shin", "shinleg", "legHelper",
+    "Arm", "UpArm", "upper_arm", "ForeArm", "lower.arm", "lowerarm_roll", "upperarm_twist_01", "ArmAux2",
+    "Hand", "Wrist", "Foot", "ToeBase", "Toe_End", "toes",
+    "Thumb", "Thumb1", "HandIndex2", "Middle03", "ring", "Pinky4", "thumbIndex1", "Index_Thumb2",
+    "lefthumb", "righthumb1", "eyebrow_inner", "jaw--bone", "hair 01..02",
+)
+SIDES = ("{}", "Left{}", "Right{}", "{}_L", "{}.R", "{}-l", "{} r", "{}_left", "{}_l_end", "{}_const_L")
+CORPUS = sorted({
+    prefix + side.format(base) for prefix, base, side in itertools.product(PREFIXES, BASES, SIDES)
+})
+
+
+@pytest.fixture(autouse=True)
+def builtin_rules():
+    compile_rules()
+    yield
+    compile_rules()
+
+
+def test_matches_the_sequential_implementation():
+    mismatches = [(name, normalize_bone_name(name), legacy_normalize(name)) for name in CORPUS
+                  if normalize_bone_name(name) != legacy_normalize(name)]
+    assert mismatches == []
+
+
+def test_batch_api_and_cache_agree():
+    expected = [legacy_normalize(name) for name in CORPUS]
+    assert normalize_many(CORPUS) == expected
+    # キャッシュ済みでも、破棄した後でも同じ
+    assert normalize_many(CORPUS) == expected
+    clear_normalize_cache()
+    assert [normalize_bone_name(name) for name in CORPUS] == expected
@@ -0,0 +1,54 @@
+"""PackedMappings: 1 本の文字列への保存と復元"""
+
+import base64
+import zlib
+
+import pytest
+
+from core import PackedMappings
+
+
+def test_blob_round_trip():
+    packed = PackedMappings(["Hips", "Spine", "髪_01"], ["pelvis", "", "hair_01"], collapsed=[1])
+    blob = packed.to_blob()
+    assert blob.isascii()
+
+    restored = PackedMappings.from_blob(blob)
+    assert list(restored.rows()) == [("Hips", "pelvis"), ("Spine", ""), ("髪_01", "hair_01")]
+    assert restored.collapsed_rows() == [1]
+    assert len(restored) == 3
+
+
+def test_targets_default_to_empty():
+    packed = PackedMappings(["A", "B"])
+    assert packed.targets == ["", ""]
+    assert PackedMappings.from_blob(packed.to_blob()).targets == ["", ""]
+
+
+def test_empty_list_is_an_empty_blob():
+    assert PackedMappings().to_blob() == ""
+    assert len(PackedMappings.from_blob("")) == 0
+
+
+def test_length_mismatch():
+    with pytest.raises(ValueError):
+        PackedMappings(["A", "B"], ["a"])
+
+
+@pytest.mark.parametrize("blob", [
+    "not base64 !",
+    base64.b64encode(b"not zlib").decode("ascii"),
+    base64.b64encode(zlib.compress(b'{"v": 99, "source": [], "target": []}')).decode("ascii"),
+    base64.b64encode(zlib.compress(b'{"v": 1, "source": ["A"]}')).decode("ascii"),
+    base64.b64encode(zlib.compress(b'{"v": 1, "source": ["A"], "target": ["a"], "collapsed": [5]}')).decode("ascii"),
+])
+def test_broken_blob_is_an_empty_list(blob):
+    assert len(PackedMappings.from_blob(blob)) == 0
+
+
+def test_large_list_stays_compact():
+    sources = [f"mixamorig:Hair{i}_{j}" for i in range(500) for j in range(20)]
+    targets = [f"hair_{i:03d}_{j:03d}" for i in range(500) for j in range(20)]
+    blob = PackedMappings(sources, targets).to_blob()
+    assert len(blob) < sum(map(len, sources + targets)) // 2
+    assert list(PackedMappings.from_blob(blob).rows()) == list(zip(sources, targets))
@@ -0,0 +1,91 @@
+"""plan_renames: 連鎖・入れ替え・循環・衝突の実行順序"""
+
+import pytest
+
+from core import TEMP_NAME_PREFIX, plan_renames
+
+
+def run(plan, names):
+    """Blender と同じく、使用中の名前へのリネームは失敗として steps を順に実行する"""
+    names = list(names)
+    for old, new in plan.steps:
+        assert old in names, f"{old!r} does not exist"
+        assert new not in names, f"{old!r} -> {new!r} collides"
+        names[names.index(old)] = new
+    return names
+
+
+def test_swap_uses_one_temp_name():
+    plan = plan_renames([("A", "B"), ("B", "A")], ["A", "B"])
+    assert run(plan, ["A", "B"]) == ["B", "A"]
+    assert plan.cycles == 1
+    assert plan.renamed == 2
+    assert len(plan.steps) == 3
+    assert plan.steps[0][1].startswith(TEMP_NAME_PREFIX)
+    assert plan.collisions == []
+
+
+def test_chain_renames_from_the_end():
+    plan = plan_renames([("A", "B"), ("B", "C")], ["A", "B"])
+    assert plan.steps == [("B", "C"), ("A", "B")]
+    assert plan.cycles == 0
+    assert run(plan, ["A", "B"]) == ["B", "C"]
+
+
+def test_three_cycle():
+    plan = plan_renames([("A", "B"), ("B", "C"), ("C", "A")], ["A", "B", "C"])
+    assert run(plan, ["A", "B", "C"]) == ["B", "C", "A"]
+    assert plan.cycles == 1
+    assert plan.renamed == 3
+    assert len(plan.steps) == 4
+
+
+def test_cycle_with_a_tail():
+    # 循環 A↔B と、C→E の後に D→C を行う連鎖が混在する
+    plan = plan_renames([("A", "B"), ("B", "A"), ("D", "C"), ("C", "E")], ["A", "B", "C", "D"])
+    assert run(plan, ["A", "B", "C", "D"]) == ["B", "A", "E", "C"]
+    assert plan.cycles == 1
+
+
+def test_temp_name_avoids_existing_bones():
+    existing = ["A", "B", f"{TEMP_NAME_PREFIX}0"]
+    plan = plan_renames([("A", "B"), ("B", "A")], existing)
+    assert plan.steps[0][1] != f"{TEMP_NAME_PREFIX}0"
+    assert run(plan, existing) == ["B", "A", f"{TEMP_NAME_PREFIX}0"]
+
+
+def test_blocked_target_is_a_collision_and_propagates():
+    # B はリネームされないので A→B は実行できず、A が動かないので C→A も実行できない
+    plan = plan_renames([("A", "B"), ("C", "A"), ("D", "E")], ["A", "B", "C", "D"])
+    assert sorted(plan.collisions) == [("A", "B"), ("C", "A")]
+    assert plan.steps == [("D", "E")]
+    assert run(plan, ["A", "B", "C", "D"]) == ["A", "B", "C", "E"]
+
+
+def test_duplicate_target_keeps_the_first_row():
+    plan = plan_renames([("A", "X"), ("B", "X")], ["A", "B"])
+    assert plan.steps == [("A", "X")]
+    assert plan.collisions == [("B", "X")]
+
+
+@pytest.mark.parametrize("rows", [
+    [("A", "A")],
+    [("A", "")],
+    [("A", None)],
+])
+def test_no_op_rows_are_skipped(rows):
+    plan = plan_renames(rows, ["A"])
+    assert plan.steps == []
+    assert plan.collisions == []
+    assert plan.renamed == 0
+
+
+def test_missing_source():
+    plan = plan_renames([("Gone", "X"), ("A", "B")], ["A"])
+    assert plan.missing == [("Gone", "X")]
+    assert plan.steps == [("A", "B")]
+
+
+def test_final_names_skip_temp_names():
+    plan = plan_renames([("A", "B"), ("B", "A"), ("C", "D")], ["A", "B", "C"])
+    assert plan.final_names() == {"A": "B", "B": "A", "C": "D"}
@@ -0,0 +1,134 @@
+"""ルールパック: 読み込みと検証・ホットリロード・トライ正規表現"""
+
+import json
+import os
+import random
+import re
+
+import pytest
+
+from core import (
+    RulePackLoader,
+    _trie_regex,
+    compile_rules,
+    load_rule_pack,
+    normalize_bone_name,
+    rules_fingerprint,
+)
+
+VRM_PACK = {
+    "name": "vrm",
+    "prefixes": ["J_Bip_C_", "J_Bip_"],
+    "suffixes": ["_nub"],
+    "synonyms": {"Clavicle": "shoulder"},
+    "sides": {"left": {"prefixes": ["L_"], "suffixes": ["_lft"]}, "right": {"prefixes": ["R_"]}},
+    "fingers": {"pinky": ["little"]},
+}
+
+
+@pytest.fixture(autouse=True)
+def builtin_rules():
+    compile_rules()
+    yield
+    compile_rules()
+
+
+def write_pack(directory, name, pack):
+    path = directory / name
+    path.write_text(json.dumps(pack), encoding="utf-8")
+    return path
+
+
+def test_load_lowercases_and_names_the_pack(tmp_path):
+    pack = load_rule_pack(str(write_pack(tmp_path, "vrm_rules.json", dict(VRM_PACK, name=""))))
+    assert pack["name"] == "vrm_rules"
+    assert pack["prefixes"] == ["j_bip_c_", "j_bip_"]
+    assert pack["synonyms"] == {"clavicle": "shoulder"}
+    assert pack["sides"]["left"] == {"prefixes": ["l_"], "suffixes": ["_lft"]}
+    assert pack["sides"]["right"] == {"prefixes": ["r_"], "suffixes": []}
+
+
+@pytest.mark.parametrize("pack", [
+    [],
+    {"prefix": ["a_"]},
+    {"prefixes": "a_"},
+    {"prefixes": [""]},
+    {"synonyms": {"a": 1}},
+    {"sides": {"middle": {}}},
+    {"sides": {"left": {"infixes": ["x"]}}},
+    {"fingers": {"toe": ["big"]}},
+])
+def test_invalid_packs_are_rejected(tmp_path, pack):
+    with pytest.raises(ValueError):
+        load_rule_pack(str(write_pack(tmp_path, "bad.json", pack)))
+
+
+def test_compiled_pack_extends_the_builtin_rules(tmp_path):
+    before = {name: normalize_bone_name(name) for name in ("mixamo:LeftHand", "thigh.R", "J_Bip_L_Clavicle")}
+    compile_rules([load_rule_pack(str(write_pack(tmp_path, "vrm.json", VRM_PACK)))])
+    assert normalize_bone_name("J_Bip_C_Hips") == "hip"
+    assert normalize_bone_name("J_Bip_L_Clavicle") == "shoulder_l"
+    assert normalize_bone_name("R_Clavicle") == "shoulder_r"
+    assert normalize_bone_name("clavicle_lft") == "shoulder_l"
+    assert normalize_bone_name("J_Bip_L_Little1") == "finger_pinky1_l"
+    assert normalize_bone_name("foot_nub") == "foot"
+    # 組み込みのルールはそのまま
+    assert normalize_bone_name("mixamo:LeftHand") == before["mixamo:LeftHand"] == "hand_l"
+    assert normalize_bone_name("thigh.R") == before["thigh.R"]
+    assert before["J_Bip_L_Clavicle"] != "shoulder_l"
+
+    compile_rules()
+    assert normalize_bone_name("J_Bip_L_Clavicle") == before["J_Bip_L_Clavicle"]
+
+
+def test_loader_reloads_only_when_packs_change(tmp_path):
+    loader = RulePackLoader([str(tmp_path), str(tmp_path / "missing")])
+    assert loader.refresh()
+    builtin = rules_fingerprint()
+    assert not loader.refresh()
+
+    path = write_pack(tmp_path, "vrm.json", VRM_PACK)
+    assert loader.refresh()
+    assert [pack["name"] for pack in loader.packs] == ["vrm"]
+    assert normalize_bone_name("R_Clavicle") == "shoulder_r"
+    with_pack = rules_fingerprint()
+    assert with_pack != builtin
+    assert not loader.refresh()
+
+    # 書き換え（時刻もサイズも変わる）→ 読み直し
+    path.write_text(json.dumps(dict(VRM_PACK, synonyms={"clavicle": "collar"})), encoding="utf-8")
+    stamp = os.stat(path).st_mtime_ns + 10 ** 9
+    os.utime(path, ns=(stamp, stamp))
+    assert loader.refresh()
+    assert normalize_bone_name("R_Clavicle") == "collar_r"
+    assert rules_fingerprint() not in (builtin, with_pack)
+
+    # 壊れたパックは errors に残し、残りのパックで再コンパイルする
+    write_pack(tmp_path, "broken.json", {"prefixes": 1})
+    assert loader.refresh()
+    assert [os.path.basename(path) for path, _message in loader.errors] == ["broken.json"]
+    assert [pack["name"] for pack in loader.packs] == ["vrm"]
+
+    path.unlink()
+    (tmp_path / "broken.json").unlink()
+    assert loader.refresh()
+    assert loader.packs == [] and loader.errors == []
+    assert rules_fingerprint() == builtin
+
+
+def plain_alternation(words):
+    """比較用: 長い語を先に並べた素朴な選択"""
+    return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_trie_regex_matches_like_a_plain_alternation(seed):
+    rng = random.Random(seed)
+    alphabet = "ab_.:l"
+    words = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 6))) for _ in range(40)}
+    trie = re.compile(f"(?:{_trie_regex(words)})")
+    plain = re.compile(f"(?:{plain_alternation(words)})")
+    for _ in range(500):
+        text = "".join(rng.choice(alphabet + "xy") for _ in range(rng.randint(0, 12)))
+        assert [m.span() for m in trie.finditer(text)] == [m.span() for m in plain.finditer(text)]
+        assert bool(trie.fullmatch(text)) == (text in words)
@@ -0,0 +1,27 @@
+"""Skeleton: 階層順（preorder）の列挙"""
+
+import sys
+
+from core import Skeleton
+
+
+def test_siblings_and_roots_in_name_order():
+    skeleton = Skeleton.from_pairs([
+        ("Root", None), ("b", "Root"), ("a", "Root"), ("a_child", "a"), ("Another", None),
+    ])
+    assert skeleton.hierarchy_order() == ["Another", "Root", "a", "a_child", "b"]
+    assert skeleton.hierarchy_indices() is skeleton.hierarchy_indices()
+
+
+def test_very_deep_chain_does_not_recurse():
+    # 再帰の上限を大きく超える 1 本のチェーン（尻尾・ロープ・髪）
+    depth = sys.getrecursionlimit() * 5
+    pairs = [("link_0", None)] + [(f"link_{i}", f"link_{i - 1}") for i in range(1, depth)]
+    skeleton = Skeleton.from_pairs(reversed(pairs))
+    assert skeleton.hierarchy_order() == [name for name, _parent in pairs]
+
+
+def test_unknown_parent_is_a_root_and_cycles_are_appended():
+    skeleton = Skeleton.from_pairs([("A", "missing"), ("X", "Y"), ("Y", "X"), ("B", "A")])
+    assert skeleton.parents == [None, "Y", "X", "A"]
+    assert skeleton.hierarchy_order() == ["A", "B", "X", "Y"]
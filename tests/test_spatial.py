@@ -0,0 +1,94 @@
+"""match_spatial: レスト位置（スケール・向きを正規化）の近さによる補完"""
+
+import random
+
+import pytest
+
+from core import STAGE_SPATIAL, Skeleton, iter_match_spatial, match_spatial, run_steps
+
+# 名前に手掛かりのない 1 本の腕（head, tail）
+BONES = [
+    ((0.0, 0.0, 0.0), (0.0, 0.0, 1.0)),
+    ((0.0, 0.0, 1.0), (0.0, 0.0, 1.6)),
+    ((0.0, 0.0, 1.6), (0.4, 0.0, 1.6)),
+    ((0.4, 0.0, 1.6), (0.8, 0.0, 1.6)),
+    ((0.0, 0.0, 1.6), (-0.4, 0.0, 1.6)),
+]
+
+
+def rig(prefix, transform=lambda p: p):
+    names = [f"{prefix}{i}" for i in range(len(BONES))]
+    parents = [None, names[0], names[1], names[2], names[1]]
+    heads = [c for head, _tail in BONES for c in transform(head)]
+    tails = [c for _head, tail in BONES for c in transform(tail)]
+    return Skeleton.from_pairs(zip(names, parents), heads, tails)
+
+
+def unmatched_rows(skeleton):
+    return [[name, None, "none"] for name in skeleton.names]
+
+
+def test_scaled_and_y_up_rig_is_matched_by_position():
+    source = rig("Bone.00")
+    # 100 倍・Y-up・横にずれたターゲット
+    target = rig("joint_", lambda p: (p[0] * 100 + 5, p[2] * 100, -p[1] * 100))
+    rows = unmatched_rows(source)
+    assert match_spatial(rows, source, target) == len(BONES)
+    assert [row[1] for row in rows] == target.names
+    assert {row[2] for row in rows} == {STAGE_SPATIAL}
+
+
+def test_world_matrix_is_applied_before_normalizing():
+    source = rig("Bone.00")
+    # ターゲットは左右が逆に作られているが、ワールド行列で X を反転して置かれている
+    target = rig("joint_", lambda p: (-p[0], p[1], p[2]))
+    mirror = [[-1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]
+    rows = unmatched_rows(source)
+    match_spatial(rows, source, target, target_matrix=mirror)
+    assert [row[1] for row in rows] == target.names
+
+
+def test_matched_rows_and_far_bones_are_left_alone():
+    source = rig("Bone.00")
+    target = rig("joint_", lambda p: (p[0], p[1] + (0.5 if p[0] > 0.3 else 0.0), p[2]))
+    rows = unmatched_rows(source)
+    rows[0] = ["Bone.000", "joint_1", "manual"]
+    assigned = match_spatial(rows, source, target, max_distance=0.05)
+    assert rows[0] == ["Bone.000", "joint_1", "manual"]
+    # 手の先（x > 0.3 がずれている）は遠すぎるので割り当てない
+    assert rows[3][1] is None
+    targets = [row[1] for row in rows if row[1]]
+    assert len(targets) == len(set(targets))
+    assert assigned == len(targets) - 1
+
+
+def test_missing_rest_positions_skip_the_stage():
+    source = Skeleton.from_pairs([("A", None)])
+    target = rig("joint_")
+    rows = unmatched_rows(source)
+    assert match_spatial(rows, source, target) == 0
+    assert rows == [["A", None, "none"]]
+
+
+@pytest.mark.parametrize("chunk", [1, 8, 1024])
+def test_stepwise_version_gives_the_same_rows(chunk):
+    # 点がばらばらの 300 本（一部は遠すぎて残る）
+    rng = random.Random(chunk)
+    points = [(rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(0, 2)) for _ in range(600)]
+
+    def scatter(prefix, jitter):
+        pairs = [(f"{prefix}{i}", None) for i in range(300)]
+        heads = [c + rng.uniform(-jitter, jitter) for p in points[:300] for c in p]
+        tails = [c + rng.uniform(-jitter, jitter) for p in points[300:] for c in p]
+        return Skeleton.from_pairs(pairs, heads, tails)
+
+    source = scatter("src_", 0.0)
+    target = scatter("tgt_", 0.04)
+    expected = unmatched_rows(source)
+    expected_count = match_spatial(expected, source, target, max_distance=0.02, neighbors=4)
+    assert 0 < expected_count < len(expected)
+
+    rows = unmatched_rows(source)
+    steps = iter_match_spatial(rows, source, target, max_distance=0.02, neighbors=4, chunk=chunk)
+    assert run_steps(steps) == expected_count
+    assert rows == expected
@@ -0,0 +1,52 @@
+"""TargetNameIndex.suggest: 行ごとのターゲット候補（上位 k 件）"""
+
+import pytest
+
+from core import STAGE_EXACT, STAGE_NORMALIZED, SUGGEST_PREFIX, SUGGEST_TOKEN, TargetNameIndex
+
+UE_HAND = [
+    "hand_l", "hand_r",
+    *(f"{finger}_{i:02d}_{side}" for finger in ("thumb", "index", "middle", "ring", "pinky")
+      for i in (1, 2, 3) for side in "lr"),
+]
+
+
+def test_exact_and_normalized_first():
+    index = TargetNameIndex(UE_HAND)
+    assert index.suggest("hand_l", 1) == [("hand_l", STAGE_EXACT)]
+    assert index.suggest("mixamo:LeftHand", 1) == [("hand_l", STAGE_NORMALIZED)]
+
+
+def test_prefix_of_the_typed_text():
+    suggestions = TargetNameIndex(UE_HAND).suggest("Thu", 3)
+    assert suggestions == [(name, SUGGEST_PREFIX) for name in ("thumb_01_l", "thumb_01_r", "thumb_02_l")]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("mixamo:LeftHandIndex1", "index_01_l"),
+    ("mixamo:RightHandRing2", "ring_02_r"),
+    ("mixamo:LeftHandThumb3", "thumb_03_l"),
+])
+def test_token_tier_ranks_the_same_finger_and_segment_first(query, expected):
+    # 数字が語と分かれていないと ring_01_l などが先に並んでいた
+    suggestions = TargetNameIndex(UE_HAND).suggest(query, 5)
+    assert suggestions[0] == (expected, SUGGEST_TOKEN)
+
+
+def test_results_are_unique_and_at_most_k():
+    index = TargetNameIndex(UE_HAND)
+    for query in ("hand", "LeftHandIndex1", "ring", "x", ""):
+        suggestions = index.suggest(query, 4)
+        names = [name for name, _reason in suggestions]
+        assert len(names) <= 4
+        assert len(names) == len(set(names))
+        assert set(names) <= set(UE_HAND)
+
+
+def test_memoized_until_cleared():
+    index = TargetNameIndex(UE_HAND)
+    first = index.suggest("thumb", 4)
+    assert index.suggest("thumb", 4) is first
+    index.clear_suggestions()
+    assert index.suggest("thumb", 4) == first
+    assert index.suggest("thumb", 4) is not first
@@ -0,0 +1,114 @@
+"""match_topology: 親子構造の一致による補完"""
+
+import pytest
+
+from core import (
+    STAGE_TOPOLOGY,
+    Skeleton,
+    TargetNameIndex,
+    generate_mapping,
+    iter_match_topology,
+    match_topology,
+    run_steps,
+    subtree_ids,
+)
+
+
+def skeleton(pairs):
+    return Skeleton.from_pairs(pairs)
+
+
+def name_rows(source, target):
+    return [list(row) for row in generate_mapping(source.hierarchy_order(), TargetNameIndex(target.names))]
+
+
+def mapping(rows):
+    return {source: target for source, target, _stage in rows}
+
+
+def test_subtree_ids_compare_shapes_across_skeletons():
+    table = {}
+    a = skeleton([("r", None), ("x", "r"), ("y", "x"), ("z", "r")])
+    b = skeleton([("R", None), ("P", "R"), ("Q", "R"), ("S", "Q")])
+    ids_a = subtree_ids(a, table)
+    ids_b = subtree_ids(b, table)
+    assert ids_a[a.index_of["r"]] == ids_b[b.index_of["R"]]
+    assert ids_a[a.index_of["x"]] == ids_b[b.index_of["Q"]]
+    assert ids_a[a.index_of["y"]] == ids_a[a.index_of["z"]] == ids_b[b.index_of["P"]]
+
+
+def test_unique_structure_is_matched():
+    source = skeleton([
+        ("Root", None), ("Body", "Root"), ("Neck", "Body"), ("Skull", "Neck"), ("Tail1", "Root"), ("Tail2", "Tail1"),
+    ])
+    target = skeleton([
+        ("root", None), ("torso", "root"), ("collar", "torso"), ("cranium", "collar"), ("t1", "root"), ("t2", "t1"),
+    ])
+    rows = name_rows(source, target)
+    assert mapping(rows)["Body"] is None
+
+    assert match_topology(rows, source, target) == 5
+    assert mapping(rows) == {
+        "Root": "root", "Body": "torso", "Neck": "collar", "Skull": "cranium", "Tail1": "t1", "Tail2": "t2",
+    }
+    assert {stage for source_name, _target, stage in rows if source_name != "Root"} == {STAGE_TOPOLOGY}
+
+
+def test_indistinguishable_siblings_are_left_unmatched():
+    source = skeleton([("Root", None), ("A1", "Root"), ("A2", "A1"), ("B1", "Root"), ("B2", "B1")])
+    target = skeleton([("root", None), ("x1", "root"), ("x2", "x1"), ("y1", "root"), ("y2", "y1")])
+    rows = name_rows(source, target)
+    assert match_topology(rows, source, target) == 0
+    assert mapping(rows) == {"Root": "root", "A1": None, "A2": None, "B1": None, "B2": None}
+
+
+def test_symmetric_siblings_are_split_by_side():
+    source = skeleton([
+        ("Root", None), ("Wing_L", "Root"), ("WingTip_L", "Wing_L"), ("Wing_R", "Root"), ("WingTip_R", "Wing_R"),
+    ])
+    target = skeleton([
+        ("root", None), ("feather_l", "root"), ("quill_l", "feather_l"), ("feather_r", "root"), ("quill_r", "feather_r"),
+    ])
+    rows = name_rows(source, target)
+    assert match_topology(rows, source, target) == 4
+    assert mapping(rows) == {
+        "Root": "root", "Wing_L": "feather_l", "WingTip_L": "quill_l", "Wing_R": "feather_r", "WingTip_R": "quill_r",
+    }
+
+
+def test_rows_matched_by_name_are_kept_and_their_targets_not_reused():
+    source = skeleton([("Root", None), ("Arm", "Root"), ("Hand", "Arm"), ("Leg", "Root"), ("Foot", "Leg")])
+    target = skeleton([("root", None), ("arm", "root"), ("hand", "arm"), ("leg", "root"), ("foot", "leg")])
+    rows = [["Root", "root", "exact"], ["Arm", "leg", "manual"], ["Hand", None, "none"],
+            ["Leg", None, "none"], ["Foot", None, "none"]]
+    match_topology(rows, source, target)
+    assert rows[1] == ["Arm", "leg", "manual"]
+    targets = [target_name for _source, target_name, _stage in rows if target_name]
+    assert len(targets) == len(set(targets))
+    assert mapping(rows)["Hand"] == "foot"
+
+@pytest.mark.parametrize("chunk", [1, 2, 1024])
+def test_stepwise_version_gives_the_same_rows(chunk):
+    # 背骨の先に、長さの違う左右のチェーンが並ぶ（名前はソースとターゲットで全く違う）
+    def rig(root, spine, limb):
+        pairs = [(root, None)]
+        pairs += [(f"{spine}{i}", f"{spine}{i - 1}" if i else root) for i in range(6)]
+        for i in range(3):
+            for side in "LR":
+                parent = f"{spine}5"
+                for k in range(i + 1):
+                    pairs.append((f"{limb}{i}{chr(97 + k)}_{side}", parent))
+                    parent = pairs[-1][0]
+        return skeleton(pairs)
+
+    source = rig("Root", "Spine", "Limb")
+    target = rig("root", "vertebra", "wing")
+
+    expected = name_rows(source, target)
+    expected_count = match_topology(expected, source, target)
+    assert expected_count > 0
+
+    rows = name_rows(source, target)
+    steps = iter_match_topology(rows, source, target, chunk)
+    assert run_steps(steps) == expected_count
+    assert rows == expected
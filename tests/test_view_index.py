@@ -0,0 +1,149 @@
+"""MappingViewIndex: 折りたたみによる表示判定・行メタデータ・検索と並べ替えのメモ"""
+
+import random
+
+import pytest
+
+from core import MappingViewIndex, Skeleton, search_key
+
+SKELETON = Skeleton.from_pairs([("Root", None), ("Arm", "Root"), ("Hand", "Arm"), ("Leg", "Root")])
+ROWS = [("Root", "root"), ("Arm", "upperarm_l"), ("Hand", "hand_l"), ("Leg", "thigh_l")]
+
+
+def view(collapsed=()):
+    return MappingViewIndex([source for source, _target in ROWS], SKELETON, SKELETON.names, collapsed)
+
+
+def keys(rows):
+    return lambda: [search_key(source, target) for source, target in rows]
+
+
+def random_tree(count, seed):
+    rng = random.Random(seed)
+    return Skeleton.from_pairs(
+        [("bone_0", None)] + [(f"bone_{i}", f"bone_{rng.randrange(i)}") for i in range(1, count)]
+    )
+
+
+def test_folds_hide_descendants():
+    index = view(collapsed=["Arm"])
+    assert index.visible_flags() == [True, True, False, True]
+    assert index.filter_flags("", keys(ROWS), True, 1) == [1, 1, 0, 1]
+    assert index.filter_flags("", keys(ROWS), False, 1) == [1, 1, 1, 1]
+    index.set_expanded(1, True)
+    assert index.filter_flags("", keys(ROWS), True, 1) == [1, 1, 1, 1]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_visibility_matches_an_ancestor_walk(seed):
+    skeleton = random_tree(300, seed)
+    rng = random.Random(seed)
+    collapsed = set(rng.sample(skeleton.names, 30))
+    rows = skeleton.hierarchy_order()
+    index = MappingViewIndex(rows, skeleton, skeleton.names, collapsed)
+
+    def walk(name):
+        # 最適化前の filter_items: 祖先を辿り、どれかが折りたたまれていれば非表示
+        parent = skeleton.parents[skeleton.index_of[name]]
+        while parent is not None:
+            if parent in collapsed:
+                return False
+            parent = skeleton.parents[skeleton.index_of[parent]]
+        return True
+
+    expected = [walk(name) for name in rows]
+    # フラグ計算前の 1 行ずつの判定と、まとめて求めたフラグの両方
+    assert [index.is_visible(i) for i in range(len(rows))] == expected
+    assert index.visible_flags() == expected
+    assert [index.is_visible(i) for i in range(len(rows))] == expected
+
+
+def test_row_metadata_matches_the_skeleton():
+    skeleton = random_tree(200, 7)
+    rows = skeleton.hierarchy_order()
+    index = MappingViewIndex(rows, skeleton, skeleton.names, ())
+
+    def depth(name):
+        # 最適化前の draw_item: 親を辿って深さを数える
+        count = 0
+        parent = skeleton.parents[skeleton.index_of[name]]
+        while parent is not None:
+            count += 1
+            parent = skeleton.parents[skeleton.index_of[parent]]
+        return count
+
+    assert index.depth == [depth(name) for name in rows]
+    assert index.has_children == [skeleton.has_children(skeleton.index_of[name]) for name in rows]
+    assert [rows[p] if p >= 0 else None for p in index.parent_rows] == [
+        skeleton.parents[skeleton.index_of[name]] for name in rows
+    ]
+    assert all(index.in_source)
+    assert [index.fold_of[name] for name in rows] == [skeleton.index_of[name] for name in rows]
+
+
+def test_rows_missing_from_the_source_are_flat():
+    # リネーム後など、ソースに無い行はインデントなし・子なし
+    index = MappingViewIndex(["Root", "renamed", "Hand"], SKELETON, SKELETON.names, ())
+    assert index.in_source == [True, False, True]
+    assert index.depth == [0, 0, 0]
+    assert index.has_children == [True, False, False]
+    assert index.is_expanded(0)
+
+
+def test_reset_caches_recomputes_everything():
+    index = view()
+    order = index.sort_order("TARGET", lambda: [target for _source, target in ROWS])
+    flags = index.filter_flags("thigh", keys(ROWS), True, 1)
+    assert index.filter_flags("thigh", keys(ROWS), True, 1) is flags
+
+    # 全行のターゲット名を書き換えたとみなして作り直す
+    renamed = [(source, f"z_{target}") if source == "Root" else (source, target) for source, target in ROWS]
+    index.reset_caches()
+    assert index.filter_flags("z_", keys(renamed), True, 1) == [1, 0, 0, 0]
+    assert index.sort_order("TARGET", lambda: [target for _source, target in renamed]) != order
+
+
+def test_search_narrows_and_widens():
+    index = view()
+    assert index.search_rows("h", keys(ROWS)) == [2, 3]
+    assert index.search_rows("ha", keys(ROWS)) == [2]
+    assert index.search_rows("h", keys(ROWS)) == [2, 3]
+
+
+def test_search_matches_a_full_scan_while_typing():
+    skeleton = random_tree(500, 3)
+    rows = skeleton.hierarchy_order()
+    targets = [f"t_{name[::-1]}" for name in rows]
+    search_keys = [search_key(source, target) for source, target in zip(rows, targets)]
+    index = MappingViewIndex(rows, skeleton, skeleton.names, ())
+    typed = ["1", "12", "123", "12", "1", "", "t", "t_", "t_2", "e_1", "bone_4", "bone_49", "zz", "bone_4"]
+    for needle in typed:
+        expected = [1 if needle in key else 0 for key in search_keys] if needle else [1] * len(rows)
+        assert index.filter_flags(needle, lambda: search_keys, False, 1) == expected
+
+
+def test_filter_flags_and_sort_order_are_memoized():
+    index = view()
+    calls = []
+
+    def make_keys():
+        calls.append(1)
+        return keys(ROWS)()
+
+    flags = index.filter_flags("arm", make_keys, True, 1)
+    assert index.filter_flags("arm", make_keys, True, 1) is flags
+    index.filter_flags("hand", make_keys, True, 1)
+    assert len(calls) == 1
+
+    order = index.sort_order("TARGET", lambda: [target for _source, target in ROWS])
+    assert order == [1, 3, 0, 2]
+    assert index.sort_order("TARGET", lambda: pytest.fail("sort keys rebuilt")) is order
+    index.invalidate_order("TARGET")
+    assert index.sort_order("TARGET", lambda: [target for _source, target in ROWS]) == order
+
+
+def test_update_row_refreshes_one_search_key():
+    index = view()
+    assert index.filter_flags("spine", keys(ROWS), False, 1) == [0, 0, 0, 0]
+    index.update_row(3, "Leg", "spine_01")
+    assert index.filter_flags("spine", keys(ROWS), False, 1) == [0, 0, 0, 1]